@@ -7,74 +7,357 @@ with threading to support multithreading.
 """
 
 import os
+import re
 import sys
+import time
 import asyncio
+import functools
+import itertools
+import logging
 import aiofiles
 import ssl
+import signal
+import threading
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+from typing import Callable, List, Optional, Sequence, Tuple
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor
 from asyncio import StreamReader, StreamWriter
-from config.logging_config import get_logger
+from config.logging_config import get_logger, QueryLogSampler
+from config.logging_config import get_dropped_records
+import metrics
+from binary_protocol import MAGIC, ProtocolError, handle_binary_connection
+from protocol_server import SearchProtocol
+from corpus import corpus_codec, iter_corpus_lines, scan_corpus
+from corpus_tail import CorpusTail
+from compact_corpus import CompactCorpus
+from search_engines import ENGINES, create_engine
+from socket_activation import listen_sockets
+from fair_scheduler import ClientStats, FairScheduler
+from request_coalescing import ScanBatcher, SingleFlight
+from fuzzy_index import FuzzyIndex, fuzzy_scan
+from regex_index import RegexIndex, regex_scan
+from posting_index import PostingIndex, locate_scan
+
 
+# Reference point for the startup timings that get logged
+startup_time = time.monotonic()
 
 # Load values from environment files
 load_dotenv()
 
 host = os.getenv("HOST")
 port = os.getenv("PORT")
-reread_on_query = os.getenv("REREAD_ON_QUERY", "False").lower() == "true"
+
+# Connection handling: "stream" (StreamReader/Writer) or "protocol"
+server_impl = os.getenv("SERVER_IMPL", "stream").lower()
+
+# Fast replies that never touch the search path
+BUSY_RESPONSE = "BUSY\n"
+STATS_COMMAND = "STATS"
+READY_COMMAND = "READY"
 
 # Logging configuration
 logger = get_logger()
 
+# Per-query log records are sampled and rate limited
+query_log_sampler = QueryLogSampler()
+
 # Load the path to the 200k.txt from the configuration file
 config_file_path = "config/config.cfg"
-search_file_path = None
-use_ssl = False
-certfile = None
-keyfile = None
 
-try:
-    # Read the configuration file to get the path
-    with open(config_file_path, "r", encoding="utf8") as config_file:
-        for line in config_file:
-            if line.startswith("linuxpath="):
-                search_file_path = line.strip().split("=")[1]
-            elif line.startswith("use_ssl="):
-                use_ssl = line.strip().split("=")[1].lower() == "true"
-            elif line.startswith("certfile="):
-                certfile = line.strip().split("=")[1]
-            elif line.startswith("keyfile="):
-                keyfile = line.strip().split("=")[1]
-
-    logger.debug("Extracted path from config: %s", search_file_path)
-
-    # Log an error if file or file path doesnt exist
+
+class ConfigError(Exception):
+    """Raised when the configuration cannot be used"""
+
+
+def load_config() -> dict:
+    """Read the reloadable settings from the environment and config file
+
+    HOST, PORT and SERVER_IMPL are only read at startup, as changing
+    them means binding a new socket.
+    """
+    # Serve the cached path from a minimal perfect hash index file,
+    # built from the corpus when missing or older than it
+    mph_index_file = os.getenv("MPH_INDEX_FILE") or None
+
+    # Hold the cached corpus as one buffer instead of a set of strings
+    compact_corpus = os.getenv("COMPACT_CORPUS", "False").lower() == "true"
+
+    config = {
+        "reread_on_query":
+            os.getenv("REREAD_ON_QUERY", "False").lower() == "true",
+        "mph_index_file": mph_index_file,
+
+        # Lookup engine for the cached path, see search_engines.ENGINES.
+        # The older COMPACT_CORPUS and MPH_INDEX_FILE switches still
+        # pick theirs.
+        "search_engine": (os.getenv("SEARCH_ENGINE") or (
+            "mph" if mph_index_file else "compact" if compact_corpus
+            else "hash")).lower(),
+
+        # Limits for the FUZZY <k> <query> command
+        "fuzzy_max_distance": int(os.getenv("FUZZY_MAX_DISTANCE", "3")),
+        "fuzzy_max_results": int(os.getenv("FUZZY_MAX_RESULTS", "20")),
+
+        # Limits for the REGEX <pattern> command, budget in seconds
+        "regex_max_results": int(os.getenv("REGEX_MAX_RESULTS", "20")),
+        "regex_max_candidates":
+            int(os.getenv("REGEX_MAX_CANDIDATES", "1000000")),
+        "regex_time_budget": float(os.getenv("REGEX_TIME_BUDGET", "1.0")),
+
+        # Line numbers returned by LOCATE <query>
+        "locate_max_results": int(os.getenv("LOCATE_MAX_RESULTS", "100")),
+
+        # Admission control: connection and query caps, timeouts in
+        # seconds
+        "max_connections": int(os.getenv("MAX_CONNECTIONS", "1000")),
+        "max_inflight_queries":
+            int(os.getenv("MAX_INFLIGHT_QUERIES", "100")),
+        "idle_timeout": float(os.getenv("IDLE_TIMEOUT", "300")),
+        "read_timeout": float(os.getenv("READ_TIMEOUT", "10")),
+
+        # Reread mode: lookups arriving within the window, in
+        # milliseconds, or up to the batch size share one pass over the
+        # file. 1 turns it off.
+        "scan_batch_window":
+            float(os.getenv("SCAN_BATCH_WINDOW_MS", "2")) / 1000,
+        "scan_batch_size": int(os.getenv("SCAN_BATCH_SIZE", "256")),
+
+        # Identical queries arriving together share a single search
+        "coalesce_queries":
+            os.getenv("COALESCE_QUERIES", "True").lower() == "true",
+
+        # Seconds SIGTERM waits for in-flight queries before exiting
+        "drain_timeout": float(os.getenv("DRAIN_TIMEOUT", "30")),
+
+        # Fair scheduling: queries one connection may have running at
+        # once, and the queue depth at which a connection is logged as a
+        # noisy neighbour
+        "client_inflight": int(os.getenv("CLIENT_MAX_INFLIGHT", "2")),
+        "noisy_client_queue": int(os.getenv("NOISY_CLIENT_QUEUE", "50")),
+
+        # Follow lines appended to the corpus, polled every TAIL_POLL_MS
+        "tail_corpus": os.getenv("TAIL_CORPUS", "False").lower() == "true",
+        "tail_poll_interval": float(os.getenv("TAIL_POLL_MS", "100")) / 1000,
+
+        "search_file_path": None,
+        "use_ssl": False,
+        "certfile": None,
+        "keyfile": None,
+
+        # TLS tuning, empty values keep the OpenSSL defaults
+        "ciphers": None,
+        "ecdh_curve": None,
+        "tls_session_tickets": 2,
+    }
+
+    try:
+        # Read the configuration file to get the path
+        with open(config_file_path, "r", encoding="utf8") as config_file:
+            for line in config_file:
+                if line.startswith("linuxpath="):
+                    config["search_file_path"] = line.strip().split("=")[1]
+                elif line.startswith("use_ssl="):
+                    config["use_ssl"] = \
+                        line.strip().split("=")[1].lower() == "true"
+                elif line.startswith("certfile="):
+                    config["certfile"] = line.strip().split("=")[1]
+                elif line.startswith("keyfile="):
+                    config["keyfile"] = line.strip().split("=")[1]
+                elif line.startswith("ciphers="):
+                    config["ciphers"] = line.strip().split("=")[1] or None
+                elif line.startswith("ecdh_curve="):
+                    config["ecdh_curve"] = \
+                        line.strip().split("=")[1] or None
+                elif line.startswith("tls_session_tickets="):
+                    config["tls_session_tickets"] = \
+                        int(line.strip().split("=")[1])
+    except FileNotFoundError:
+        raise ConfigError(
+            f"Configuration file {config_file_path} not found.") from None
+
+    logger.debug("Extracted path from config: %s",
+                 config["search_file_path"])
+
+    if config["search_engine"] not in ENGINES:
+        raise ConfigError(
+            f"Unknown SEARCH_ENGINE {config['search_engine']}, "
+            + f"expected one of: {', '.join(ENGINES)}")
+
+    # Refuse a missing file or file path
+    search_file_path = config["search_file_path"]
     if not search_file_path or not os.path.exists(search_file_path):
-        logger.error(
-            "Path to 200k.txt not found in %s or file does not exist.",
-            config_file_path)
-        sys.exit(1)
-except FileNotFoundError:
-    logger.error("Configuration file %s not found.", config_file_path)
+        raise ConfigError(
+            f"Path to 200k.txt not found in {config_file_path} "
+            + "or file does not exist.")
+
+    # Reread mode already sees every append, and compressed files
+    # cannot be appended to line by line
+    if config["tail_corpus"] and (config["reread_on_query"]
+                                  or corpus_codec(search_file_path)):
+        logger.warning("TAIL_CORPUS needs REREAD_ON_QUERY=False and a "
+                       "plain text corpus, not following %s",
+                       search_file_path)
+        config["tail_corpus"] = False
+    return config
+
+
+def apply_config(config: dict) -> None:
+    """Make loaded settings the ones the server runs with"""
+    global reread_on_query, mph_index_file, search_engine
+    global fuzzy_max_distance, fuzzy_max_results
+    global regex_max_results, regex_max_candidates, regex_time_budget
+    global locate_max_results
+    global max_connections, max_inflight_queries, idle_timeout, read_timeout
+    global scan_batch_window, scan_batch_size, coalesce_queries
+    global drain_timeout
+    global client_inflight, noisy_client_queue
+    global tail_corpus, tail_poll_interval
+    global search_file_path, use_ssl, certfile, keyfile
+    global ciphers, ecdh_curve, tls_session_tickets
+
+    reread_on_query = config["reread_on_query"]
+    mph_index_file = config["mph_index_file"]
+    search_engine = config["search_engine"]
+    fuzzy_max_distance = config["fuzzy_max_distance"]
+    fuzzy_max_results = config["fuzzy_max_results"]
+    regex_max_results = config["regex_max_results"]
+    regex_max_candidates = config["regex_max_candidates"]
+    regex_time_budget = config["regex_time_budget"]
+    locate_max_results = config["locate_max_results"]
+    max_connections = config["max_connections"]
+    max_inflight_queries = config["max_inflight_queries"]
+    idle_timeout = config["idle_timeout"]
+    read_timeout = config["read_timeout"]
+    scan_batch_window = config["scan_batch_window"]
+    scan_batch_size = config["scan_batch_size"]
+    coalesce_queries = config["coalesce_queries"]
+    drain_timeout = config["drain_timeout"]
+    client_inflight = config["client_inflight"]
+    noisy_client_queue = config["noisy_client_queue"]
+    tail_corpus = config["tail_corpus"]
+    tail_poll_interval = config["tail_poll_interval"]
+    search_file_path = config["search_file_path"]
+    use_ssl = config["use_ssl"]
+    certfile = config["certfile"]
+    keyfile = config["keyfile"]
+    ciphers = config["ciphers"]
+    ecdh_curve = config["ecdh_curve"]
+    tls_session_tickets = config["tls_session_tickets"]
+
+    # Queries already queued keep their place under the new limits
+    scheduler.set_limits(client_inflight, noisy_client_queue)
+    scan_batcher.set_limits(scan_batch_window, scan_batch_size)
+
+
+# Thread pool executor for multithreading
+EXECUTOR_WORKERS = 10
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+
+
+def log_noisy_client(client, stats: ClientStats) -> None:
+    """Report a connection whose queue reached noisy_client_queue"""
+    metrics.increment("noisy_clients")
+    logger.warning("Client %s has %d queries queued (%d run, mean wait "
+                   "%.1f ms)", client, stats.queued, stats.jobs,
+                   stats.mean_wait() * 1000)
+
+
+# Worker threads are handed out to connections in turn, so one client
+# pipelining slow queries only ever waits behind its own. Its limits
+# are set by apply_config.
+scheduler = FairScheduler(executor, EXECUTOR_WORKERS,
+                          on_backlog=log_noisy_client)
+
+# Batched reread scans, run by the scheduler as one client of their own.
+# Used while scan_batch_size is above 1, window and size are set by
+# apply_config.
+scan_batcher = ScanBatcher(
+    lambda: iter_corpus_lines(str(search_file_path)),
+    functools.partial(scheduler.submit, "scan batcher"), 0, 1)
+
+try:
+    apply_config(load_config())
+except ConfigError as e:
+    logger.error("%s", e)
     sys.exit(1)
 except Exception as e:
     logger.error("An unexpected error occurred: %s", e)
     sys.exit(1)
 
-# Cache the file contents if REREAD_ON_QUERY is False
-file_contents = None
+# Index of the file contents if REREAD_ON_QUERY is False. It is built
+# in the background by main(), queries are answered by scanning the
+# file until it is ready.
+corpus_index = None
+index_state = "ready" if reread_on_query else "building"
+first_response_logged = False
 
-if not reread_on_query:
-    try:
-        with open(search_file_path, "r", encoding="utf8") as file:
-            file_contents = file.readlines()
-    except Exception as e:
-        logger.error("Error reading the file: %s", e)
-        exit(1)
+# With TAIL_CORPUS, the lines appended since corpus_index was built.
+# Swapped together with corpus_index.
+corpus_tail = None
 
-# Thread pool executor for multithreading
-executor = ThreadPoolExecutor(max_workers=10)
+# Bumped every time a reload swaps in a new corpus or lines are appended
+corpus_version = 0
+
+# Corpus lines and indexes behind the query commands, built on first
+# use. A reload replaces the dict instead of clearing it, so a build
+# racing the swap only ever lands in the discarded one.
+command_indexes = {}
+# One lock per index name, so building one index never holds up
+# queries served by another
+command_index_locks = {}
+
+# At most one reload runs at a time, so at most two corpus indexes
+# (the live one and its replacement) are ever held in memory
+reload_in_progress = False
+
+# The TLS context connections are handed, swapped on reload. The
+# listening socket keeps its original context, whose SNI callback
+# moves each new handshake onto this one.
+active_ssl_context = None
+reload_tasks = set()
+
+# Set by SIGTERM: no new connections, open ones close after their reply
+draining = False
+shutdown_task = None
+DRAIN_POLL_INTERVAL = 0.05
+
+# Seconds connections closed after a drain get to hang up cleanly, for
+# instance to finish a TLS shutdown, before they are aborted
+CLOSE_TIMEOUT = 1.0
+
+# In-flight searches keyed by (corpus_version, query)
+single_flight = SingleFlight()
+
+# Live connection and query counts used for load shedding
+active_connections = 0
+inflight_queries = 0
+# In-flight queries of each connection, to share the query cap fairly
+client_queries = {}
+protocol_connection_ids = itertools.count(1)
+
+# Transports of the admitted connections, closed once a drain is over
+open_transports = set()
+
+metrics.register_gauge("active_connections", lambda: active_connections)
+metrics.register_gauge("inflight_queries", lambda: inflight_queries)
+metrics.register_gauge("log_records_dropped", get_dropped_records)
+metrics.register_gauge("index_ready", lambda: int(index_state == "ready"))
+metrics.register_gauge("corpus_version", lambda: corpus_version)
+metrics.register_gauge("tail_lines", lambda: len(corpus_tail or ()))
+metrics.register_gauge("scan_batches", lambda: scan_batcher.batches)
+metrics.register_gauge("scan_batch_size_avg",
+                       lambda: round(scan_batcher.ratio(), 1))
+metrics.register_gauge("coalesced_queries", lambda: single_flight.followers)
+metrics.register_gauge("coalescing_ratio",
+                       lambda: round(single_flight.ratio(), 3))
+metrics.register_gauge("scheduler_queued", scheduler.queued)
+metrics.register_gauge("scheduler_max_client_queue",
+                       scheduler.max_client_queue)
 
 
 def search_in_cached_file(query: str) -> str:
@@ -84,10 +367,14 @@ def search_in_cached_file(query: str) -> str:
         if not query.strip():
             return "STRING NOT FOUND\n"
 
-        for line in file_contents:
-            if file_contents and line.strip() == query:
-                return "STRING EXISTS\n"
-        return "STRING NOT FOUND\n"
+        index = corpus_index
+        tail = corpus_tail
+        if index is None:
+            # Index not built yet, stream the file instead
+            found = scan_corpus(str(search_file_path), query)
+        else:
+            found = query in index or (tail is not None and query in tail)
+        return "STRING EXISTS\n" if found else "STRING NOT FOUND\n"
     except Exception as e:
         logger.error("Error searching cached file: %s", e)
         return "ERROR\n"
@@ -108,33 +395,423 @@ async def search_string_in_file(query: str) -> str:
         return "ERROR\n"
 
 
+def search_in_file(query: str) -> str:
+    """Scan the file for the string, run in a worker thread"""
+    try:
+        if not query.strip():
+            return "STRING NOT FOUND\n"
+        found = scan_corpus(str(search_file_path), query)
+        return "STRING EXISTS\n" if found else "STRING NOT FOUND\n"
+    except Exception as e:
+        logger.error("Error searching in file: %s", e)
+        return "ERROR\n"
+
+
+async def search_in_file_batched(query: str) -> str:
+    """Look the string up through the next batched scan of the file"""
+    try:
+        if not query.strip():
+            return "STRING NOT FOUND\n"
+        found = await scan_batcher.contains(query)
+        return "STRING EXISTS\n" if found else "STRING NOT FOUND\n"
+    except Exception as e:
+        logger.error("Error searching in file: %s", e)
+        return "ERROR\n"
+
+
+def format_matches(lines: list, complete: bool = True) -> str:
+    """Multi-line response: a MATCHES header followed by one line each
+
+    PARTIAL is appended to the header when a search budget cut the
+    search short, so the lines may not be every match.
+    """
+    if not lines and complete:
+        return "STRING NOT FOUND\n"
+    header = f"MATCHES {len(lines)}" + ("" if complete else " PARTIAL")
+    return header + "\n" + "".join(f"{line}\n" for line in lines)
+
+
+def get_command_index(name: str, build: Callable[[], object]):
+    """Index called name over the live corpus, built on first use"""
+    # Keep to the dict seen here even if a reload swaps it meanwhile
+    indexes = command_indexes
+    index = indexes.get(name)
+    if index is not None:
+        return index
+
+    # setdefault is atomic, so every thread gets the same lock
+    with command_index_locks.setdefault(name, threading.Lock()):
+        index = indexes.get(name)
+        if index is None:
+            start_time = time.perf_counter()
+            index = indexes[name] = build()
+            logger.info("Built %s index in %.3f s", name,
+                        time.perf_counter() - start_time)
+        return index
+
+
+def load_line_store() -> Sequence[str]:
+    """Corpus lines for the command indexes, shared with the main index"""
+    # Engines that keep the lines in file order can share them
+    ordered = getattr(corpus_index, "ordered_lines", None)
+    tail = corpus_tail
+    if tail is not None:
+        # Lines past the tail's starting offset are answered by the tail
+        if ordered is not None and len(ordered) == tail.base_lines:
+            return ordered
+        return CompactCorpus.from_lines(itertools.islice(
+            iter_corpus_lines(str(search_file_path)), tail.base_lines))
+    if ordered is not None:
+        return ordered
+    return CompactCorpus.from_file(str(search_file_path))
+
+
+def get_line_store() -> Sequence[str]:
+    """Corpus lines in file order, loaded by the first command query"""
+    return get_command_index("line store", load_line_store)
+
+
+def get_fuzzy_index() -> FuzzyIndex:
+    """Fuzzy index over the corpus, built by the first FUZZY query"""
+    return get_command_index("fuzzy",
+                             lambda: FuzzyIndex(get_line_store()))
+
+
+def fuzzy_search(argument: str) -> str:
+    """Answer FUZZY <k> <query> with the lines within edit distance k"""
+    try:
+        distance, _, query = argument.partition(" ")
+        if not distance.isdigit() or not query.strip():
+            return "ERROR\n"
+        distance = int(distance)
+        if distance > fuzzy_max_distance:
+            return "ERROR\n"
+
+        if reread_on_query:
+            # The file may change between queries, match it directly
+            matches = fuzzy_scan(iter_corpus_lines(str(search_file_path)),
+                                 query, distance, fuzzy_max_results)
+        else:
+            tail = corpus_tail
+            matches = get_fuzzy_index().search(query, distance,
+                                               fuzzy_max_results)
+            if tail:
+                # Appended lines are few, match them directly
+                found = dict(matches)
+                for line, line_distance in fuzzy_scan(
+                        tail.appended[:], query, distance,
+                        fuzzy_max_results):
+                    found.setdefault(line, line_distance)
+                matches = sorted(found.items(),
+                                 key=lambda match: (match[1], match[0]))
+                matches = matches[:fuzzy_max_results]
+        return format_matches([f"{found} {line}" for line, found in matches])
+    except Exception as e:
+        logger.error("Error running fuzzy search: %s", e)
+        return "ERROR\n"
+
+
+def get_regex_index() -> RegexIndex:
+    """Trigram index over the corpus, built by the first REGEX query"""
+    return get_command_index("trigram",
+                             lambda: RegexIndex(get_line_store()))
+
+
+def regex_search(pattern: str) -> str:
+    """Answer REGEX <pattern> with the lines the pattern matches"""
+    try:
+        if not pattern:
+            return "ERROR\n"
+
+        if reread_on_query:
+            # The file may change between queries, match it directly
+            matches, complete = regex_scan(
+                iter_corpus_lines(str(search_file_path)), pattern,
+                regex_max_results, regex_max_candidates, regex_time_budget)
+        else:
+            tail = corpus_tail
+            matches, complete = get_regex_index().search(
+                pattern, regex_max_results, regex_max_candidates,
+                regex_time_budget)
+            if tail and complete and len(matches) < regex_max_results:
+                # Appended lines follow the indexed ones in file order
+                appended, complete = regex_scan(
+                    tail.appended[:], pattern,
+                    regex_max_results - len(matches),
+                    regex_max_candidates, regex_time_budget)
+                matches = matches + appended
+
+        if not complete:
+            metrics.increment("regex_budget_exceeded")
+        return format_matches(matches, complete)
+    except re.error:
+        return "ERROR\n"
+    except Exception as e:
+        logger.error("Error running regex search: %s", e)
+        return "ERROR\n"
+
+
+def get_posting_index() -> PostingIndex:
+    """Line number index, built by the first LOCATE or COUNT query"""
+    return get_command_index("posting",
+                             lambda: PostingIndex(get_line_store()))
+
+
+def locate_lines(query: str) -> Tuple[List[int], int]:
+    """Up to locate_max_results line numbers of query and its count"""
+    if reread_on_query:
+        # The file may change between queries, count it directly
+        return locate_scan(iter_corpus_lines(str(search_file_path)), query,
+                           locate_max_results)
+    tail = corpus_tail
+    numbers, count = get_posting_index().locate(query, locate_max_results)
+    if tail is not None:
+        appended, appended_count = tail.locate(query, locate_max_results)
+        numbers = (numbers + appended)[:locate_max_results]
+        count += appended_count
+    return numbers, count
+
+
+def locate_search(query: str) -> str:
+    """Answer LOCATE <query> with the line numbers holding the string"""
+    try:
+        if not query.strip():
+            return "ERROR\n"
+        numbers, count = locate_lines(query)
+        # PARTIAL marks a reply cut short by LOCATE_MAX_RESULTS
+        return format_matches(numbers, complete=len(numbers) == count)
+    except Exception as e:
+        logger.error("Error locating lines: %s", e)
+        return "ERROR\n"
+
+
+def count_search(query: str) -> str:
+    """Answer COUNT <query> with the number of lines holding the string"""
+    try:
+        if not query.strip():
+            return "ERROR\n"
+        if reread_on_query:
+            _, count = locate_lines(query)
+        else:
+            tail = corpus_tail
+            count = get_posting_index().count(query)
+            if tail is not None:
+                count += tail.count(query)
+        return f"COUNT {count}\n"
+    except Exception as e:
+        logger.error("Error counting lines: %s", e)
+        return "ERROR\n"
+
+
+# Query commands answered in a worker thread, keyed by their first word
+COMMANDS = {
+    "FUZZY": fuzzy_search,
+    "REGEX": regex_search,
+    "LOCATE": locate_search,
+    "COUNT": count_search,
+}
+
+
+async def resolve_query(query: str, client=None) -> str:
+    """Answer a single query, sharing the search with identical ones
+
+    client identifies the connection for fair scheduling, queries
+    without one share a single queue.
+    """
+    if query == STATS_COMMAND:
+        return metrics.format_stats()
+    if query == READY_COMMAND:
+        return "READY\n" if index_state == "ready" else "NOT READY\n"
+
+    if not coalesce_queries:
+        return await run_query(query, client)
+    # A reload changes the answers, so only match the same corpus
+    return await single_flight.run((corpus_version, query), run_query,
+                                   query, client)
+
+
+def over_fair_share(client) -> bool:
+    """Whether a connection holds its share of max_inflight_queries"""
+    clients = len(client_queries) + (client not in client_queries)
+    share = -(-max_inflight_queries // clients)
+    return client_queries.get(client, 0) >= share
+
+
+async def run_query(query: str, client=None) -> str:
+    """Search for a query, shedding load when too many are in flight"""
+    global inflight_queries
+
+    # Reject straight away instead of queueing behind the executor, but
+    # only the connections holding their share of the cap, so one that
+    # pipelines many queries cannot lock the others out
+    if inflight_queries >= max_inflight_queries and over_fair_share(client):
+        metrics.increment("queries_rejected")
+        return BUSY_RESPONSE
+
+    inflight_queries += 1
+    client_queries[client] = client_queries.get(client, 0) + 1
+    try:
+        # Commands are CPU bound, keep them off the event loop
+        command, _, argument = query.partition(" ")
+        handler = COMMANDS.get(command)
+        if handler is not None:
+            return await scheduler.submit(client, handler, argument)
+
+        # Response from search of the text file
+        if reread_on_query:
+            if scan_batch_size > 1:
+                return await search_in_file_batched(query)
+            return await scheduler.submit(client, search_in_file, query)
+
+        # Run the search in a seperate thread
+        return await scheduler.submit(client, search_in_cached_file, query)
+    finally:
+        inflight_queries -= 1
+        if client_queries[client] > 1:
+            client_queries[client] -= 1
+        else:
+            del client_queries[client]
+
+
+async def answer_query(query: str, client=None) -> str:
+    """Resolve a query and record it in the metrics and the query log"""
+    global first_response_logged
+
+    response = await resolve_query(query, client)
+    metrics.increment("queries")
+
+    if not first_response_logged:
+        first_response_logged = True
+        logger.info("Time to first response: %.3f s",
+                    time.monotonic() - startup_time)
+
+    # Skip formatting entirely unless the record will be kept
+    if (logger.isEnabledFor(logging.DEBUG)
+            and query_log_sampler.should_log()):
+        logger.debug("Query: %s Response: %s", query, response)
+    return response
+
+
+async def serve_binary_client(reader: StreamReader, writer: StreamWriter,
+                              initial: bytes, client=None) -> None:
+    """Serve a connection that negotiated the binary protocol"""
+    metrics.increment("binary_connections")
+    try:
+        await handle_binary_connection(reader, writer,
+                                       functools.partial(answer_query,
+                                                         client=client),
+                                       initial=initial,
+                                       idle_timeout=idle_timeout,
+                                       read_timeout=read_timeout,
+                                       close_when_idle=lambda: draining)
+    except asyncio.TimeoutError:
+        metrics.increment("idle_timeouts")
+    except ProtocolError as e:
+        metrics.increment("protocol_errors")
+        logger.warning("Closing binary connection: %s", e)
+
+
+def admit_connection(transport=None) -> bool:
+    """Count a new connection, or refuse it when the cap is reached"""
+    global active_connections
+    if active_connections >= max_connections:
+        metrics.increment("connections_rejected")
+        return False
+    active_connections += 1
+    if transport is not None:
+        open_transports.add(transport)
+    metrics.increment("connections_accepted")
+    return True
+
+
+def release_connection(client=None, transport=None) -> None:
+    """Forget a connection counted by admit_connection"""
+    global active_connections
+    active_connections -= 1
+    open_transports.discard(transport)
+
+    stats = scheduler.forget(client)
+    if stats is not None and stats.jobs:
+        logger.debug("Client %s closed: %d queries, max queue %d, mean "
+                     "wait %.1f ms", client, stats.jobs, stats.max_queued,
+                     stats.mean_wait() * 1000)
+
+
+def create_protocol() -> SearchProtocol:
+    """Protocol factory for the asyncio.Protocol server implementation"""
+    # Peer addresses are not known yet, number the connections instead
+    client = f"protocol connection {next(protocol_connection_ids)}"
+    protocol = SearchProtocol(
+        functools.partial(answer_query, client=client),
+        admit=lambda: admit_connection(protocol.transport),
+        release=lambda: release_connection(client, protocol.transport),
+        idle_timeout=idle_timeout, read_timeout=read_timeout,
+        close_after_reply=lambda: draining)
+    return protocol
+
+
 async def handle_client(reader: StreamReader, writer: StreamWriter) -> None:
     """Async function which handles concurrent tasks to the client"""
+    # Turn the connection away before it can queue any work
+    if not admit_connection(writer.transport):
+        try:
+            writer.write(BUSY_RESPONSE.encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        return
+
+    # Scheduling key of this connection, Unix sockets have no peer name
+    client = writer.get_extra_info("peername") or f"connection {id(writer)}"
     try:
+        # The first query must arrive within the read timeout
+        awaiting_first_query = True
         while True:
-            # Maximum payload of 1024 bytes
-            data = await reader.read(1024)
+            timeout = read_timeout if awaiting_first_query else idle_timeout
+            try:
+                # Maximum payload of 1024 bytes
+                data = await asyncio.wait_for(reader.read(1024),
+                                              timeout or None)
+            except asyncio.TimeoutError:
+                metrics.increment("read_timeouts" if awaiting_first_query
+                                  else "idle_timeouts")
+                break
             if not data:
                 # Discontinue program if maximum payload is exceeded
                 break
 
+            if awaiting_first_query:
+                # The magic may be split across the first reads
+                try:
+                    while len(data) < len(MAGIC) and MAGIC.startswith(data):
+                        more = await asyncio.wait_for(reader.read(1024),
+                                                      read_timeout or None)
+                        if not more:
+                            break
+                        data += more
+                except asyncio.TimeoutError:
+                    metrics.increment("read_timeouts")
+                    break
+
+                # Negotiate the binary protocol on the first bytes
+                if data.startswith(MAGIC):
+                    await serve_binary_client(reader, writer,
+                                              data[len(MAGIC):], client)
+                    break
+
+            # Later queries may arrive after an idle pause
+            awaiting_first_query = False
+
             # Strip \x00 characters from the end of the payload
             stripped_data = data.rstrip(b"\x00")
 
             # Convert raw bytes from server to human readable format
             query: str = stripped_data.decode().strip()
 
-            # Response from search of the text file
-            if reread_on_query:
-                response = await search_string_in_file(query)
-            else:
-                # Run the search in a seperate thread
-                loop = asyncio.get_running_loop()  # Get current loop
-                response = await loop.run_in_executor(executor,
-                                                      search_in_cached_file,
-                                                      query)
-
-            logger.debug("Query: %s Response: %s", query, response)
+            response = await answer_query(query, client)
 
             # Encode the response
             encoded_response = response.encode()
@@ -144,12 +821,18 @@ async def handle_client(reader: StreamReader, writer: StreamWriter) -> None:
 
             # Ensure future operations occurs after data is transmitted
             await writer.drain()
+
+            # While draining, close each connection after its reply
+            if draining:
+                break
     except asyncio.CancelledError:
         # Return error if an error occured while connecting to client
         logger.error("Error occured while connecting to client server")
     except Exception as e:
         logger.error("An unexpected error happened: %s", e)
     finally:
+        release_connection(client, writer.transport)
+
         # Close the connection to client server
         writer.close()
 
@@ -157,18 +840,335 @@ async def handle_client(reader: StreamReader, writer: StreamWriter) -> None:
         await writer.wait_closed()
 
 
+def create_ssl_context(config: Optional[dict] = None) -> ssl.SSLContext:
+    """Build the server TLS context tuned for cheap session resumption
+
+    Uses the running settings unless a freshly loaded config is given.
+    """
+    if config is None:
+        config = {"certfile": certfile, "keyfile": keyfile,
+                  "ciphers": ciphers, "ecdh_curve": ecdh_curve,
+                  "tls_session_tickets": tls_session_tickets}
+
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(certfile=str(config["certfile"]),
+                                keyfile=str(config["keyfile"]))
+
+    # Hand out session tickets so returning clients skip the full handshake
+    ssl_context.options &= ~ssl.OP_NO_TICKET
+    ssl_context.num_tickets = config["tls_session_tickets"]
+
+    # Cipher preferences apply to TLS 1.2, TLS 1.3 suites are fixed
+    if config["ciphers"]:
+        ssl_context.set_ciphers(config["ciphers"])
+    if config["ecdh_curve"]:
+        ssl_context.set_ecdh_curve(config["ecdh_curve"])
+    return ssl_context
+
+
+def select_ssl_context(ssl_object: ssl.SSLObject, server_name: Optional[str],
+                       ssl_context: ssl.SSLContext) -> None:
+    """SNI callback moving a handshake onto the latest TLS context
+
+    OpenSSL calls it for every handshake, with or without SNI, so a
+    reloaded certificate is served to every new connection.
+    """
+    if active_ssl_context is not None \
+            and active_ssl_context is not ssl_context:
+        ssl_object.context = active_ssl_context
+
+
+def peak_memory_kib() -> int:
+    """Peak resident set size of the process so far, in KiB"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def load_corpus_index(engine: str, path: str, index_path: Optional[str],
+                      follow: bool):
+    """Build the engine, plus the tail following the file when asked"""
+    if not follow:
+        return create_engine(engine, path, index_path=index_path), None
+
+    # Taken first, so lines appended during the build are not missed.
+    # The engine holds exactly the complete lines before the tail's
+    # offset, a partial last line is left to the tail.
+    tail = CorpusTail.at_end(path)
+    return create_engine(engine, path, index_path=index_path,
+                         max_lines=tail.base_lines), tail
+
+
+async def build_index() -> None:
+    """Build the corpus index in a background thread and switch to it"""
+    global corpus_index, corpus_tail, index_state, corpus_version
+    global command_indexes
+
+    try:
+        loop = asyncio.get_running_loop()
+        index, tail = await loop.run_in_executor(
+            None, functools.partial(load_corpus_index, search_engine,
+                                    str(search_file_path), mph_index_file,
+                                    tail_corpus))
+        # Commands answered during the build read the whole file, drop
+        # their indexes so none outlives the switch to the tail
+        corpus_index, corpus_tail = index, tail
+        corpus_version += 1
+        command_indexes = {}
+        index_state = "ready"
+        logger.info("Time to index ready: %.3f s (%d lines, %s engine, "
+                    "preprocessing: %s)", time.monotonic() - startup_time,
+                    len(corpus_index), search_engine,
+                    ", ".join(corpus_index.preprocessing) or "none")
+    except Exception as e:
+        # Keep serving through the scan fallback but stay not ready
+        index_state = "failed"
+        logger.error("Error building the index: %s", e)
+
+
+async def reload_server() -> bool:
+    """Re-read .env and the config file and switch over to them
+
+    The new index and TLS context are built in the background while the
+    current ones keep serving; the switch itself never awaits, so every
+    query sees either the old or the new settings, never a mix. Queries
+    already running finish on the index they started with.
+    """
+    global corpus_index, corpus_tail, index_state, corpus_version
+    global command_indexes, active_ssl_context, reload_in_progress
+
+    # A second index build alongside this one would raise the peak again
+    if reload_in_progress or index_state == "building":
+        metrics.increment("reloads_refused")
+        logger.warning("Reload refused, an index build is still running")
+        return False
+
+    reload_in_progress = True
+    start_time = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        load_dotenv(override=True)
+        config = await loop.run_in_executor(None, load_config)
+
+        if config["use_ssl"] != use_ssl:
+            logger.warning("use_ssl changes need a restart, keeping %s",
+                           use_ssl)
+            config["use_ssl"] = use_ssl
+
+        new_ssl_context = None
+        if active_ssl_context is not None:
+            new_ssl_context = create_ssl_context(config)
+
+        new_index = None
+        new_tail = None
+        if not config["reread_on_query"]:
+            logger.info("Reload: building the %s index, peak RSS %d KiB",
+                        config["search_engine"], peak_memory_kib())
+            new_index, new_tail = await loop.run_in_executor(
+                None, functools.partial(
+                    load_corpus_index, config["search_engine"],
+                    str(config["search_file_path"]),
+                    config["mph_index_file"], config["tail_corpus"]))
+
+        # Switch over, nothing below may await
+        apply_config(config)
+        corpus_index = new_index
+        corpus_tail = new_tail
+        index_state = "ready"
+        corpus_version += 1
+        command_indexes = {}
+        if new_ssl_context is not None:
+            active_ssl_context = new_ssl_context
+
+        metrics.increment("reloads")
+        logger.info("Reloaded configuration in %.3f s (corpus version %d, "
+                    "peak RSS %d KiB)", time.perf_counter() - start_time,
+                    corpus_version, peak_memory_kib())
+        return True
+    except Exception as e:
+        metrics.increment("reloads_failed")
+        logger.error("Reload failed, keeping the running configuration: %s",
+                     e)
+        return False
+    finally:
+        reload_in_progress = False
+
+
+async def rebuild_index() -> None:
+    """Rebuild the index of a corpus that was truncated or replaced"""
+    global corpus_index, corpus_tail, corpus_version, command_indexes
+    global reload_in_progress
+
+    # Counts as a reload, so a SIGHUP meanwhile is refused
+    reload_in_progress = True
+    start_time = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        new_index, new_tail = await loop.run_in_executor(
+            None, functools.partial(load_corpus_index, search_engine,
+                                    str(search_file_path), mph_index_file,
+                                    True))
+
+        # Switch over, nothing below may await
+        corpus_index = new_index
+        corpus_tail = new_tail
+        corpus_version += 1
+        command_indexes = {}
+
+        metrics.increment("tail_rebuilds")
+        logger.info("Rebuilt the index in %.3f s (%d lines)",
+                    time.perf_counter() - start_time, len(new_index))
+    except Exception as e:
+        # Stop following, the next reload starts over
+        corpus_tail = None
+        logger.error("Error rebuilding the index, no longer following "
+                     "appends: %s", e)
+    finally:
+        reload_in_progress = False
+
+
+async def follow_corpus() -> None:
+    """Poll the corpus and index the lines appended to it"""
+    global corpus_version
+
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(tail_poll_interval)
+        tail = corpus_tail
+        if tail is None or reload_in_progress:
+            continue
+
+        try:
+            start_time = time.perf_counter()
+            appended = await loop.run_in_executor(None, tail.poll)
+        except (OSError, UnicodeDecodeError) as e:
+            # A file being replaced may be briefly missing, try again
+            logger.debug("Could not poll the corpus: %s", e)
+            continue
+        if tail is not corpus_tail:
+            # A reload swapped the tail while this poll ran
+            continue
+
+        if appended is None:
+            logger.info("Corpus %s was truncated or replaced, rebuilding "
+                        "the index", tail.path)
+            await rebuild_index()
+        elif appended:
+            # Answers coalesced before the append must not be reused
+            corpus_version += 1
+            metrics.increment("tail_lines_indexed", appended)
+            logger.debug("Indexed %d appended lines in %.1f ms", appended,
+                         (time.perf_counter() - start_time) * 1000)
+
+
+def request_reload() -> None:
+    """SIGHUP handler, starts a reload in the background"""
+    logger.info("SIGHUP received, reloading the configuration")
+    task = asyncio.ensure_future(reload_server())
+    # Hold a reference until the reload is done
+    reload_tasks.add(task)
+    task.add_done_callback(reload_tasks.discard)
+
+
+def request_shutdown(server: asyncio.AbstractServer) -> None:
+    """SIGTERM handler, stops accepting and starts draining"""
+    global draining, shutdown_task
+    if draining:
+        return
+    logger.info("SIGTERM received, draining %d in-flight queries",
+                inflight_queries)
+    draining = True
+    # Ends serve_forever, open connections are left running
+    server.close()
+    # Runs alongside serve_forever, which on Python 3.12 and later only
+    # returns once every connection is closed
+    shutdown_task = asyncio.ensure_future(shut_down())
+
+
+async def drain_queries() -> None:
+    """Wait for in-flight queries to finish, at most drain_timeout"""
+    deadline = time.monotonic() + drain_timeout
+    while inflight_queries and time.monotonic() < deadline:
+        await asyncio.sleep(DRAIN_POLL_INTERVAL)
+
+    if inflight_queries:
+        logger.warning("Drain timed out with %d queries in flight",
+                       inflight_queries)
+    else:
+        logger.info("Drained, shutting down")
+
+
+async def close_connections() -> None:
+    """Hang up on every connection still open after the drain
+
+    Idle connections would otherwise keep the server running until
+    their idle timeout, as closing it waits for every connection on
+    Python 3.12 and later.
+    """
+    if not open_transports:
+        return
+    logger.info("Closing %d open connections", len(open_transports))
+    for transport in list(open_transports):
+        transport.close()
+
+    deadline = time.monotonic() + CLOSE_TIMEOUT
+    while open_transports and time.monotonic() < deadline:
+        await asyncio.sleep(DRAIN_POLL_INTERVAL)
+    for transport in list(open_transports):
+        transport.abort()
+
+
+async def shut_down() -> None:
+    """Drain in-flight queries, then close the connections left open"""
+    await drain_queries()
+    await close_connections()
+
+
 async def main() -> None:
     """Main function of the program"""
+    global active_ssl_context
+
+    index_task = None
+    tail_task = None
+    loop = asyncio.get_running_loop()
+    reload_signal = getattr(signal, "SIGHUP", None)
+    shutdown_signal = getattr(signal, "SIGTERM", None)
     try:
+        # Bind first, the index is built while connections are served
+        if not reread_on_query:
+            index_task = asyncio.create_task(build_index())
+
+        # Idle unless TAIL_CORPUS is set, a reload may turn it on
+        tail_task = asyncio.create_task(follow_corpus())
+
         ssl_context = None
         if use_ssl:
-            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ssl_context.load_cert_chain(certfile=str(certfile),
-                                        keyfile=str(keyfile))
+            ssl_context = create_ssl_context()
+            # Reloads swap certificates in through the SNI callback
+            active_ssl_context = ssl_context
+            ssl_context.sni_callback = select_ssl_context
+
+        if reload_signal is not None:
+            loop.add_signal_handler(reload_signal, request_reload)
+
+        # Sockets bound by systemd are used as they are, they stay open
+        # across restarts
+        sockets = listen_sockets()
+        if len(sockets) > 1:
+            logger.warning("Using the first of %d activated sockets",
+                           len(sockets))
+        if sockets:
+            listen_options = {"sock": sockets[0]}
+        else:
+            listen_options = {"host": host, "port": port}
 
         # Start asyncio server and handle client connections
-        client_server = await asyncio.start_server(
-            handle_client, host, port, ssl=ssl_context)
+        if server_impl == "protocol":
+            client_server = await loop.create_server(
+                create_protocol, ssl=ssl_context, **listen_options)
+        else:
+            client_server = await asyncio.start_server(
+                handle_client, ssl=ssl_context, **listen_options)
 
         # Retrieves the server address for incoming connections
         client_address = client_server.sockets[0].getsockname()
@@ -176,9 +1176,20 @@ async def main() -> None:
         # Indicate server is listening for incoming connections
         logger.debug("Serving on %s", client_address)
 
+        if shutdown_signal is not None:
+            loop.add_signal_handler(shutdown_signal, request_shutdown,
+                                    client_server)
+
         async with client_server:
-            # Server is active and should start serving forever
-            await client_server.serve_forever()
+            try:
+                # Server is active and should start serving forever
+                await client_server.serve_forever()
+            except asyncio.CancelledError:
+                # request_shutdown closing the server lands here
+                if not draining:
+                    raise
+            if shutdown_task is not None:
+                await shutdown_task
     except FileNotFoundError:
         logger.error(
             "Kindly double-check the SSL files: %s, %s for errors",
@@ -187,6 +1198,14 @@ async def main() -> None:
     except Exception as e:
         logger.error("An unexpected error occurred: %s", e)
         sys.exit(1)
+    finally:
+        for handled_signal in (reload_signal, shutdown_signal):
+            if handled_signal is not None:
+                loop.remove_signal_handler(handled_signal)
+        if index_task is not None and not index_task.done():
+            index_task.cancel()
+        if tail_task is not None:
+            tail_task.cancel()
 
 
 if __name__ == "__main__":
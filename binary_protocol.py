@@ -0,0 +1,281 @@
+"""Length-prefixed binary protocol with request IDs.
+
+A client opts in by sending MAGIC as the first bytes of a connection;
+anything else is treated as the plain text protocol. The server echoes
+MAGIC back, after which both sides exchange frames:
+
+    request:  !IIB  body length, request id, kind   + body
+    response: !IIB  body length, request id, status + body
+
+A QUERY body is the UTF-8 query. A BATCH body is a sequence of queries,
+each prefixed with its !H length, at most MAX_BATCH_ITEMS of them.
+Requests on one connection are served concurrently, up to
+MAX_INFLIGHT_FRAMES at a time, and every response is written as soon as
+it is ready, so clients match replies to requests by ID rather than by
+order.
+"""
+
+import struct
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+
+MAGIC = b"\x00FSB"
+
+HEADER = struct.Struct("!IIB")
+ITEM_LENGTH = struct.Struct("!H")
+ITEM_HEADER = struct.Struct("!BH")
+
+# Largest reply one batch item can carry in its !H length
+MAX_ITEM_SIZE = 0xFFFF
+
+# Largest frame body accepted from a peer
+MAX_FRAME_SIZE = 1024 * 1024
+
+# Queries one BATCH frame may carry, and how many of them run at once
+MAX_BATCH_ITEMS = 1024
+BATCH_CONCURRENCY = 16
+
+# Frames one connection may have being answered at once. Further frames
+# are not read until one finishes, pushing back on the peer.
+MAX_INFLIGHT_FRAMES = 64
+
+# Request kinds
+QUERY = 1
+BATCH = 2
+
+# Response status codes
+EXISTS = 0
+NOT_FOUND = 1
+ERROR = 2
+BUSY = 3
+DATA = 4
+BATCH_RESULT = 5
+
+_STATUS_BY_RESPONSE = {
+    "STRING EXISTS\n": EXISTS,
+    "STRING NOT FOUND\n": NOT_FOUND,
+    "ERROR\n": ERROR,
+    "BUSY\n": BUSY,
+}
+_RESPONSE_BY_STATUS = {
+    status: response for response, status in _STATUS_BY_RESPONSE.items()}
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends a malformed frame"""
+
+
+def encode_request(request_id: int, query: str) -> bytes:
+    """Frame a single query"""
+    body = query.encode()
+    return HEADER.pack(len(body), request_id, QUERY) + body
+
+
+def encode_batch_request(request_id: int, queries: List[str]) -> bytes:
+    """Frame several queries to be answered in one response"""
+    parts = []
+    for query in queries:
+        encoded = query.encode()
+        parts.append(ITEM_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    body = b"".join(parts)
+    return HEADER.pack(len(body), request_id, BATCH) + body
+
+
+def decode_batch_request(body: bytes,
+                         max_items: int = MAX_BATCH_ITEMS) -> List[str]:
+    """Split a BATCH body back into its queries"""
+    queries = []
+    offset = 0
+    while offset < len(body):
+        if len(queries) >= max_items:
+            raise ProtocolError(f"Batch holds more than {max_items} items")
+        if offset + ITEM_LENGTH.size > len(body):
+            raise ProtocolError("Truncated batch item header")
+        (length,) = ITEM_LENGTH.unpack_from(body, offset)
+        offset += ITEM_LENGTH.size
+        if offset + length > len(body):
+            raise ProtocolError("Truncated batch item")
+        queries.append(body[offset:offset + length].decode())
+        offset += length
+    return queries
+
+
+def _status_and_payload(response: str) -> Tuple[int, bytes]:
+    """Compact status code for a text response, with a body if needed"""
+    status = _STATUS_BY_RESPONSE.get(response)
+    if status is not None:
+        return status, b""
+    return DATA, response.encode()
+
+
+def encode_response(request_id: int, response: str) -> bytes:
+    """Frame the text response of a single query"""
+    status, payload = _status_and_payload(response)
+    return HEADER.pack(len(payload), request_id, status) + payload
+
+
+def encode_batch_response(request_id: int, responses: List[str]) -> bytes:
+    """Frame the text responses of a batch, in request order
+
+    A reply too long for its item length is sent as ERROR instead.
+    """
+    parts = []
+    for response in responses:
+        status, payload = _status_and_payload(response)
+        if len(payload) > MAX_ITEM_SIZE:
+            status, payload = ERROR, b""
+        parts.append(ITEM_HEADER.pack(status, len(payload)))
+        parts.append(payload)
+    body = b"".join(parts)
+    return HEADER.pack(len(body), request_id, BATCH_RESULT) + body
+
+
+def decode_response(status: int, body: bytes) -> str:
+    """Turn a single response frame back into the text response"""
+    if status == DATA:
+        return body.decode()
+    try:
+        return _RESPONSE_BY_STATUS[status]
+    except KeyError as e:
+        raise ProtocolError(f"Unknown status code {status}") from e
+
+
+def decode_batch_response(body: bytes) -> List[str]:
+    """Turn a BATCH_RESULT body back into the text responses"""
+    responses = []
+    offset = 0
+    while offset < len(body):
+        if offset + ITEM_HEADER.size > len(body):
+            raise ProtocolError("Truncated batch result header")
+        status, length = ITEM_HEADER.unpack_from(body, offset)
+        offset += ITEM_HEADER.size
+        responses.append(decode_response(status,
+                                         body[offset:offset + length]))
+        offset += length
+    return responses
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """Read one frame, returning (request id, kind or status, body)"""
+    header = await reader.readexactly(HEADER.size)
+    length, request_id, kind = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the limit")
+    body = await reader.readexactly(length) if length else b""
+    return request_id, kind, body
+
+
+async def _resolve_batch(queries: List[str],
+                         resolve: Callable[[str], Awaitable[str]],
+                         concurrency: int) -> List[str]:
+    """Answer the queries of a batch, at most concurrency at a time"""
+    responses = [""] * len(queries)
+    positions = iter(range(len(queries)))
+
+    async def worker() -> None:
+        for position in positions:
+            responses[position] = await resolve(queries[position].strip())
+
+    await asyncio.gather(*(worker()
+                           for _ in range(min(concurrency, len(queries)))))
+    return responses
+
+
+async def _serve_frame(request_id: int, kind: int, body: bytes,
+                       resolve: Callable[[str], Awaitable[str]],
+                       writer: asyncio.StreamWriter,
+                       write_lock: asyncio.Lock,
+                       max_batch_items: int = MAX_BATCH_ITEMS) -> None:
+    """Answer one request frame and write its response"""
+    try:
+        if kind == QUERY:
+            response = await resolve(body.decode().strip())
+            frame = encode_response(request_id, response)
+        elif kind == BATCH:
+            queries = decode_batch_request(body, max_batch_items)
+            responses = await _resolve_batch(queries, resolve,
+                                             BATCH_CONCURRENCY)
+            frame = encode_batch_response(request_id, responses)
+        else:
+            frame = HEADER.pack(0, request_id, ERROR)
+        if len(frame) - HEADER.size > MAX_FRAME_SIZE:
+            # The peer would refuse the frame and drop the connection
+            frame = HEADER.pack(0, request_id, ERROR)
+    except (ProtocolError, UnicodeDecodeError):
+        frame = HEADER.pack(0, request_id, ERROR)
+
+    async with write_lock:
+        try:
+            writer.write(frame)
+            await writer.drain()
+        except ConnectionError:
+            # The peer went away, there is nobody left to answer
+            pass
+
+
+async def handle_binary_connection(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+        resolve: Callable[[str], Awaitable[str]], initial: bytes = b"",
+        idle_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_inflight_frames: int = MAX_INFLIGHT_FRAMES,
+        max_batch_items: int = MAX_BATCH_ITEMS,
+        close_when_idle: Optional[Callable[[], bool]] = None) -> None:
+    """Serve a connection that negotiated the binary protocol
+
+    initial holds whatever was read past MAGIC during negotiation.
+    Raises asyncio.TimeoutError when the peer goes quiet for longer
+    than idle_timeout, or stalls inside a frame for read_timeout.
+    Whenever a frame is answered and none is left in flight, the
+    connection is closed if close_when_idle returns True.
+    """
+    writer.write(MAGIC)
+    await writer.drain()
+
+    buffer = bytearray(initial)
+    pending = set()
+    write_lock = asyncio.Lock()
+    frame_slots = asyncio.Semaphore(max_inflight_frames)
+
+    def finish_frame(task: asyncio.Task) -> None:
+        pending.discard(task)
+        frame_slots.release()
+        if (not pending and close_when_idle is not None
+                and close_when_idle()):
+            writer.close()
+
+    try:
+        while True:
+            # Dispatch every complete frame currently buffered
+            while len(buffer) >= HEADER.size:
+                length, request_id, kind = HEADER.unpack_from(buffer)
+                if length > MAX_FRAME_SIZE:
+                    raise ProtocolError(
+                        f"Frame of {length} bytes exceeds the limit")
+                end = HEADER.size + length
+                if len(buffer) < end:
+                    break
+                body = bytes(buffer[HEADER.size:end])
+                del buffer[:end]
+
+                # Wait for a slot instead of queueing tasks without bound
+                await frame_slots.acquire()
+                task = asyncio.create_task(_serve_frame(
+                    request_id, kind, body, resolve, writer, write_lock,
+                    max_batch_items))
+                pending.add(task)
+                task.add_done_callback(finish_frame)
+
+            # A partial frame must complete within the read timeout
+            timeout = read_timeout if buffer else idle_timeout
+            data = await asyncio.wait_for(reader.read(65536),
+                                          timeout or None)
+            if not data:
+                break
+            buffer += data
+    finally:
+        # Let requests already accepted finish before the socket closes
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
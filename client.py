@@ -1,10 +1,25 @@
-"""Client server script that interacts with the async server."""
+"""Client server script that interacts with the async server.
+
+tcp_client sends one query per connection. SearchClient is the
+reusable client: it keeps a bounded pool of binary protocol
+connections open, pipelines concurrent requests over them and sends
+batch lookups as one frame. SyncSearchClient wraps it for scripts.
+"""
 
 import os
 import sys
+import time
 import asyncio
+import itertools
 import ssl
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from binary_protocol import (BATCH_RESULT, MAGIC, ProtocolError,
+                             decode_batch_response, decode_response,
+                             encode_batch_request, encode_request,
+                             read_frame)
 from config.logging_config import get_logger
 
 
@@ -33,15 +48,63 @@ except Exception as e:
     sys.exit(1)
 
 
-async def tcp_client(query: str):
-    """TCP Client Server Function"""
+class ResumableSSLContext(ssl.SSLContext):
+    """Client TLS context that offers the last session on new handshakes
+
+    asyncio does not expose the session argument of wrap_bio, so the
+    context keeps the most recent session itself and injects it.
+    """
+
+    session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False,
+                 server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.session
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname,
+                                session=session)
+
+
+# Built once, loading the CA file on every query is wasted work
+_ssl_context = None
+
+
+def get_ssl_context():
+    """Return the shared client TLS context, or None without SSL"""
+    global _ssl_context
+    if not use_ssl:
+        return None
+    if _ssl_context is None:
+        _ssl_context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        _ssl_context.load_verify_locations(cafile=certfile)
+    return _ssl_context
+
+
+def remember_session(writer) -> bool:
+    """Store the connection's TLS session for the next handshake
+
+    Returns True when the handshake itself was a resumption. TLS 1.3
+    tickets only arrive after the first read, so call this after one.
+    """
+    ssl_object = writer.get_extra_info("ssl_object")
+    if ssl_object is None:
+        return False
+    if ssl_object.session is not None and _ssl_context is not None:
+        _ssl_context.session = ssl_object.session
+    return ssl_object.session_reused
+
+
+async def tcp_client(query: str) -> Optional[str]:
+    """TCP Client Server Function
+
+    Returns the server's reply, or None when the query failed.
+    """
     writer = None
+    encoded_data = None
     try:
         # Function to test the async program for concurrent connections
-        ssl_context = None
-        if use_ssl:
-            ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH,
-                                                     cafile=certfile)
+        ssl_context = get_ssl_context()
 
         # Establish connection to the server
         reader, writer = await asyncio.open_connection(host, port,
@@ -62,6 +125,9 @@ async def tcp_client(query: str):
 
         logger.debug("Recieved: %s", encoded_data)
 
+        # Keep the session ticket for the next connection
+        remember_session(writer)
+
     except Exception as e:
         # Handle any error that occurs during execution
         logger.error("Error occured when running the server: %s", e)
@@ -74,6 +140,385 @@ async def tcp_client(query: str):
             # Ensure connection is closed
             await writer.wait_closed()
 
+    return encoded_data
+
+
+async def persistent_tcp_client(queries: list) -> list:
+    """Send several queries over one connection and return the replies
+
+    Avoids a TCP and TLS handshake per query for scripts that look up
+    many strings in a row.
+    """
+    responses = []
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=get_ssl_context())
+
+        for query in queries:
+            writer.write(query.encode())
+            await writer.drain()
+
+            # Maximum payload of 1024 bytes
+            data = await reader.read(1024)
+            if not data:
+                break
+            responses.append(data.decode())
+
+        remember_session(writer)
+    except Exception as e:
+        logger.error("Error occured when running the server: %s", e)
+    finally:
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+    return responses
+
+
+class LatencyStats:
+    """Client side request counters and recent latencies"""
+
+    def __init__(self, window: int = 10000) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.connections_opened = 0
+        # Seconds per successful request, the most recent window only
+        self._latencies = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        """Count a successful request and its latency"""
+        self.requests += 1
+        self._latencies.append(seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Latency in seconds below which fraction of requests fell"""
+        if not self._latencies:
+            return 0.0
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1,
+                             int(fraction * len(latencies)))]
+
+    def snapshot(self) -> Dict[str, float]:
+        """Every counter plus mean, median and tail latency in ms"""
+        count = len(self._latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "reconnects": self.reconnects,
+            "connections_opened": self.connections_opened,
+            "latency_mean_ms":
+                sum(self._latencies) / count * 1000 if count else 0.0,
+            "latency_p50_ms": self.percentile(0.5) * 1000,
+            "latency_p99_ms": self.percentile(0.99) * 1000,
+        }
+
+
+class PooledConnection:
+    """One keep-alive binary protocol connection
+
+    Requests are pipelined: each one is written as soon as it is made
+    and a background task hands every response frame to the request
+    with the same ID, in whatever order the server answers.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count(1)
+        self._drain_lock = asyncio.Lock()
+        self.closed = False
+        self.last_used = time.monotonic()
+        self._responses = asyncio.create_task(self._read_responses())
+
+    @classmethod
+    async def open(cls, host: str, port: int,
+                   ssl_context: Optional[ssl.SSLContext]
+                   ) -> "PooledConnection":
+        """Connect and negotiate the binary protocol"""
+        reader, writer = await asyncio.open_connection(host, port,
+                                                       ssl=ssl_context)
+        try:
+            writer.write(MAGIC)
+            await writer.drain()
+            if await reader.readexactly(len(MAGIC)) != MAGIC:
+                raise ProtocolError("Server did not accept the binary "
+                                    "protocol")
+        except BaseException:
+            writer.close()
+            raise
+
+        # The echoed MAGIC was the first read, so tickets have arrived
+        remember_session(writer)
+        return cls(reader, writer)
+
+    @property
+    def load(self) -> int:
+        """Requests sent on this connection and not yet answered"""
+        return len(self._pending)
+
+    async def request(self, encode: Callable[[int, Any], bytes],
+                      payload: Any) -> Tuple[int, bytes]:
+        """Send encode(request_id, payload), return (status, body)"""
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+        request_id = next(self._request_ids) % 2 ** 32
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(encode(request_id, payload))
+            async with self._drain_lock:
+                await self._writer.drain()
+            return await future
+        finally:
+            # A reply that arrives after a timeout is dropped
+            self._pending.pop(request_id, None)
+            self.last_used = time.monotonic()
+
+    async def _read_responses(self) -> None:
+        """Route response frames to their requests until the socket ends"""
+        error = ConnectionError("Connection closed by the server")
+        try:
+            while True:
+                request_id, status, body = await read_frame(self._reader)
+                future = self._pending.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result((status, body))
+        except asyncio.IncompleteReadError:
+            pass
+        except (OSError, ProtocolError) as e:
+            error = ConnectionError(f"Connection failed: {e}")
+        finally:
+            self.closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._writer.close()
+
+    async def close(self) -> None:
+        """Close the socket, failing requests still waiting"""
+        self._responses.cancel()
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+
+
+class SearchClient:
+    """Pooled, pipelining client for the binary protocol
+
+    At most pool_size connections are opened. A request goes to an idle
+    connection, or a new one while the pool is not full, and otherwise
+    is pipelined on the least loaded connection. Connections stay open
+    between calls and are closed after idle_timeout seconds unused, so
+    set it below the server's IDLE_TIMEOUT. A request whose connection
+    fails is retried up to retries times on another connection, which
+    is safe because lookups do not change anything.
+
+    At most max_inflight queries are in flight at once, over all
+    connections, counting every query of a batch. Later calls wait for
+    room. Keep it below the server's MAX_INFLIGHT_QUERIES to avoid BUSY
+    replies.
+
+    timeout bounds a whole call, including waiting for room,
+    connecting and retries. Calls raise asyncio.TimeoutError when it
+    expires and ConnectionError when the server cannot be reached.
+    """
+
+    def __init__(self, host: Optional[str] = None,
+                 port: Optional[int] = None,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 pool_size: int = 4, max_inflight: int = 64,
+                 timeout: Optional[float] = 10.0,
+                 idle_timeout: float = 60.0, retries: int = 1,
+                 batch_size: int = 50) -> None:
+        """Without host, port or ssl_context, .env and config.cfg apply"""
+        self.host = host or os.getenv("HOST")
+        self.port = int(port or os.getenv("PORT"))
+        self.ssl_context = ssl_context or get_ssl_context()
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.retries = retries
+        self.max_inflight = max_inflight
+        self.batch_size = batch_size
+        self.stats = LatencyStats()
+
+        self._connections: List[PooledConnection] = []
+        self._pool_lock = asyncio.Lock()
+        # Queries sent and not yet answered, guarded by the condition
+        self._inflight = 0
+        self._room = asyncio.Condition()
+
+    async def __aenter__(self) -> "SearchClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def search(self, query: str,
+                     timeout: Optional[float] = None) -> str:
+        """Text reply to one query, such as "STRING EXISTS\n" """
+        status, body = await self._call(encode_request, query, 1, timeout)
+        return decode_response(status, body)
+
+    async def search_many(self, queries: List[str],
+                          timeout: Optional[float] = None) -> List[str]:
+        """Text replies to many queries, in order
+
+        Queries are sent as BATCH frames of up to batch_size queries,
+        and the frames are spread over the pool.
+        """
+        chunks = [queries[start:start + self.batch_size]
+                  for start in range(0, len(queries), self.batch_size)]
+        replies = await asyncio.gather(
+            *(self._call(encode_batch_request, chunk, len(chunk), timeout)
+              for chunk in chunks))
+
+        responses = []
+        for chunk, (status, body) in zip(chunks, replies):
+            if status == BATCH_RESULT:
+                responses.extend(decode_batch_response(body))
+            else:
+                # BUSY or ERROR for the batch as a whole
+                responses.extend([decode_response(status, body)] * len(chunk))
+        return responses
+
+    async def _call(self, encode: Callable[[int, Any], bytes], payload: Any,
+                    queries: int,
+                    timeout: Optional[float]) -> Tuple[int, bytes]:
+        """One request of queries lookups with the call timeout,
+        recording its outcome"""
+        if timeout is None:
+            timeout = self.timeout
+        start_time = time.perf_counter()
+        try:
+            reply = await asyncio.wait_for(
+                self._attempt(encode, payload, queries), timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        except Exception:
+            self.stats.errors += 1
+            raise
+        self.stats.record(time.perf_counter() - start_time)
+        return reply
+
+    async def _attempt(self, encode: Callable[[int, Any], bytes],
+                       payload: Any, queries: int) -> Tuple[int, bytes]:
+        """Send a request, moving to a new connection if one fails"""
+        async with self._room:
+            # A batch larger than the cap still goes out on its own
+            await self._room.wait_for(
+                lambda: self._inflight == 0 or
+                self._inflight + queries <= self.max_inflight)
+            self._inflight += queries
+        try:
+            for attempt in itertools.count():
+                try:
+                    connection = await self._acquire()
+                    return await connection.request(encode, payload)
+                except ConnectionError as e:
+                    if attempt >= self.retries:
+                        raise
+                    logger.debug("Retrying on a new connection: %s", e)
+                    self.stats.reconnects += 1
+        finally:
+            async with self._room:
+                self._inflight -= queries
+                self._room.notify_all()
+
+    async def _acquire(self) -> PooledConnection:
+        """Connection for the next request, opening one if it helps"""
+        async with self._pool_lock:
+            now = time.monotonic()
+            for connection in list(self._connections):
+                expired = (connection.load == 0 and
+                           now - connection.last_used > self.idle_timeout)
+                if connection.closed or expired:
+                    self._connections.remove(connection)
+                    await connection.close()
+
+            least_loaded = min(self._connections,
+                               key=lambda connection: connection.load,
+                               default=None)
+            if least_loaded is not None and (
+                    least_loaded.load == 0 or
+                    len(self._connections) >= self.pool_size):
+                return least_loaded
+
+            connection = await PooledConnection.open(
+                self.host, self.port, self.ssl_context)
+            self.stats.connections_opened += 1
+            self._connections.append(connection)
+            return connection
+
+    async def close(self) -> None:
+        """Close every pooled connection"""
+        async with self._pool_lock:
+            connections, self._connections = self._connections, []
+            for connection in connections:
+                await connection.close()
+
+
+class SyncSearchClient:
+    """Blocking facade over SearchClient for scripts
+
+    The async client runs on its own event loop in a background
+    thread, so its connections stay open between calls. Takes the same
+    options as SearchClient.
+    """
+
+    def __init__(self, **options) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name="search-client", daemon=True)
+        self._thread.start()
+
+        async def create() -> SearchClient:
+            return SearchClient(**options)
+
+        self._client = self._run(create())
+
+    def __enter__(self) -> "SyncSearchClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _run(self, coroutine: Awaitable) -> Any:
+        """Run a coroutine on the client's loop and wait for it"""
+        return asyncio.run_coroutine_threadsafe(coroutine,
+                                                self._loop).result()
+
+    @property
+    def stats(self) -> LatencyStats:
+        """Latency metrics of the underlying client"""
+        return self._client.stats
+
+    def search(self, query: str, timeout: Optional[float] = None) -> str:
+        """Text reply to one query"""
+        return self._run(self._client.search(query, timeout))
+
+    def search_many(self, queries: List[str],
+                    timeout: Optional[float] = None) -> List[str]:
+        """Text replies to many queries, in order"""
+        return self._run(self._client.search_many(queries, timeout))
+
+    def close(self) -> None:
+        """Close the connections and stop the background loop"""
+        if self._loop.is_closed():
+            return
+        self._run(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,128 @@
+"""Compact in-memory corpus representation.
+
+Instead of one str object per line, the corpus is kept as:
+  - one contiguous buffer holding every stripped line, UTF-8 encoded
+  - an array of line start offsets into that buffer (n + 1 entries)
+  - an open addressing hash table of line numbers keyed by CRC32
+
+Lookups, iteration and line retrieval work on slices of the buffer,
+so no per-line Python objects exist once the corpus is built.
+"""
+
+import zlib
+from array import array
+from typing import Iterable, Iterator
+from corpus import iter_corpus_lines
+
+
+# Marks an empty slot in the hash table, line numbers are stored + 1
+_EMPTY = 0
+
+
+class CompactCorpus:
+    """Corpus held as one bytes buffer plus offset and hash arrays"""
+
+    def __init__(self, blob: bytearray, offsets: array,
+                 buckets: array) -> None:
+        self._blob = blob
+        self._view = memoryview(blob)
+        self._offsets = offsets
+        self._buckets = buckets
+        self._mask = len(buckets) - 1
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "CompactCorpus":
+        """Build a compact corpus from already stripped lines"""
+        blob = bytearray()
+        offsets = array("Q", [0])
+        hashes = array("I")
+
+        for line in lines:
+            encoded = line.encode()
+            hashes.append(zlib.crc32(encoded))
+            blob += encoded
+            offsets.append(len(blob))
+
+        # 32 bit offsets are enough for buffers under 4 GiB
+        if len(blob) < 2 ** 32:
+            offsets = array("I", offsets)
+
+        # Keep the table at most half full so probe chains stay short
+        size = 2
+        while size < 2 * len(hashes):
+            size *= 2
+        buckets = array("I", bytes(4 * size))
+
+        corpus = cls(blob, offsets, buckets)
+        corpus._fill_buckets(hashes)
+        return corpus
+
+    @classmethod
+    def from_file(cls, path: str) -> "CompactCorpus":
+        """Build a compact corpus by streaming the corpus file"""
+        return cls.from_lines(iter_corpus_lines(path))
+
+    def _fill_buckets(self, hashes: array) -> None:
+        """Insert the first occurrence of every line into the table"""
+        view = self._view
+        offsets = self._offsets
+        buckets = self._buckets
+        mask = self._mask
+
+        for number, line_hash in enumerate(hashes):
+            start, end = offsets[number], offsets[number + 1]
+            slot = line_hash & mask
+            while True:
+                entry = buckets[slot]
+                if entry == _EMPTY:
+                    buckets[slot] = number + 1
+                    break
+                other = entry - 1
+                # Duplicate lines keep pointing at the first occurrence
+                if view[offsets[other]:offsets[other + 1]] == \
+                        view[start:end]:
+                    break
+                slot = (slot + 1) & mask
+
+    def find(self, query: str) -> int:
+        """Line number of the first occurrence of query, or -1"""
+        encoded = query.encode()
+        view = self._view
+        offsets = self._offsets
+        buckets = self._buckets
+
+        slot = zlib.crc32(encoded) & self._mask
+        while True:
+            entry = buckets[slot]
+            if entry == _EMPTY:
+                return -1
+            number = entry - 1
+            if view[offsets[number]:offsets[number + 1]] == encoded:
+                return number
+            slot = (slot + 1) & self._mask
+
+    def __contains__(self, query: object) -> bool:
+        return isinstance(query, str) and self.find(query) >= 0
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, number: int) -> str:
+        if number < 0:
+            number += len(self)
+        if not 0 <= number < len(self):
+            raise IndexError("line number out of range")
+        start, end = self._offsets[number], self._offsets[number + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        view = self._view
+        offsets = self._offsets
+        for number in range(len(self)):
+            yield str(view[offsets[number]:offsets[number + 1]], "utf-8")
+
+    def memory_usage(self) -> int:
+        """Bytes held by the buffer, the offsets and the hash table"""
+        return (len(self._blob)
+                + self._offsets.itemsize * len(self._offsets)
+                + self._buckets.itemsize * len(self._buckets))
@@ -0,0 +1,35 @@
+"""Write a block compressed copy of a corpus file.
+
+Usage: python compress_corpus.py SOURCE TARGET [BLOCK_KIB]
+
+The codec is chosen by the extension of TARGET (.gz, .bz2, .xz or
+.lzma). The server reads TARGET directly when linuxpath points to it,
+decompressing its blocks in parallel thanks to the TARGET.blocks
+sidecar written next to it.
+"""
+
+import sys
+from corpus import (DEFAULT_BLOCK_SIZE, corpus_codec, iter_corpus_lines,
+                    write_block_compressed)
+
+
+def main():
+    """Main function of the program"""
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python compress_corpus.py SOURCE TARGET [BLOCK_KIB]")
+        sys.exit(1)
+
+    source, target = sys.argv[1], sys.argv[2]
+    block_size = (int(sys.argv[3]) * 1024 if len(sys.argv) == 4
+                  else DEFAULT_BLOCK_SIZE)
+    if corpus_codec(target) is None:
+        print(f"Unknown compression for {target}, use .gz, .bz2 or .xz")
+        sys.exit(1)
+
+    blocks = write_block_compressed(iter_corpus_lines(source), target,
+                                    block_size)
+    print(f"Wrote {target} in {blocks} blocks")
+
+
+if __name__ == "__main__":
+    main()
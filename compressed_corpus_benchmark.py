@@ -0,0 +1,75 @@
+"""Benchmark of index builds and scans from compressed corpora.
+
+Writes the configured corpus as a single gzip stream and as block
+compressed gzip, bzip2 and xz files, then reports for each one and for
+the plain text file:
+  - the size on disk
+  - the time to build a CompactCorpus, a streaming decompression
+  - the time of one full scan, as done per query in reread mode
+
+Block files are scanned with the parallel block reader, the single
+stream is decompressed sequentially.
+"""
+
+import os
+import sys
+import gzip
+import time
+import tempfile
+import corpus
+from compact_corpus import CompactCorpus
+from corpus import iter_corpus_lines, scan_corpus, write_block_compressed
+
+
+config_file_path = "config/config.cfg"
+file_path = None
+
+# Confirmation for file path to 200k.txt file
+try:
+    with open(config_file_path, "r", encoding="utf8") as file:
+        for line in file:
+            if line.startswith("linuxpath="):
+                file_path = line.strip().split("=")[1]
+except FileNotFoundError:
+    print(f"Configuration file {config_file_path} not found.")
+    sys.exit(1)
+
+
+def timed(function, *args) -> float:
+    """Seconds taken by function(*args)"""
+    start_time = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start_time
+
+
+def main():
+    """Main function of the program"""
+    lines = list(iter_corpus_lines(file_path))
+
+    with tempfile.TemporaryDirectory() as directory:
+        stream_path = os.path.join(directory, "corpus.txt.gz")
+        with gzip.open(stream_path, "wt", encoding="utf8") as file:
+            file.writelines(line + "\n" for line in lines)
+
+        paths = {"plain text": file_path, "gzip stream": stream_path}
+        for name, extension in (("gzip blocks", ".gz"),
+                                ("bzip2 blocks", ".bz2"),
+                                ("xz blocks", ".xz")):
+            paths[name] = os.path.join(directory, "corpus.txt" + extension)
+            write_block_compressed(lines, paths[name])
+
+        # A line that is never found makes every scan read the whole file
+        missing = "not a line of the corpus"
+        print(f"Lines: {len(lines)}, "
+              + f"decompression threads: {corpus.DECOMPRESS_WORKERS}")
+        for name, path in paths.items():
+            build_time = timed(CompactCorpus.from_file, path)
+            scan_time = timed(scan_corpus, path, missing)
+            print(f"Corpus: {name}, "
+                  + f"Size: {os.path.getsize(path) / 2 ** 20:.1f} MiB, "
+                  + f"Index build: {build_time:.2f} s, "
+                  + f"Full scan: {scan_time:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
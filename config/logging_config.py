@@ -1,15 +1,128 @@
-"""Configuration file for logging to be reused across all modules and scripts"""
+"""Configuration file for logging to be reused across all modules and scripts
 
+Log records are handed to a bounded in-memory queue and written to disk
+by a QueueListener thread, so logging never performs file I/O on the
+event loop. When the queue is full the record is dropped and counted
+instead of blocking the caller.
+"""
+
+import os
+import atexit
+import queue
+import random
+import threading
+import time
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+
+
+# Load values from environment files
+load_dotenv()
+
+LOG_FILE = os.getenv("LOG_FILE", "debug.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Fraction of per-query log records to keep (1.0 keeps every record)
+LOG_QUERY_SAMPLE_RATE = float(os.getenv("LOG_QUERY_SAMPLE_RATE", "1.0"))
+
+# Maximum per-query log records per second (0 disables the limit)
+LOG_QUERY_RATE_LIMIT = int(os.getenv("LOG_QUERY_RATE_LIMIT", "0"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when full"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Put the record on the queue without waiting for free space"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class QueryLogSampler:
+    """Decides whether a per-query log record should be emitted
+
+    Combines probabilistic sampling with a per-second rate limit so a
+    burst of queries cannot flood the log queue.
+    """
+
+    def __init__(self, sample_rate: float = LOG_QUERY_SAMPLE_RATE,
+                 rate_limit: int = LOG_QUERY_RATE_LIMIT) -> None:
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.suppressed = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._lock = threading.Lock()
 
+    def should_log(self) -> bool:
+        """Return True if the current query should be logged"""
+        if self.sample_rate <= 0:
+            return False
 
-logging.basicConfig(
-    filename="debug.log",  # filename in which info are logged
-    level=logging.DEBUG,
-    format="%(asctime)s %(levelname)s:%(message)s",
-)
+        with self._lock:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                self.suppressed += 1
+                return False
+
+            if self.rate_limit > 0:
+                now = time.monotonic()
+                # Start a new one second window
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+
+                if self._window_count >= self.rate_limit:
+                    self.suppressed += 1
+                    return False
+                self._window_count += 1
+            return True
+
+
+def _resolve_level(name: str) -> int:
+    """Map a level name from the environment to a logging level"""
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.DEBUG
+
+
+_log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_queue_handler = DroppingQueueHandler(_log_queue)
+_listener = None
+
+_root_logger = logging.getLogger()
+
+# Mirror logging.basicConfig: leave an already configured root alone
+if not _root_logger.handlers:
+    _file_handler = logging.FileHandler(LOG_FILE, delay=True)
+    _file_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s:%(message)s"))
+
+    _root_logger.setLevel(_resolve_level(LOG_LEVEL))
+    _root_logger.addHandler(_queue_handler)
+
+    # Writes queued records to disk on a background thread
+    _listener = QueueListener(_log_queue, _file_handler,
+                              respect_handler_level=True)
+    _listener.start()
+
+    # Flush whatever is still queued when the interpreter exits
+    atexit.register(_listener.stop)
 
 
 def get_logger():
     """Enables export of the logger config to be used across modules"""
     return logging.getLogger(__name__)
+
+
+def get_dropped_records() -> int:
+    """Number of log records dropped because the queue was full"""
+    return _queue_handler.dropped
@@ -0,0 +1,171 @@
+"""Helpers for reading the search corpus.
+
+Every component that reads the corpus file goes through these helpers,
+so they agree on how lines are split and stripped.
+
+The corpus may be compressed with gzip (.gz), bzip2 (.bz2) or xz
+(.xz, .lzma), chosen by file extension. A compressed corpus written by
+write_block_compressed is a series of independently compressed blocks,
+each holding whole lines. That is still a valid multi-member file for
+the usual tools. A sidecar file (path + ".blocks") records where each
+block starts, so the blocks can be decompressed in parallel threads
+(the codecs release the GIL) while lines are still yielded in order.
+Without a sidecar, the file is decompressed as one stream.
+"""
+
+import os
+import bz2
+import gzip
+import lzma
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+
+# Compression modules by file extension, all offer open() and compress()
+CODECS = {".gz": gzip, ".bz2": bz2, ".xz": lzma, ".lzma": lzma}
+
+BLOCK_INDEX_SUFFIX = ".blocks"
+BLOCK_INDEX_MAGIC = "FSBLOCKS1"
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Threads decompressing blocks ahead of the reader
+DECOMPRESS_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def corpus_codec(path: str):
+    """Compression module for a corpus path, None for plain text"""
+    return CODECS.get(os.path.splitext(path)[1].lower())
+
+
+def read_block_index(path: str) -> Optional[List[Tuple[int, int]]]:
+    """(offset, length) of each compressed block, None without a sidecar
+
+    A sidecar older than the corpus, or one that does not cover the
+    whole file, is ignored.
+    """
+    index_path = path + BLOCK_INDEX_SUFFIX
+    try:
+        if os.path.getmtime(index_path) < os.path.getmtime(path):
+            return None
+        with open(index_path, "r", encoding="utf8") as index_file:
+            if index_file.readline().strip() != BLOCK_INDEX_MAGIC:
+                return None
+            blocks = []
+            for line in index_file:
+                offset, length = line.split()
+                blocks.append((int(offset), int(length)))
+    except (OSError, ValueError):
+        return None
+
+    end = blocks[-1][0] + blocks[-1][1] if blocks else 0
+    return blocks if end == os.path.getsize(path) else None
+
+
+def _split_block(data: bytes) -> List[str]:
+    """Stripped lines of a decompressed block"""
+    lines = data.decode("utf8").split("\n")
+    # Blocks end with a newline, which leaves an empty last item
+    if lines and not lines[-1]:
+        lines.pop()
+    return [line.strip() for line in lines]
+
+
+def _iter_blocks(path: str, codec,
+                 blocks: List[Tuple[int, int]]) -> Iterator[str]:
+    """Yield lines in order, decompressing the next blocks in parallel"""
+    with open(path, "rb") as file, \
+            ThreadPoolExecutor(max_workers=DECOMPRESS_WORKERS) as pool:
+        def load(block: Tuple[int, int]) -> List[str]:
+            offset, length = block
+            return _split_block(codec.decompress(
+                os.pread(file.fileno(), length, offset)))
+
+        # Keep a bounded number of blocks in flight so memory stays flat
+        pending = deque()
+        upcoming = iter(blocks)
+        try:
+            for block in upcoming:
+                pending.append(pool.submit(load, block))
+                if len(pending) >= 2 * DECOMPRESS_WORKERS:
+                    break
+            while pending:
+                lines = pending.popleft().result()
+                block = next(upcoming, None)
+                if block is not None:
+                    pending.append(pool.submit(load, block))
+                yield from lines
+        finally:
+            # A reader that stops early leaves blocks nobody will read
+            for future in pending:
+                future.cancel()
+
+
+def iter_corpus_lines(path: str) -> Iterator[str]:
+    """Stream the corpus one stripped line at a time"""
+    codec = corpus_codec(path)
+    if codec is None:
+        with open(path, "r", encoding="utf8") as file:
+            for line in file:
+                yield line.strip()
+        return
+
+    blocks = read_block_index(path)
+    if blocks is not None:
+        yield from _iter_blocks(path, codec, blocks)
+        return
+
+    with codec.open(path, "rt", encoding="utf8") as file:
+        for line in file:
+            yield line.strip()
+
+
+def scan_corpus(path: str, query: str) -> bool:
+    """Check whether query is a line of the corpus by streaming it"""
+    for line in iter_corpus_lines(path):
+        if line == query:
+            return True
+    return False
+
+
+def build_line_index(path: str) -> FrozenSet[str]:
+    """Read the whole corpus into a set for constant time lookups"""
+    return frozenset(iter_corpus_lines(path))
+
+
+def write_block_compressed(lines: Iterable[str], path: str,
+                           block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+    """Write lines as a block compressed corpus plus its sidecar index
+
+    The codec is chosen by the extension of path. block_size is the
+    amount of uncompressed text per block. Returns the block count.
+    """
+    codec = corpus_codec(path)
+    if codec is None:
+        raise ValueError(f"No compression codec for {path}")
+
+    blocks = []
+    buffer = []
+    buffered = 0
+    with open(path, "wb") as file:
+        def flush() -> None:
+            data = codec.compress("".join(buffer).encode("utf8"))
+            blocks.append((file.tell(), len(data)))
+            file.write(data)
+            buffer.clear()
+
+        for line in lines:
+            buffer.append(line + "\n")
+            buffered += len(buffer[-1])
+            if buffered >= block_size:
+                flush()
+                buffered = 0
+        if buffer:
+            flush()
+
+    # Written after the corpus so its mtime marks it as current
+    with open(path + BLOCK_INDEX_SUFFIX, "w", encoding="utf8") as index_file:
+        index_file.write(BLOCK_INDEX_MAGIC + "\n")
+        for offset, length in blocks:
+            index_file.write(f"{offset} {length}\n")
+    return len(blocks)
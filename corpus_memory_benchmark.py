@@ -0,0 +1,69 @@
+"""Memory benchmark for the in-memory corpus representations.
+
+Compares the Python memory held by:
+  - file.readlines(), one str per line with the newline kept
+  - a set of stripped lines, the default server index
+  - CompactCorpus, one buffer plus offset and hash arrays
+and scales each figure to one million lines. Build times are measured
+with tracemalloc running, so they are slower than in the server.
+"""
+
+import sys
+import time
+import tracemalloc
+from compact_corpus import CompactCorpus
+from corpus import build_line_index
+
+
+config_file_path = "config/config.cfg"
+file_path = None
+
+# Confirmation for file path to 200k.txt file
+try:
+    with open(config_file_path, "r", encoding="utf8") as file:
+        for line in file:
+            if line.startswith("linuxpath="):
+                file_path = line.strip().split("=")[1]
+except FileNotFoundError:
+    print(f"Configuration file {config_file_path} not found.")
+    sys.exit(1)
+
+
+def read_lines(path: str) -> list:
+    """The original representation, one str object per line"""
+    with open(path, "r", encoding="utf8") as file:
+        return file.readlines()
+
+
+def measure(build_fn):
+    """Return the object built, its traced size and build time"""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = build_fn(file_path)
+    elapsed = time.perf_counter() - start_time
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    """Main function of the program"""
+    representations = {
+        "readlines()": read_lines,
+        "set of lines": build_line_index,
+        "CompactCorpus": CompactCorpus.from_file,
+    }
+
+    for name, build_fn in representations.items():
+        result, size, elapsed = measure(build_fn)
+        per_million = size / len(result) * 1_000_000
+        print(f"Representation: {name}, "
+              + f"Lines: {len(result)}, "
+              + f"Memory: {size / 2 ** 20:.1f} MiB, "
+              + f"Per million lines: {per_million / 2 ** 20:.1f} MiB, "
+              + f"Build time: {elapsed:.2f} s")
+        del result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Following an append-only corpus file.
+
+A CorpusTail remembers the byte offset up to which the corpus has been
+indexed. Each poll stats the file and, when it grew, reads only the
+bytes past that offset and keeps the complete lines among them. A line
+still being written stays unread until its newline arrives.
+
+The appended lines are kept in the tail itself, next to the static
+index built at the starting offset, with a hash table of their
+positions. Membership, COUNT and LOCATE over them cost one probe.
+
+Appending is the only change that can be followed. A poll returns None
+when the file shrank, was replaced by another inode, or no longer ends
+its indexed part with the bytes seen there before. The caller then
+rebuilds the index from scratch.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+# Bytes before the offset compared on every read, to catch rewrites
+CHECK_BYTES = 64
+READ_CHUNK = 1024 * 1024
+
+
+class CorpusTail:
+    """Lines appended to the corpus after its index was built"""
+
+    def __init__(self, path: str, offset: int, base_lines: int,
+                 identity: Tuple[int, int], last_bytes: bytes) -> None:
+        self.path = path
+        self.offset = offset
+        # Lines before the starting offset, those held by the index
+        self.base_lines = base_lines
+        self.appended: List[str] = []
+        self._positions: Dict[str, List[int]] = {}
+        self._identity = identity
+        self._last_bytes = last_bytes
+
+    @classmethod
+    def at_end(cls, path: str) -> "CorpusTail":
+        """Start following after the last complete line of the file"""
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            offset = 0
+            lines = 0
+            position = 0
+            while position < stat.st_size:
+                chunk = file.read(min(READ_CHUNK, stat.st_size - position))
+                if not chunk:
+                    break
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    lines += chunk.count(b"\n")
+                    offset = position + newline + 1
+                position += len(chunk)
+
+            file.seek(max(0, offset - CHECK_BYTES))
+            last_bytes = file.read(offset - file.tell())
+        return cls(path, offset, lines, (stat.st_dev, stat.st_ino),
+                   last_bytes)
+
+    def poll(self) -> Optional[int]:
+        """Index newly appended complete lines, returning their number
+
+        None means the file was truncated or replaced and the index has
+        to be rebuilt.
+        """
+        with open(self.path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            if ((stat.st_dev, stat.st_ino) != self._identity
+                    or stat.st_size < self.offset):
+                return None
+            if stat.st_size == self.offset:
+                return 0
+
+            # The bytes before the offset must not have changed
+            file.seek(self.offset - len(self._last_bytes))
+            if file.read(len(self._last_bytes)) != self._last_bytes:
+                return None
+            data = file.read(stat.st_size - self.offset)
+
+        # Only complete lines, a partial one is read again next time
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return 0
+        data = data[:end]
+        self.offset += end
+        self._last_bytes = (self._last_bytes + data)[-CHECK_BYTES:]
+
+        # A newline byte never occurs inside a UTF-8 sequence
+        lines = [line.strip() for line in data.decode("utf8").split("\n")]
+        lines.pop()
+        for line in lines:
+            self._positions.setdefault(line, []).append(len(self.appended))
+            self.appended.append(line)
+        return len(lines)
+
+    def __contains__(self, query: object) -> bool:
+        return query in self._positions
+
+    def __len__(self) -> int:
+        return len(self.appended)
+
+    def count(self, query: str) -> int:
+        """Occurrences of query among the appended lines"""
+        return len(self._positions.get(query, ()))
+
+    def locate(self, query: str, limit: int) -> Tuple[List[int], int]:
+        """Corpus line numbers of query among the appended lines, 1-based"""
+        positions = self._positions.get(query, ())
+        numbers = [self.base_lines + position + 1
+                   for position in positions[:limit]]
+        return numbers, len(positions)
@@ -0,0 +1,181 @@
+"""Fair scheduling of blocking query work across client connections.
+
+Submitting every query straight to the thread pool puts them all in
+one FIFO queue, so a client that pipelines many slow queries delays
+every other client queued behind it. The scheduler keeps the pool's
+own queue empty instead:
+
+  - no more jobs run at once than the pool has workers
+  - the rest wait in one queue per client
+  - when a worker frees up, the next job is taken from the clients in
+    round-robin order, skipping clients at their in-flight cap
+
+Queue depth and wait time are tracked per client, so a noisy neighbour
+can be told apart from general overload. Everything except the jobs
+themselves runs on the event loop, so no locks are needed.
+"""
+
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+import metrics
+
+
+class ClientStats:
+    """Scheduling counters for one client"""
+
+    __slots__ = ("queued", "running", "jobs", "wait_time", "max_queued")
+
+    def __init__(self) -> None:
+        self.queued = 0
+        self.running = 0
+        self.jobs = 0
+        self.wait_time = 0.0
+        self.max_queued = 0
+
+    def mean_wait(self) -> float:
+        """Average seconds a job waited before it started"""
+        return self.wait_time / self.jobs if self.jobs else 0.0
+
+
+class FairScheduler:
+    """Round-robin dispatch of blocking jobs from many clients"""
+
+    def __init__(self, executor: Executor, workers: int,
+                 client_inflight: int = 1, backlog: int = 0,
+                 on_backlog: Optional[Callable[[Hashable, ClientStats],
+                                               None]] = None) -> None:
+        """on_backlog(client, stats) is called each time a client's
+        queue grows to backlog jobs, 0 disables it"""
+        self._executor = executor
+        self._workers = workers
+        self._client_inflight = client_inflight
+        self._backlog = backlog
+        self._on_backlog = on_backlog
+        self._running = 0
+
+        # Pending (function, args, future, enqueue time, stats) per client
+        self._queues: Dict[Hashable, Deque] = {}
+        # Clients with pending jobs, in the order they get a turn
+        self._turns: Deque[Hashable] = deque()
+        self._stats: Dict[Hashable, ClientStats] = {}
+
+    def set_limits(self, client_inflight: int, backlog: int) -> None:
+        """Change the per-client cap and backlog, as a reload does"""
+        self._client_inflight = client_inflight
+        self._backlog = backlog
+        # A higher cap may let queued jobs start straight away
+        if self._turns:
+            self._dispatch()
+
+    async def submit(self, client: Hashable, function: Callable,
+                     *args) -> Any:
+        """Run function(*args) in the pool once it is client's turn"""
+        future = asyncio.get_running_loop().create_future()
+        stats = self._stats.get(client)
+        if stats is None:
+            stats = self._stats[client] = ClientStats()
+
+        queue = self._queues.get(client)
+        if queue is None:
+            queue = self._queues[client] = deque()
+            self._turns.append(client)
+        job = (function, args, future, time.monotonic(), stats)
+        queue.append(job)
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        if stats.queued == self._backlog and self._on_backlog is not None:
+            self._on_backlog(client, stats)
+
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._withdraw(client, job)
+            raise
+
+    def _withdraw(self, client: Hashable, job: tuple) -> None:
+        """Remove a job whose waiter went away before it started"""
+        queue = self._queues.get(client)
+        if queue is None or not any(entry is job for entry in queue):
+            # Already running, its result is discarded by _finish
+            return
+        queue.remove(job)
+        job[4].queued -= 1
+        if not queue:
+            del self._queues[client]
+            self._turns.remove(client)
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while workers are free"""
+        loop = asyncio.get_running_loop()
+        skipped = 0
+        while self._running < self._workers and skipped < len(self._turns):
+            client = self._turns.popleft()
+            queue = self._queues[client]
+            function, args, future, enqueued, stats = queue[0]
+            if stats.running >= self._client_inflight:
+                # At its cap, keep its place for the next round
+                self._turns.append(client)
+                skipped += 1
+                continue
+            skipped = 0
+
+            queue.popleft()
+            if queue:
+                self._turns.append(client)
+            else:
+                del self._queues[client]
+
+            stats.queued -= 1
+            stats.running += 1
+            stats.jobs += 1
+            wait_time = time.monotonic() - enqueued
+            stats.wait_time += wait_time
+            metrics.increment("scheduler_jobs")
+            metrics.increment("scheduler_wait_ms", wait_time * 1000)
+
+            self._running += 1
+            running = loop.run_in_executor(self._executor, function, *args)
+            running.add_done_callback(
+                lambda done, future=future, stats=stats:
+                self._finish(future, stats, done))
+
+    def _finish(self, future: asyncio.Future, stats: ClientStats,
+                done: asyncio.Future) -> None:
+        """Hand a job's outcome to its waiter and start the next job"""
+        self._running -= 1
+        stats.running -= 1
+        # The waiter may have gone away while the job ran
+        if not future.cancelled():
+            if done.cancelled():
+                future.cancel()
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+        self._dispatch()
+
+    def client_stats(self, client: Hashable) -> Optional[ClientStats]:
+        """Counters of a client, None if it never submitted a job"""
+        return self._stats.get(client)
+
+    def forget(self, client: Hashable) -> Optional[ClientStats]:
+        """Drop a disconnected client's counters and return them"""
+        # Jobs still queued or running keep their own reference
+        return self._stats.pop(client, None)
+
+    def queued(self) -> int:
+        """Jobs waiting for a worker, over every client"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def max_client_queue(self) -> int:
+        """Longest queue of a single client"""
+        return max((len(queue) for queue in self._queues.values()),
+                   default=0)
+
+    def running(self) -> int:
+        """Jobs currently running in the pool"""
+        return self._running
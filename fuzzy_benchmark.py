@@ -0,0 +1,84 @@
+"""Latency benchmark for FUZZY queries on the configured corpus.
+
+Builds the fuzzy index, then times queries made by applying k random
+edits to random corpus lines, for k = 1 and k = 2. A brute force scan
+over every line is timed on a few queries for comparison.
+"""
+
+import sys
+import time
+import random
+from compact_corpus import CompactCorpus
+from fuzzy_index import FuzzyIndex, fuzzy_scan
+
+
+config_file_path = "config/config.cfg"
+file_path = None
+NUM_QUERIES = 200
+NUM_SCAN_QUERIES = 3
+MAX_RESULTS = 20
+
+# Confirmation for file path to 200k.txt file
+try:
+    with open(config_file_path, "r", encoding="utf8") as file:
+        for line in file:
+            if line.startswith("linuxpath="):
+                file_path = line.strip().split("=")[1]
+except FileNotFoundError:
+    print(f"Configuration file {config_file_path} not found.")
+    sys.exit(1)
+
+
+def mutate(line: str, edits: int, alphabet: str) -> str:
+    """Apply random substitutions, insertions and deletions"""
+    characters = list(line)
+    for _ in range(edits):
+        position = random.randrange(len(characters) + 1)
+        operation = random.choice("sid")
+        if operation == "i" or not characters:
+            characters.insert(position, random.choice(alphabet))
+        elif position < len(characters):
+            if operation == "s":
+                characters[position] = random.choice(alphabet)
+            else:
+                del characters[position]
+    return "".join(characters)
+
+
+def main():
+    """Main function of the program"""
+    lines = CompactCorpus.from_file(file_path)
+    # Edits draw from characters that actually occur in the corpus
+    alphabet = "".join(sorted(set("".join(lines[number] for number in
+                                          range(min(1000, len(lines)))))))
+
+    start_time = time.perf_counter()
+    index = FuzzyIndex(lines)
+    print(f"Lines: {len(lines)}, "
+          + f"Index build: {time.perf_counter() - start_time:.2f} s")
+
+    for distance in (1, 2):
+        queries = [mutate(lines[random.randrange(len(lines))], distance,
+                          alphabet) for _ in range(NUM_QUERIES)]
+
+        latencies = []
+        for query in queries:
+            start_time = time.perf_counter()
+            index.search(query, distance, MAX_RESULTS)
+            latencies.append(time.perf_counter() - start_time)
+        latencies.sort()
+
+        start_time = time.perf_counter()
+        for query in queries[:NUM_SCAN_QUERIES]:
+            fuzzy_scan(lines, query, distance, MAX_RESULTS)
+        scan_time = (time.perf_counter() - start_time) / NUM_SCAN_QUERIES
+
+        print(f"k={distance}: "
+              + f"mean {sum(latencies) / len(latencies) * 1000:.2f} ms, "
+              + f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              + f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, "
+              + f"full scan {scan_time * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
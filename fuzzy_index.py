@@ -0,0 +1,152 @@
+"""Approximate string matching over the corpus.
+
+Finds corpus lines within Levenshtein distance k of a query without
+comparing the query against every line:
+
+  - Lines are indexed by positional q-grams: (gram, position) maps to
+    the array of line numbers containing that gram at that position.
+  - The query is cut into k + 1 pieces. At most k edits leave at least
+    one piece untouched, so a match contains that piece verbatim,
+    shifted by at most k positions. Intersecting the postings of a
+    piece's grams at each shift finds exactly the lines containing it
+    there, and the union over pieces and shifts is the candidate set.
+  - Candidates are verified with a Levenshtein computation restricted
+    to a band of width 2k + 1 that stops as soon as k is exceeded.
+
+Queries too short to give every piece a full q-gram fall back to
+scanning only the lines whose length is within k of the query.
+"""
+
+import heapq
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+GRAM_SIZE = 3
+
+
+def bounded_levenshtein(first: str, second: str, limit: int) -> int:
+    """Edit distance of two strings, or limit + 1 if it exceeds limit"""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    if first == second:
+        return 0
+
+    too_far = limit + 1
+    width = len(second)
+    previous = [column if column <= limit else too_far
+                for column in range(width + 1)]
+
+    for row in range(1, len(first) + 1):
+        current = [too_far] * (width + 1)
+        current[0] = row if row <= limit else too_far
+        row_best = current[0]
+        character = first[row - 1]
+
+        # Cells further than limit from the diagonal can never be <= limit
+        for column in range(max(1, row - limit),
+                            min(width, row + limit) + 1):
+            value = min(previous[column - 1]
+                        + (character != second[column - 1]),
+                        previous[column] + 1,
+                        current[column - 1] + 1)
+            current[column] = value if value < too_far else too_far
+            if value < row_best:
+                row_best = value
+
+        if row_best > limit:
+            return too_far
+        previous = current
+
+    return previous[width]
+
+
+def fuzzy_scan(lines: Iterable[str], query: str, distance: int,
+               limit: int) -> List[Tuple[str, int]]:
+    """Brute force matching, used when no index is available"""
+    matches = {}
+    for line in lines:
+        found = bounded_levenshtein(query, line, distance)
+        if found <= distance:
+            matches[line] = found
+    matches = [(found, line) for line, found in matches.items()]
+    return [(line, found) for found, line in heapq.nsmallest(limit, matches)]
+
+
+class FuzzyIndex:
+    """Positional q-gram index answering edit distance queries"""
+
+    def __init__(self, lines: Sequence[str],
+                 gram_size: int = GRAM_SIZE) -> None:
+        self._lines = lines
+        self._gram_size = gram_size
+        self._postings: Dict[Tuple[str, int], array] = {}
+        self._by_length: Dict[int, array] = {}
+
+        for number, line in enumerate(lines):
+            self._by_length.setdefault(len(line), array("I")).append(number)
+            for position in range(len(line) - gram_size + 1):
+                key = (line[position:position + gram_size], position)
+                postings = self._postings.get(key)
+                if postings is None:
+                    postings = self._postings[key] = array("I")
+                postings.append(number)
+
+    def _candidates(self, query: str, distance: int):
+        """Line numbers that may be within distance, or None to scan"""
+        gram_size = self._gram_size
+        pieces = distance + 1
+        if len(query) < pieces * gram_size:
+            return None
+
+        bounds = [len(query) * piece // pieces
+                  for piece in range(pieces + 1)]
+        candidates = set()
+        for start, end in zip(bounds, bounds[1:]):
+            for shift in range(-min(distance, start), distance + 1):
+                # Lines holding every gram of the piece at this shift
+                lists = []
+                for position in range(start, end - gram_size + 1):
+                    postings = self._postings.get(
+                        (query[position:position + gram_size],
+                         position + shift))
+                    if postings is None:
+                        lists = []
+                        break
+                    lists.append(postings)
+                if not lists:
+                    continue
+
+                lists.sort(key=len)
+                found = set(lists[0])
+                for postings in lists[1:]:
+                    found.intersection_update(postings)
+                    if not found:
+                        break
+                candidates |= found
+        return candidates
+
+    def search(self, query: str, distance: int,
+               limit: int) -> List[Tuple[str, int]]:
+        """Up to limit (line, distance) pairs, closest first"""
+        candidates = self._candidates(query, distance)
+        if candidates is None:
+            candidates = []
+            for length in range(max(0, len(query) - distance),
+                                len(query) + distance + 1):
+                candidates.extend(self._by_length.get(length, ()))
+
+        matches = []
+        seen = set()
+        for number in sorted(candidates):
+            line = self._lines[number]
+            # Duplicate lines are reported once
+            if line in seen:
+                continue
+            found = bounded_levenshtein(query, line, distance)
+            if found <= distance:
+                seen.add(line)
+                matches.append((found, number, line))
+
+        return [(line, found)
+                for found, _, line in heapq.nsmallest(limit, matches)]
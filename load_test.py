@@ -0,0 +1,125 @@
+"""Load test for a running async server.
+
+Opens a number of concurrent client connections and sends queries
+over each of them back to back, then reports the overall throughput.
+Run it once with LOG_LEVEL=DEBUG and once with LOG_LEVEL=WARNING on
+the server to compare the cost of logging under load.
+"""
+
+import os
+import sys
+import ssl
+import time
+import random
+import asyncio
+from dotenv import load_dotenv
+
+
+# Load values from environment files
+load_dotenv()
+
+config_file_path = "config/config.cfg"
+host = os.getenv("HOST", "127.0.0.1")
+port = os.getenv("PORT", "8888")
+file_path = None
+use_ssl = False
+certfile = None
+
+NUM_CLIENTS = int(os.getenv("LOAD_TEST_CLIENTS", "50"))
+QUERIES_PER_CLIENT = int(os.getenv("LOAD_TEST_QUERIES", "200"))
+
+# Confirmation for file path to 200k.txt file
+try:
+    with open(config_file_path, "r", encoding="utf8") as file:
+        for line in file:
+            if line.startswith("linuxpath="):
+                file_path = line.strip().split("=")[1]
+            elif line.startswith("use_ssl="):
+                use_ssl = line.strip().split("=")[1].lower() == "true"
+            elif line.startswith("certfile="):
+                certfile = line.strip().split("=")[1]
+except FileNotFoundError:
+    print(f"Configuration file {config_file_path} not found.")
+    sys.exit(1)
+
+
+async def run_client(queries: list, ssl_context) -> dict:
+    """Send every query over a single connection and collect results"""
+    results = {"ok": 0, "busy": 0, "error": 0, "latencies": []}
+    reader, writer = await asyncio.open_connection(host, port,
+                                                   ssl=ssl_context)
+    try:
+        for query in queries:
+            start_time = time.perf_counter()
+            writer.write(query.encode())
+            await writer.drain()
+
+            data = await reader.read(1024)
+            results["latencies"].append(time.perf_counter() - start_time)
+
+            if not data:
+                results["error"] += 1
+                break
+            if data.startswith(b"BUSY"):
+                results["busy"] += 1
+            elif data.startswith(b"ERROR"):
+                results["error"] += 1
+            else:
+                results["ok"] += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return results
+
+
+async def main():
+    """Main function of the program"""
+    with open(file_path, "r", encoding="utf8") as file:
+        lines = [line.strip() for line in file]
+
+    ssl_context = None
+    if use_ssl:
+        ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH,
+                                                 cafile=certfile)
+
+    workloads = [[random.choice(lines) for _ in range(QUERIES_PER_CLIENT)]
+                 for _ in range(NUM_CLIENTS)]
+
+    start_time = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_client(queries, ssl_context) for queries in workloads),
+        return_exceptions=True)
+    elapsed = time.perf_counter() - start_time
+
+    latencies = []
+    totals = {"ok": 0, "busy": 0, "error": 0, "failed_clients": 0}
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            totals["failed_clients"] += 1
+            continue
+        for key in ("ok", "busy", "error"):
+            totals[key] += outcome[key]
+        latencies.extend(outcome["latencies"])
+
+    latencies.sort()
+    completed = len(latencies)
+    print(f"Clients: {NUM_CLIENTS}, "
+          + f"Queries per client: {QUERIES_PER_CLIENT}, "
+          + f"Elapsed: {elapsed:.2f} s")
+    print(f"Throughput: {completed / elapsed:.0f} queries/s, "
+          + f"OK: {totals['ok']}, BUSY: {totals['busy']}, "
+          + f"ERROR: {totals['error']}, "
+          + f"Failed clients: {totals['failed_clients']}")
+    if latencies:
+        p50 = latencies[completed // 2]
+        p99 = latencies[min(completed - 1, int(completed * 0.99))]
+        print(f"Latency p50: {p50 * 1000:.2f} ms, "
+              + f"p99: {p99 * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Handle graceful shutdown with keyboard interrupt
+        print("Load test stopped by user")
@@ -0,0 +1,65 @@
+"""Process wide counters and gauges for the async server.
+
+Counters are incremented from the event loop and from worker threads,
+so every update goes through a lock. Gauges are callables sampled when
+a snapshot is taken. The snapshot is served by the STATS command.
+"""
+
+import threading
+from typing import Callable, Dict
+
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add value to the named counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name: str, callback: Callable[[], float]) -> None:
+    """Register a callable whose value is sampled on every snapshot"""
+    with _lock:
+        _gauges[name] = callback
+
+
+def get(name: str) -> float:
+    """Current value of a counter, zero if it was never incremented"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, float]:
+    """Copy of every counter together with the sampled gauges"""
+    with _lock:
+        values = dict(_counters)
+        gauges = list(_gauges.items())
+
+    for name, callback in gauges:
+        try:
+            values[name] = callback()
+        except Exception:  # A broken gauge must not break STATS
+            values[name] = -1
+    return values
+
+
+def format_stats() -> str:
+    """Render the snapshot as a single space separated response line"""
+    values = snapshot()
+    fields = []
+    for name in sorted(values):
+        value = values[name]
+        if isinstance(value, float) and not value.is_integer():
+            fields.append(f"{name}={value:.4f}")
+        else:
+            fields.append(f"{name}={int(value)}")
+    return "STATS " + " ".join(fields) + "\n"
+
+
+def reset() -> None:
+    """Clear every counter, used by the tests"""
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,76 @@
+"""Benchmark of the minimal perfect hash index against a Python set.
+
+Reports build time, the hash overhead in bits per key, the time to
+load the serialized index through mmap and the mean lookup latency for
+a mix of hits and misses on the configured corpus.
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+from corpus import iter_corpus_lines
+from mph_index import MinimalPerfectHashIndex
+
+
+config_file_path = "config/config.cfg"
+file_path = None
+NUM_LOOKUPS = 200000
+
+# Confirmation for file path to 200k.txt file
+try:
+    with open(config_file_path, "r", encoding="utf8") as file:
+        for line in file:
+            if line.startswith("linuxpath="):
+                file_path = line.strip().split("=")[1]
+except FileNotFoundError:
+    print(f"Configuration file {config_file_path} not found.")
+    sys.exit(1)
+
+
+def time_lookups(index, queries: list) -> float:
+    """Mean seconds per membership test"""
+    start_time = time.perf_counter()
+    for query in queries:
+        _ = query in index
+    return (time.perf_counter() - start_time) / len(queries)
+
+
+def main():
+    """Main function of the program"""
+    lines = list(iter_corpus_lines(file_path))
+
+    # Half hits, half misses that look like corpus lines
+    queries = [random.choice(lines) for _ in range(NUM_LOOKUPS // 2)]
+    queries += [random.choice(lines) + "0;" for _ in range(NUM_LOOKUPS // 2)]
+    random.shuffle(queries)
+
+    start_time = time.perf_counter()
+    line_set = frozenset(lines)
+    set_build = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    built = MinimalPerfectHashIndex.build(lines)
+    mph_build = time.perf_counter() - start_time
+
+    with tempfile.TemporaryDirectory() as directory:
+        index_path = os.path.join(directory, "corpus.mph")
+        built.save(index_path)
+
+        start_time = time.perf_counter()
+        loaded = MinimalPerfectHashIndex.load(index_path)
+        mph_load = time.perf_counter() - start_time
+
+        print(f"Keys: {len(loaded)}, "
+              + f"File size: {os.path.getsize(index_path) / 2 ** 20:.1f} MiB")
+        print(f"Python set: build {set_build:.2f} s, "
+              + f"lookup {time_lookups(line_set, queries) * 1e9:.0f} ns")
+        print(f"MPH index: build {mph_build:.2f} s, "
+              + f"mmap load {mph_load * 1000:.2f} ms, "
+              + f"{loaded.bits_per_key():.2f} bits per key, "
+              + f"lookup {time_lookups(loaded, queries) * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
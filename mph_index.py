@@ -0,0 +1,289 @@
+"""Minimal perfect hash index for static corpora.
+
+A CHD style construction. Every distinct line is hashed once with
+BLAKE2b into a bucket selector and two table hashes h1 and h2. Buckets
+are placed largest first into a table of m > n slots (m prime), each
+searching for the smallest displacement d that sends all of its keys
+to free slots at (h1 + d * h2) mod m. A bitmap of the occupied slots
+with per-word rank counts then maps every slot onto 0..n-1, which
+makes the hash minimal: slot rank i is where the i-th stored line
+lives.
+
+A lookup costs one hash, one displacement read, one bitmap probe and a
+comparison against the stored line, which rejects strings that are
+not in the corpus.
+
+The index serializes to a single file that is loaded through mmap:
+
+    header | salt | displacements | bitmap | ranks | offsets | lines
+"""
+
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+from typing import Iterable, List, Optional
+from corpus import iter_corpus_lines
+
+
+MAGIC = b"FSMPH002"
+
+# magic, keys, table size, buckets, buffer length, typecodes, byte order
+HEADER = struct.Struct("<8sQQQQccB5x")
+SALT_SIZE = 16
+
+# Average keys per bucket, larger values shrink the index but slow builds
+BUCKET_SIZE = 4
+
+# Fraction of table slots used, the bitmap makes the final index minimal
+LOAD_FACTOR = 0.85
+
+# Displacements must fit the 16 bit array, otherwise try another salt
+MAX_DISPLACEMENT = 1 << 16
+MAX_SEEDS = 16
+
+
+class BuildError(Exception):
+    """Raised when no perfect hash could be found for the key set"""
+
+
+def _next_prime(value: int) -> int:
+    """Smallest prime greater than or equal to value"""
+    candidate = max(value, 2)
+    while True:
+        if all(candidate % divisor
+               for divisor in range(2, int(candidate ** 0.5) + 1)):
+            return candidate
+        candidate += 1
+
+
+def _key_hashes(encoded: bytes, salt: bytes):
+    """Bucket selector and two table hashes from one BLAKE2b digest"""
+    digest = hashlib.blake2b(encoded, digest_size=24, salt=salt).digest()
+    return (int.from_bytes(digest[:8], "little"),
+            int.from_bytes(digest[8:16], "little"),
+            int.from_bytes(digest[16:], "little"))
+
+
+def _popcount(value: int) -> int:
+    """Number of set bits, int.bit_count needs Python 3.10"""
+    return bin(value).count("1")
+
+
+def _pad(length: int) -> int:
+    """Bytes needed to align the next section to 8 bytes"""
+    return -length % 8
+
+
+class MinimalPerfectHashIndex:
+    """Exact membership index with one probe per lookup"""
+
+    def __init__(self, salt: bytes, table_size: int, displacements,
+                 bitmap, ranks, offsets, blob,
+                 mapping: Optional[mmap.mmap] = None) -> None:
+        self._salt = salt
+        self._table_size = table_size
+        self._displacements = displacements
+        self._bitmap = bitmap
+        self._ranks = ranks
+        self._offsets = offsets
+        self._blob = blob
+        self._mmap = mapping
+        self._size = len(offsets) - 1
+        self._buckets = len(displacements)
+
+    @classmethod
+    def build(cls, lines: Iterable[str]) -> "MinimalPerfectHashIndex":
+        """Build an index over the distinct lines given"""
+        keys = sorted({line.encode() for line in lines})
+        if not keys:
+            # An empty corpus still gets an index, one that finds nothing
+            return cls(bytes(SALT_SIZE), 0, array("H"), array("Q"),
+                       array("I"), array("I", [0]), b"")
+
+        table_size = _next_prime(int(len(keys) / LOAD_FACTOR) + 1)
+        for seed in range(MAX_SEEDS):
+            salt = seed.to_bytes(SALT_SIZE, "little")
+            placement = cls._place(keys, salt, table_size)
+            if placement is not None:
+                break
+        else:
+            raise BuildError("No perfect hash found, try more seeds")
+
+        displacements, key_at_slot = placement
+
+        # Occupancy bitmap with the number of set bits before each word
+        words = (table_size + 63) // 64
+        bitmap = array("Q", bytes(8 * words))
+        ranks = array("I", bytes(4 * words))
+
+        # Store the lines in slot order so rank i spans offsets[i:i + 2]
+        blob = bytearray()
+        offsets = array("Q", [0])
+        for slot in range(table_size):
+            if slot % 64 == 0:
+                ranks[slot // 64] = len(offsets) - 1
+            key_number = key_at_slot[slot]
+            if key_number:
+                bitmap[slot // 64] |= 1 << (slot % 64)
+                blob += keys[key_number - 1]
+                offsets.append(len(blob))
+
+        if len(blob) < 2 ** 32:
+            offsets = array("I", offsets)
+
+        return cls(salt, table_size, displacements, bitmap, ranks, offsets,
+                   bytes(blob))
+
+    @staticmethod
+    def _place(keys: List[bytes], salt: bytes, table_size: int):
+        """Find a displacement per bucket, or None if this salt fails"""
+        bucket_count = (len(keys) + BUCKET_SIZE - 1) // BUCKET_SIZE
+        buckets: List[List[int]] = [[] for _ in range(bucket_count)]
+        first_hashes = []
+        second_hashes = []
+        for key_number, key in enumerate(keys):
+            selector, first, second = _key_hashes(key, salt)
+            buckets[selector % bucket_count].append(key_number)
+            first_hashes.append(first % table_size)
+            # A non zero step visits every slot because the size is prime
+            second_hashes.append(second % (table_size - 1) + 1)
+
+        displacements = array("H", bytes(2 * bucket_count))
+        key_at_slot = array("I", bytes(4 * table_size))
+
+        # Large buckets are the hardest to place, do them while space is
+        # still plentiful
+        for bucket in sorted(range(bucket_count),
+                             key=lambda number: -len(buckets[number])):
+            members = buckets[bucket]
+            if not members:
+                break
+            for displacement in range(MAX_DISPLACEMENT):
+                slots = [(first_hashes[member]
+                          + displacement * second_hashes[member])
+                         % table_size for member in members]
+                if not any(key_at_slot[slot] for slot in slots) and \
+                        len(set(slots)) == len(slots):
+                    break
+            else:
+                return None
+
+            displacements[bucket] = displacement
+            for member, slot in zip(members, slots):
+                key_at_slot[slot] = member + 1
+        return displacements, key_at_slot
+
+    def find(self, query: str) -> int:
+        """Index of the stored line equal to query, or -1"""
+        table_size = self._table_size
+        if not table_size:
+            return -1
+        encoded = query.encode()
+        selector, first, second = _key_hashes(encoded, self._salt)
+        displacement = self._displacements[selector % self._buckets]
+        slot = (first % table_size
+                + displacement * (second % (table_size - 1) + 1)) \
+            % table_size
+
+        word = self._bitmap[slot >> 6]
+        bit = slot & 63
+        if not (word >> bit) & 1:
+            return -1
+        index = self._ranks[slot >> 6] + _popcount(word & ((1 << bit) - 1))
+
+        # The hash is only perfect for known keys, verify the line
+        start, end = self._offsets[index], self._offsets[index + 1]
+        if self._blob[start:end] == encoded:
+            return index
+        return -1
+
+    def __contains__(self, query: object) -> bool:
+        return isinstance(query, str) and self.find(query) >= 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> str:
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return bytes(self._blob[start:end]).decode()
+
+    def bits_per_key(self) -> float:
+        """Hash overhead per key, excluding the stored lines"""
+        overhead = 0
+        for section in (self._displacements, self._bitmap, self._ranks):
+            overhead += section.itemsize * 8 * len(section)
+        return overhead / self._size if self._size else 0.0
+
+    def save(self, path: str) -> None:
+        """Write the index in the mmap friendly file format"""
+        sections = [array(self._typecode(section), section)
+                    for section in (self._displacements, self._bitmap,
+                                    self._ranks, self._offsets)]
+
+        header = HEADER.pack(MAGIC, self._size, self._table_size,
+                             self._buckets, len(self._blob),
+                             sections[0].typecode.encode(),
+                             sections[3].typecode.encode(),
+                             1 if sys.byteorder == "little" else 0)
+
+        # Write to a temporary name so readers never see a partial file
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            for section in [header + self._salt] + \
+                    [section.tobytes() for section in sections]:
+                file.write(section)
+                file.write(bytes(_pad(len(section))))
+            file.write(self._blob)
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def _typecode(section) -> str:
+        """Array typecode of an array or of a memoryview cast from one"""
+        if isinstance(section, memoryview):
+            return section.format
+        return section.typecode
+
+    @classmethod
+    def load(cls, path: str) -> "MinimalPerfectHashIndex":
+        """Map a saved index into memory without copying it"""
+        with open(path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, size, table_size, bucket_count, blob_length,
+         displacement_code, offset_code,
+         little_endian) = HEADER.unpack_from(mapping)
+        if magic != MAGIC:
+            mapping.close()
+            raise ValueError(f"{path} is not a perfect hash index")
+        if little_endian != (sys.byteorder == "little"):
+            mapping.close()
+            raise ValueError(f"{path} was written on another byte order")
+
+        view = memoryview(mapping)
+        position = HEADER.size + SALT_SIZE
+        salt = bytes(view[HEADER.size:position])
+        position += _pad(position)
+
+        words = (table_size + 63) // 64
+        sections = []
+        for code, count in ((displacement_code.decode(), bucket_count),
+                            ("Q", words), ("I", words),
+                            (offset_code.decode(), size + 1)):
+            length = array(code).itemsize * count
+            sections.append(view[position:position + length].cast(code))
+            position += length + _pad(length)
+
+        blob = view[position:position + blob_length]
+        return cls(salt, table_size, *sections, blob, mapping=mapping)
+
+    @classmethod
+    def load_or_build(cls, index_path: str,
+                      corpus_path: str) -> "MinimalPerfectHashIndex":
+        """Load index_path, rebuilding it first if the corpus is newer"""
+        if not os.path.exists(index_path) or \
+                os.path.getmtime(index_path) < os.path.getmtime(corpus_path):
+            cls.build(iter_corpus_lines(corpus_path)).save(index_path)
+        return cls.load(index_path)
@@ -0,0 +1,72 @@
+"""Where a line occurs in the corpus and how often.
+
+Most lines occur once, so the index keeps the first occurrence of
+every line in a hash table and, for the few repeated lines only, an
+array with the numbers of the later occurrences. A CompactCorpus
+already has a hash table of first occurrences and it is reused as is.
+
+A lookup is one hash probe plus the size of its answer. Line numbers
+are 1-based, as in text editors.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+class PostingIndex:
+    """Line numbers of every occurrence of each corpus line"""
+
+    def __init__(self, lines: Sequence[str]) -> None:
+        self._repeats: Dict[int, array] = {}
+
+        if hasattr(lines, "find"):
+            # CompactCorpus.find returns the first occurrence
+            self._find = lines.find
+            for number, line in enumerate(lines):
+                first = lines.find(line)
+                if first != number:
+                    self._add_repeat(first, number)
+        else:
+            firsts: Dict[str, int] = {}
+            for number, line in enumerate(lines):
+                first = firsts.setdefault(line, number)
+                if first != number:
+                    self._add_repeat(first, number)
+            self._find = lambda query: firsts.get(query, -1)
+
+    def _add_repeat(self, first: int, number: int) -> None:
+        """Record a later occurrence of the line first seen at first"""
+        repeats = self._repeats.get(first)
+        if repeats is None:
+            repeats = self._repeats[first] = array("I")
+        repeats.append(number)
+
+    def locate(self, query: str, limit: int) -> Tuple[List[int], int]:
+        """Up to limit line numbers of query and its occurrence count"""
+        first = self._find(query)
+        if first < 0:
+            return [], 0
+        repeats = self._repeats.get(first, ())
+        numbers = [first + 1]
+        numbers.extend(number + 1 for number in repeats[:max(0, limit - 1)])
+        return numbers[:limit], 1 + len(repeats)
+
+    def count(self, query: str) -> int:
+        """Number of times query occurs as a line"""
+        first = self._find(query)
+        if first < 0:
+            return 0
+        return 1 + len(self._repeats.get(first, ()))
+
+
+def locate_scan(lines: Iterable[str], query: str,
+                limit: int) -> Tuple[List[int], int]:
+    """Line numbers and count by streaming, used without an index"""
+    numbers = []
+    count = 0
+    for number, line in enumerate(lines, start=1):
+        if line == query:
+            count += 1
+            if len(numbers) < limit:
+                numbers.append(number)
+    return numbers, count
@@ -0,0 +1,143 @@
+"""Text protocol server built on asyncio.BufferedProtocol.
+
+A lower overhead alternative to the StreamReader/StreamWriter handler
+in async_server.py. Each connection reads into one preallocated
+receive buffer, decodes the query straight from a memoryview of it and
+answers with response bytes encoded once at import time. There is no
+per-connection coroutine, reader buffer or writer object.
+
+Only the text protocol is served; binary protocol clients must connect
+to a server running the stream implementation.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+import metrics
+
+
+# Maximum payload of 1024 bytes, the same as the stream server
+MAX_PAYLOAD = 1024
+
+_PREENCODED = {
+    response: response.encode()
+    for response in ("STRING EXISTS\n", "STRING NOT FOUND\n",
+                     "ERROR\n", "BUSY\n")
+}
+
+
+class SearchProtocol(asyncio.BufferedProtocol):
+    """Serves text queries one at a time on a single connection
+
+    admit and release are called when the connection opens and closes
+    so the server's connection cap applies to this transport as well.
+    The connection is closed after a reply whenever close_after_reply
+    returns True.
+    """
+
+    def __init__(self, answer: Callable[[str], Awaitable[str]],
+                 admit: Optional[Callable[[], bool]] = None,
+                 release: Optional[Callable[[], None]] = None,
+                 idle_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 close_after_reply: Optional[Callable[[], bool]] = None
+                 ) -> None:
+        self._answer = answer
+        self._admit = admit
+        self._release = release
+        self._close_after_reply = close_after_reply
+        self._idle_timeout = idle_timeout
+        self._read_timeout = read_timeout
+
+        # Receive buffer reused for every message on this connection
+        self._buffer = bytearray(MAX_PAYLOAD)
+        self._view = memoryview(self._buffer)
+
+        self._loop = None
+        self._transport = None
+        self._timer = None
+        self._task = None
+        self._admitted = False
+
+    def connection_made(self, transport) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._transport = transport
+
+        # Turn the connection away before it can queue any work
+        if self._admit is not None and not self._admit():
+            transport.write(_PREENCODED["BUSY\n"])
+            transport.close()
+            return
+
+        self._admitted = True
+        self._arm_timer(self._read_timeout, "read_timeouts")
+
+    @property
+    def transport(self) -> Optional[asyncio.BaseTransport]:
+        """Transport of the connection, None until it is made"""
+        return self._transport
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._view
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._cancel_timer()
+        try:
+            # Decoding is the only copy made of the received bytes
+            query = str(self._view[:nbytes], "utf-8").rstrip("\x00").strip()
+        except UnicodeDecodeError:
+            self._transport.write(_PREENCODED["ERROR\n"])
+            self._arm_timer(self._idle_timeout, "idle_timeouts")
+            return
+
+        # One query at a time per connection, like the stream server
+        self._transport.pause_reading()
+        self._task = self._loop.create_task(self._answer(query))
+        self._task.add_done_callback(self._write_answer)
+
+    def _write_answer(self, task: asyncio.Task) -> None:
+        """Send the finished answer and wait for the next query"""
+        self._task = None
+        if task.cancelled() or self._transport.is_closing():
+            return
+
+        if task.exception() is not None:
+            response = "ERROR\n"
+        else:
+            response = task.result()
+
+        encoded = _PREENCODED.get(response)
+        self._transport.write(encoded if encoded is not None
+                              else response.encode())
+        if self._close_after_reply is not None and self._close_after_reply():
+            self._transport.close()
+            return
+        self._transport.resume_reading()
+        self._arm_timer(self._idle_timeout, "idle_timeouts")
+
+    def eof_received(self) -> bool:
+        # Returning False lets the transport close itself
+        return False
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._cancel_timer()
+        if self._task is not None:
+            self._task.cancel()
+        if self._admitted and self._release is not None:
+            self._admitted = False
+            self._release()
+
+    def _arm_timer(self, timeout: Optional[float], counter: str) -> None:
+        """Close the connection if nothing arrives within timeout"""
+        if timeout:
+            self._timer = self._loop.call_later(timeout, self._expire,
+                                                counter)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _expire(self, counter: str) -> None:
+        self._timer = None
+        metrics.increment(counter)
+        self._transport.close()
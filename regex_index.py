@@ -0,0 +1,166 @@
+"""Regular expression queries accelerated by a trigram index.
+
+The index maps every trigram to the sorted array of line numbers that
+contain it. For a pattern, the literal strings every match must
+contain are extracted from the parsed regular expression; their
+trigrams are looked up and the posting lists intersected, and only
+the surviving candidate lines are handed to the compiled pattern.
+
+Patterns without usable literals (or with IGNORECASE) have no
+prefilter and fall back to checking every line. Both the number of
+candidates checked and the time spent are bounded so a pathological
+pattern cannot hold a worker thread; a search that hits either budget
+reports itself as incomplete.
+"""
+
+import re
+import time
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import re._parser as sre_parse
+    from re._constants import (AT, LITERAL, MAX_REPEAT, MIN_REPEAT,
+                               SUBPATTERN)
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import (AT, LITERAL, MAX_REPEAT, MIN_REPEAT,
+                               SUBPATTERN)
+
+
+GRAM_SIZE = 3
+
+# How many candidates to check between two looks at the clock
+CLOCK_INTERVAL = 256
+
+
+def _required_literals(parsed) -> List[str]:
+    """Literal strings that every match of a parsed pattern contains"""
+    literals = []
+    run = []
+
+    def finish_run():
+        if run:
+            literals.append("".join(run))
+            run.clear()
+
+    for op, argument in parsed:
+        if op is LITERAL:
+            run.append(chr(argument))
+        elif op is AT:
+            # Anchors are zero width and do not split a literal run
+            continue
+        elif op is SUBPATTERN:
+            finish_run()
+            # (group, add flags, del flags, pattern); flags may change case
+            if argument[1] == 0:
+                literals.extend(_required_literals(argument[-1]))
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            finish_run()
+            minimum, _, body = argument
+            if minimum >= 1:
+                literals.extend(_required_literals(body))
+        else:
+            # Alternations, classes, wildcards and so on guarantee nothing
+            finish_run()
+    finish_run()
+    return literals
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Distinct trigrams of a string"""
+    return {text[position:position + GRAM_SIZE]
+            for position in range(len(text) - GRAM_SIZE + 1)}
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> Tuple[re.Pattern, Tuple[str, ...]]:
+    """Compiled pattern and the trigrams a matching line must contain
+
+    Raises re.error for invalid patterns. Results are cached so repeated
+    patterns skip both compilation and literal extraction.
+    """
+    compiled = re.compile(pattern)
+    if compiled.flags & re.IGNORECASE:
+        return compiled, ()
+
+    grams: Set[str] = set()
+    for literal in _required_literals(sre_parse.parse(pattern)):
+        grams |= _trigrams(literal)
+    return compiled, tuple(sorted(grams))
+
+
+def _match_lines(compiled: re.Pattern, numbered: Iterable[Tuple[int, str]],
+                 limit: int, max_candidates: int,
+                 time_budget: float) -> Tuple[List[str], bool]:
+    """Run the pattern over candidate lines within the budgets"""
+    deadline = time.monotonic() + time_budget
+    matches = []
+    for checked, (_, line) in enumerate(numbered, start=1):
+        if checked > max_candidates:
+            return matches, False
+        if checked % CLOCK_INTERVAL == 0 and time.monotonic() > deadline:
+            return matches, False
+        if compiled.search(line):
+            matches.append(line)
+            if len(matches) >= limit:
+                break
+    return matches, True
+
+
+def regex_scan(lines: Iterable[str], pattern: str, limit: int,
+               max_candidates: int,
+               time_budget: float) -> Tuple[List[str], bool]:
+    """Match every line, used when no index is available"""
+    compiled, _ = compile_pattern(pattern)
+    return _match_lines(compiled, enumerate(lines), limit, max_candidates,
+                        time_budget)
+
+
+class RegexIndex:
+    """Trigram index answering regular expression queries"""
+
+    def __init__(self, lines: Sequence[str]) -> None:
+        self._lines = lines
+        self._postings: Dict[str, array] = {}
+
+        for number, line in enumerate(lines):
+            for gram in _trigrams(line):
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array("I")
+                postings.append(number)
+
+    def candidates(self, grams: Sequence[str]) -> Optional[List[int]]:
+        """Sorted line numbers holding every gram, None without grams"""
+        if not grams:
+            return None
+
+        lists = []
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                return []
+            lists.append(postings)
+
+        # Start from the rarest gram so the working set stays small
+        lists.sort(key=len)
+        found = set(lists[0])
+        for postings in lists[1:]:
+            found.intersection_update(postings)
+            if not found:
+                break
+        return sorted(found)
+
+    def search(self, pattern: str, limit: int, max_candidates: int,
+               time_budget: float) -> Tuple[List[str], bool]:
+        """Up to limit matching lines and whether the search completed"""
+        compiled, grams = compile_pattern(pattern)
+        numbers = self.candidates(grams)
+        if numbers is None:
+            numbered = enumerate(self._lines)
+        else:
+            numbered = ((number, self._lines[number]) for number in numbers)
+        return _match_lines(compiled, numbered, limit, max_candidates,
+                            time_budget)
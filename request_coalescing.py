@@ -0,0 +1,154 @@
+"""Coalescing of concurrent requests.
+
+SingleFlight: when many clients ask the same question at the same
+moment, only the first one does the work. The others wait on its future
+and receive the same answer. Requests are matched by a key, which must
+include everything the answer depends on, such as the corpus version.
+
+ScanBatcher: distinct exact line lookups that arrive within a short
+window are answered together, by one pass over the lines instead of
+one pass per lookup. Each waiter is answered as soon as its line is
+seen.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+
+class SingleFlight:
+    """At most one in-flight call per key, shared by every caller"""
+
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        # Callers that started a call and callers that joined one
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: Hashable, function: Callable[..., Awaitable],
+                  *args) -> Any:
+        """Await function(*args), or the call already running for key"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(function(*args))
+            self._flights[key] = flight
+            flight.add_done_callback(
+                lambda done, key=key: self._land(key, done))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        # A caller that goes away must not cancel the others' answer
+        return await asyncio.shield(flight)
+
+    def _land(self, key: Hashable, flight: asyncio.Future) -> None:
+        """Forget a finished call so later requests start a new one"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieve the outcome so an unawaited failure is not reported
+        if not flight.cancelled():
+            flight.exception()
+
+    def in_flight(self) -> int:
+        """Number of calls currently running"""
+        return len(self._flights)
+
+    def ratio(self) -> float:
+        """Share of callers that were served by another caller's call"""
+        total = self.leaders + self.followers
+        return self.followers / total if total else 0.0
+
+
+class ScanBatcher:
+    """Batch line lookups so one scan answers all of them
+
+    lines() opens a fresh pass over the corpus. run(function, *args)
+    runs the blocking scan off the event loop and is awaited.
+    """
+
+    def __init__(self, lines: Callable[[], Iterable[str]],
+                 run: Callable[..., Awaitable], window: float,
+                 max_batch: int) -> None:
+        self._lines = lines
+        self._run = run
+        self._window = window
+        self._max_batch = max_batch
+
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._timer = None
+        # Scans started and the lookups they answered
+        self.batches = 0
+        self.lookups = 0
+
+    def set_limits(self, window: float, max_batch: int) -> None:
+        """Change the window and batch size, as a reload does"""
+        self._window = window
+        self._max_batch = max_batch
+        # A smaller batch size may already be reached
+        if self._pending and len(self._pending) >= max_batch:
+            self._flush()
+
+    async def contains(self, query: str) -> bool:
+        """Whether query is a line, answered by the next batch scan"""
+        loop = asyncio.get_running_loop()
+        future = self._pending.get(query)
+        if future is None:
+            future = self._pending[query] = loop.create_future()
+            if len(self._pending) >= self._max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self._window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        """Start a scan for every lookup collected so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        self.batches += 1
+        self.lookups += len(pending)
+        loop = asyncio.get_running_loop()
+        scan = asyncio.ensure_future(
+            self._run(self._scan, pending, loop))
+        scan.add_done_callback(
+            lambda done, pending=pending: self._fail(pending, done))
+
+    def _scan(self, pending: Dict[str, asyncio.Future],
+              loop: asyncio.AbstractEventLoop) -> None:
+        """One pass over the lines, runs in a worker thread"""
+        remaining = set(pending)
+        for line in self._lines():
+            if line in remaining:
+                remaining.discard(line)
+                loop.call_soon_threadsafe(_answer, pending[line], True)
+                if not remaining:
+                    return
+        for query in remaining:
+            loop.call_soon_threadsafe(_answer, pending[query], False)
+
+    @staticmethod
+    def _fail(pending: Dict[str, asyncio.Future],
+              scan: asyncio.Future) -> None:
+        """Pass a failed scan on to the lookups it had not answered"""
+        if not scan.cancelled() and scan.exception() is None:
+            return
+        for future in pending.values():
+            if future.done():
+                continue
+            if scan.cancelled():
+                future.cancel()
+            else:
+                future.set_exception(scan.exception())
+
+    def ratio(self) -> float:
+        """Average number of lookups answered per scan"""
+        return self.lookups / self.batches if self.batches else 0.0
+
+
+def _answer(future: asyncio.Future, found: bool) -> None:
+    """Resolve a lookup on the event loop unless it was already"""
+    if not future.done():
+        future.set_result(found)
@@ -0,0 +1,474 @@
+"""Scatter-gather router in front of several search servers.
+
+The corpus is split into partitions with shard_corpus.py and each
+partition is served by one or more async_server.py replicas. The
+router speaks the same plain text and binary protocols as the server,
+and answers queries the way the server would:
+
+  - a lookup, LOCATE or COUNT depends on one line only, and every
+    copy of a line lives in the same partition, so the query is routed
+    to that partition alone
+  - a shard numbers its lines within its own file, so LOCATE replies
+    are mapped back to corpus line numbers with the line maps written
+    by shard_corpus.py. Without line maps LOCATE answers ERROR.
+  - FUZZY and REGEX are sent to every partition and the MATCHES
+    replies are merged
+  - READY is answered from the health checks, STATS with the router's
+    own counters
+
+Lines are assigned to partitions by CRC32 hash, or by key range using
+the split points written by shard_corpus.py. Backends are reached over
+pooled, pipelined SearchClient connections. Replicas of a partition
+are tried in health order. When a reply takes longer than the hedge
+delay, the same query is also sent to the next replica and the first
+answer wins. A background task sends READY to every backend, and
+backends that fail or time out are tried last until they recover.
+"""
+
+import os
+import sys
+import ssl
+import zlib
+import bisect
+import signal
+import asyncio
+import itertools
+from array import array
+from typing import List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+import metrics
+from binary_protocol import MAGIC, ProtocolError, handle_binary_connection
+from client import SearchClient
+from config.logging_config import get_logger
+
+
+# Load values from environment files
+load_dotenv()
+
+# Logging configuration
+logger = get_logger()
+
+BUSY_RESPONSE = "BUSY\n"
+ERROR_RESPONSE = "ERROR\n"
+NOT_FOUND_RESPONSE = "STRING NOT FOUND\n"
+
+# Commands whose matches may come from any partition
+FAN_OUT_COMMANDS = ("FUZZY", "REGEX")
+
+
+def hash_partition(line: str, partitions: int) -> int:
+    """Partition of a line under hash partitioning"""
+    return zlib.crc32(line.encode()) % partitions
+
+
+def range_partition(line: str, splits: Sequence[str]) -> int:
+    """Partition of a line under range partitioning
+
+    splits holds the first line of every partition but the first, in
+    sorted order.
+    """
+    return bisect.bisect_right(splits, line)
+
+
+def parse_backends(spec: str) -> List[List[Tuple[str, int]]]:
+    """Addresses per partition from "host:port|host:port,host:port"
+
+    Partitions are separated by commas and the replicas of one
+    partition by "|".
+    """
+    partitions = []
+    for partition in spec.split(","):
+        replicas = []
+        for address in partition.split("|"):
+            host, _, port = address.strip().rpartition(":")
+            if not host or not port.isdigit():
+                raise ValueError(f"Invalid backend address {address!r}")
+            replicas.append((host, int(port)))
+        partitions.append(replicas)
+    return partitions
+
+
+def parse_matches(response: str) -> Optional[Tuple[List[str], bool]]:
+    """Lines and completeness of a MATCHES reply, None for other replies"""
+    if response == NOT_FOUND_RESPONSE:
+        return [], True
+    header, _, body = response.partition("\n")
+    fields = header.split()
+    if len(fields) not in (2, 3) or fields[0] != "MATCHES":
+        return None
+    return body.splitlines(), len(fields) == 2
+
+
+def format_matches(lines: List[str], complete: bool) -> str:
+    """MATCHES reply, PARTIAL when lines may not be every match"""
+    if not lines and complete:
+        return NOT_FOUND_RESPONSE
+    header = f"MATCHES {len(lines)}" + ("" if complete else " PARTIAL")
+    return header + "\n" + "".join(f"{line}\n" for line in lines)
+
+
+def merge_matches(command: str, responses: Sequence[str],
+                  max_matches: int) -> str:
+    """One MATCHES reply from the replies of every partition"""
+    # A busy or failed partition means the merged answer is unknown
+    for failure in (ERROR_RESPONSE, BUSY_RESPONSE):
+        if failure in responses:
+            return failure
+
+    lines = []
+    complete = True
+    for response in responses:
+        parsed = parse_matches(response)
+        if parsed is None:
+            return ERROR_RESPONSE
+        lines.extend(parsed[0])
+        complete = complete and parsed[1]
+
+    if command == "FUZZY":
+        # Lines are "<distance> <line>", keep the closest first
+        lines.sort(key=lambda line: int(line.partition(" ")[0]))
+    if len(lines) > max_matches:
+        lines = lines[:max_matches]
+        complete = False
+    return format_matches(lines, complete)
+
+
+def map_locate(response: str, line_map: Sequence[int]) -> str:
+    """LOCATE reply of a shard with its numbers turned into corpus ones"""
+    parsed = parse_matches(response)
+    if parsed is None:
+        # BUSY and ERROR pass through
+        return response
+
+    numbers, complete = parsed
+    mapped = []
+    for number in numbers:
+        if not number.isdigit() or not 0 < int(number) <= len(line_map):
+            # A line the shard gained after it was split has no number
+            return ERROR_RESPONSE
+        mapped.append(line_map[int(number) - 1])
+    return format_matches(mapped, complete)
+
+
+class Backend:
+    """One search server replica and what is known about its health"""
+
+    def __init__(self, host: str, port: int, **client_options) -> None:
+        self.address = f"{host}:{port}"
+        self.client = SearchClient(host, port, **client_options)
+        # Unknown until the first health check
+        self.healthy = True
+        self.ready = False
+
+    def mark(self, healthy: bool, ready: bool) -> None:
+        """Record a health check or a failed request, logging changes"""
+        if healthy != self.healthy:
+            if healthy:
+                logger.info("Backend %s is back", self.address)
+            else:
+                logger.warning("Backend %s is unhealthy", self.address)
+        self.healthy = healthy
+        self.ready = ready
+
+
+class Router:
+    """Routes queries to the partitions that can answer them"""
+
+    def __init__(self, partitions: List[List[Backend]],
+                 splits: Optional[Sequence[str]] = None,
+                 hedge_delay: float = 0.05, health_interval: float = 2.0,
+                 health_timeout: float = 1.0, max_matches: int = 100,
+                 idle_timeout: Optional[float] = 300.0,
+                 line_maps: Optional[List[Sequence[int]]] = None) -> None:
+        """Range partitioning is used when splits is given, which needs
+        one split fewer than there are partitions. line_maps holds the
+        corpus line number of every line of each partition."""
+        if splits is not None and len(splits) != len(partitions) - 1:
+            raise ValueError(f"{len(partitions)} partitions need "
+                             + f"{len(partitions) - 1} split points")
+        if line_maps is not None and len(line_maps) != len(partitions):
+            raise ValueError(f"{len(partitions)} partitions need "
+                             + f"{len(partitions)} line maps")
+        self.partitions = partitions
+        self.splits = list(splits) if splits is not None else None
+        self.line_maps = line_maps
+        self.hedge_delay = hedge_delay
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_matches = max_matches
+        self.idle_timeout = idle_timeout
+        self._turns = itertools.count()
+        self._health_task = None
+
+        metrics.register_gauge("backends_healthy", lambda: sum(
+            backend.healthy for backend in self.backends()))
+        metrics.register_gauge("backends_ready", lambda: sum(
+            backend.ready for backend in self.backends()))
+
+    def backends(self) -> List[Backend]:
+        """Every replica of every partition"""
+        return [backend for replicas in self.partitions
+                for backend in replicas]
+
+    def partition_of(self, line: str) -> int:
+        """Index of the partition holding line"""
+        if self.splits is not None:
+            return range_partition(line, self.splits)
+        return hash_partition(line, len(self.partitions))
+
+    def is_ready(self) -> bool:
+        """Whether every partition has a healthy replica that is ready"""
+        return all(any(backend.healthy and backend.ready
+                       for backend in replicas)
+                   for replicas in self.partitions)
+
+    async def resolve(self, query: str) -> str:
+        """Answer a query the way a single server would"""
+        if query == "STATS":
+            return metrics.format_stats()
+        if query == "READY":
+            return "READY\n" if self.is_ready() else "NOT READY\n"
+
+        metrics.increment("queries")
+        command, _, argument = query.partition(" ")
+        if command in FAN_OUT_COMMANDS:
+            metrics.increment("fanned_out_queries")
+            responses = await asyncio.gather(
+                *(self._route(replicas, query)
+                  for replicas in self.partitions))
+            return merge_matches(command, responses, self.max_matches)
+
+        if command == "LOCATE" and self.line_maps is None:
+            # Shard line numbers would pass for corpus ones
+            return ERROR_RESPONSE
+
+        # LOCATE and COUNT are keyed by their line like a lookup
+        key = argument if command in ("LOCATE", "COUNT") else query
+        partition = self.partition_of(key)
+        metrics.increment("routed_queries")
+        response = await self._route(self.partitions[partition], query)
+        if command == "LOCATE":
+            return map_locate(response, self.line_maps[partition])
+        return response
+
+    def _by_health(self, replicas: List[Backend]) -> List[Backend]:
+        """Replicas in the order to try them, spreading the load"""
+        start = next(self._turns) % len(replicas)
+        rotated = replicas[start:] + replicas[:start]
+        return sorted(rotated, key=lambda backend: (not backend.healthy,
+                                                    not backend.ready))
+
+    async def _route(self, replicas: List[Backend], query: str) -> str:
+        """Reply of the first replica to answer, hedging slow ones"""
+        candidates = iter(self._by_health(replicas))
+        pending = set()
+        busy = False
+        try:
+            while True:
+                backend = next(candidates, None)
+                if backend is not None:
+                    if pending:
+                        metrics.increment("hedged_requests")
+                    pending.add(asyncio.ensure_future(
+                        self._ask(backend, query)))
+                elif not pending:
+                    return BUSY_RESPONSE if busy else ERROR_RESPONSE
+
+                # With replicas left, wait only until it is time to hedge
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED,
+                    timeout=self.hedge_delay if backend is not None
+                    else None)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if task.result() == BUSY_RESPONSE:
+                        busy = True
+                        continue
+                    return task.result()
+        finally:
+            # The answer is in, the slower requests are no longer needed
+            for task in pending:
+                task.cancel()
+
+    async def _ask(self, backend: Backend, query: str) -> str:
+        """Send a query to one replica, marking it unhealthy on failure"""
+        try:
+            response = await backend.client.search(query)
+        except Exception as e:
+            metrics.increment("backend_errors")
+            backend.mark(False, False)
+            logger.debug("Backend %s failed: %r", backend.address, e)
+            raise
+        if response == BUSY_RESPONSE:
+            metrics.increment("backend_busy")
+        return response
+
+    async def check_health(self) -> None:
+        """Send READY to every backend and record the outcome"""
+        async def check(backend: Backend) -> None:
+            try:
+                response = await backend.client.search(
+                    "READY", timeout=self.health_timeout)
+            except Exception:
+                backend.mark(False, False)
+            else:
+                backend.mark(True, response == "READY\n")
+
+        await asyncio.gather(*(check(backend)
+                               for backend in self.backends()))
+
+    async def _check_health_forever(self) -> None:
+        """Repeat the health checks until the router closes"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    async def start(self) -> None:
+        """Check every backend once, then keep checking in the background"""
+        await self.check_health()
+        self._health_task = asyncio.create_task(
+            self._check_health_forever())
+
+    async def close(self) -> None:
+        """Stop the health checks and close the backend connections"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for backend in self.backends():
+            await backend.client.close()
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """Serve one client connection in either protocol"""
+        metrics.increment("connections_accepted")
+        try:
+            # Maximum payload of 1024 bytes
+            data = await asyncio.wait_for(reader.read(1024),
+                                          self.idle_timeout)
+
+            # The magic may be split across the first reads
+            while data and len(data) < len(MAGIC) and MAGIC.startswith(data):
+                more = await asyncio.wait_for(reader.read(1024),
+                                              self.idle_timeout)
+                if not more:
+                    break
+                data += more
+
+            if data.startswith(MAGIC):
+                await handle_binary_connection(
+                    reader, writer, self.resolve, initial=data[len(MAGIC):],
+                    idle_timeout=self.idle_timeout)
+                return
+
+            while data:
+                query = data.rstrip(b"\x00").decode().strip()
+                writer.write((await self.resolve(query)).encode())
+                await writer.drain()
+                data = await asyncio.wait_for(reader.read(1024),
+                                              self.idle_timeout)
+        except (asyncio.TimeoutError, ConnectionError, ProtocolError,
+                UnicodeDecodeError) as e:
+            logger.debug("Closing client connection: %r", e)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+
+def read_splits(path: str) -> List[str]:
+    """Split points written by shard_corpus.py, one per line"""
+    with open(path, "r", encoding="utf8") as file:
+        return [line.rstrip("\n") for line in file]
+
+
+def read_line_map(path: str) -> Sequence[int]:
+    """Corpus line numbers of a shard's lines, written by shard_corpus.py"""
+    with open(path, "r", encoding="utf8") as file:
+        return array("L", (int(line) for line in file))
+
+
+def create_ssl_context() -> Optional[ssl.SSLContext]:
+    """Server TLS context from config.cfg, None when use_ssl is off"""
+    options = {}
+    with open("config/config.cfg", "r", encoding="utf8") as config_file:
+        for line in config_file:
+            key, _, value = line.strip().partition("=")
+            if key in ("use_ssl", "certfile", "keyfile"):
+                options[key] = value
+
+    if options.get("use_ssl", "").lower() != "true":
+        return None
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(certfile=options["certfile"],
+                                keyfile=options["keyfile"])
+    return ssl_context
+
+
+async def main():
+    """Main function of the program"""
+    spec = os.getenv("ROUTER_BACKENDS")
+    if not spec:
+        logger.error("ROUTER_BACKENDS is not set")
+        sys.exit(1)
+
+    try:
+        client_options = {
+            "pool_size": int(os.getenv("ROUTER_POOL_SIZE", "4")),
+            "timeout": float(os.getenv("ROUTER_TIMEOUT", "5")),
+        }
+        partitions = [[Backend(host, port, **client_options)
+                       for host, port in replicas]
+                      for replicas in parse_backends(spec)]
+
+        splits = None
+        partitioning = os.getenv("ROUTER_PARTITIONING", "hash").lower()
+        if partitioning == "range":
+            splits = read_splits(os.getenv("ROUTER_SPLITS_FILE", ""))
+        elif partitioning != "hash":
+            raise ValueError(f"Unknown ROUTER_PARTITIONING {partitioning}")
+
+        # Needed for LOCATE, one .lines file per partition in shard order
+        line_maps = None
+        if os.getenv("ROUTER_LINE_MAPS"):
+            line_maps = [read_line_map(path.strip()) for path
+                         in os.getenv("ROUTER_LINE_MAPS").split(",")]
+
+        router = Router(
+            partitions, splits,
+            hedge_delay=float(os.getenv("ROUTER_HEDGE_MS", "50")) / 1000,
+            health_interval=float(os.getenv("ROUTER_HEALTH_INTERVAL", "2")),
+            max_matches=int(os.getenv("ROUTER_MAX_MATCHES", "100")),
+            idle_timeout=float(os.getenv("IDLE_TIMEOUT", "300")) or None,
+            line_maps=line_maps)
+        ssl_context = create_ssl_context()
+    except (OSError, ValueError) as e:
+        logger.error("Invalid router configuration: %s", e)
+        sys.exit(1)
+
+    await router.start()
+    server = await asyncio.start_server(
+        router.handle_client, os.getenv("ROUTER_HOST", "127.0.0.1"),
+        int(os.getenv("ROUTER_PORT", "8890")), ssl=ssl_context)
+    logger.info("Routing %d %s partitions on %s", len(partitions),
+                partitioning, server.sockets[0].getsockname())
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, server.close)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        loop.remove_signal_handler(signal.SIGTERM)
+        await router.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Router stopped by user")
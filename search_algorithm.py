@@ -32,10 +32,10 @@ def jump_search(arr, target):
     return -1
 
 
-def binary_search(arr, target):
+def binary_search(arr, target, low=0, high=None):
     """Binary Search Inplementation Algorithm"""
-    low = 0
-    high = len(arr) - 1
+    if high is None:
+        high = len(arr) - 1
 
     while low <= high:
         mid = (low + high) // 2
@@ -89,6 +89,8 @@ def kmp_search(text, pattern):
 
 def exponential_search(arr, target):
     """Exponential Search Inplementation Algorithm"""
+    if not arr:
+        return -1
     if arr[0] == target:
         return 0
 
@@ -97,4 +99,5 @@ def exponential_search(arr, target):
     while i < length and arr[i] <= target:
         i *= 2
 
-    return binary_search(arr[:min(i, length)], target)
+    # Search the bracketed range in place instead of copying a slice
+    return binary_search(arr, target, i // 2, min(i, length) - 1)
@@ -0,0 +1,187 @@
+"""Exact match search engines for the cached query path.
+
+Every engine answers "is this query a line of the corpus" and declares
+the preprocessing its lookup relies on. The steps run once, when the
+corpus is loaded, so a query never sorts, copies or deduplicates:
+
+  - dedup: drop repeated lines, keeping the first occurrence
+  - sort: order the lines, required by the bisecting searches
+  - offsets: pack the lines into a CompactCorpus buffer
+  - hash: put the lines in a frozenset
+
+The engine used by the server is selected by name through ENGINES.
+Given max_lines, an engine holds only the first max_lines lines of the
+corpus, the ones before the starting offset of a tail following it.
+"""
+
+import itertools
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Type
+from compact_corpus import CompactCorpus
+from corpus import iter_corpus_lines
+from mph_index import MinimalPerfectHashIndex
+from search_algorithm import binary_search, exponential_search
+from search_algorithm import jump_search, linear_search
+
+
+# Preprocessing steps, applied in the order an engine declares them
+PREPROCESSING = {
+    "dedup": lambda lines: list(dict.fromkeys(lines)),
+    "sort": sorted,
+    "offsets": CompactCorpus.from_lines,
+    "hash": frozenset,
+}
+
+
+def read_lines(path: str, max_lines: Optional[int] = None) -> Iterable[str]:
+    """Corpus lines, only the first max_lines of them when given"""
+    lines = iter_corpus_lines(path)
+    if max_lines is not None:
+        lines = itertools.islice(lines, max_lines)
+    return lines
+
+
+def prepare_lines(lines: Iterable[str], steps: Tuple[str, ...]):
+    """Apply preprocessing steps to the corpus lines"""
+    if not steps:
+        # Engines without preprocessing still need random access
+        return list(lines)
+    for step in steps:
+        lines = PREPROCESSING[step](lines)
+    return lines
+
+
+class SearchEngine:
+    """Base class: exact line lookup over preprocessed corpus lines"""
+
+    name = ""
+    preprocessing: Tuple[str, ...] = ()
+    # Whether the prepared lines keep the corpus order and duplicates
+    keeps_order = False
+
+    def __init__(self, lines) -> None:
+        self.lines = lines
+
+    @classmethod
+    def load(cls, path: str, max_lines: Optional[int] = None,
+             **options) -> "SearchEngine":
+        """Read the corpus and run the declared preprocessing"""
+        return cls(prepare_lines(read_lines(path, max_lines),
+                                 cls.preprocessing))
+
+    @property
+    def ordered_lines(self) -> Optional[Sequence[str]]:
+        """Lines in corpus order when the engine keeps them, else None"""
+        return self.lines if self.keeps_order else None
+
+    def __contains__(self, query: object) -> bool:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+
+class HashEngine(SearchEngine):
+    """Set membership, constant time per lookup"""
+
+    name = "hash"
+    preprocessing = ("hash",)
+
+    def __contains__(self, query: object) -> bool:
+        return query in self.lines
+
+
+class ScanEngine(SearchEngine):
+    """Linear search over the lines as they appear in the file"""
+
+    name = "scan"
+    keeps_order = True
+
+    def __contains__(self, query: object) -> bool:
+        return linear_search(self.lines, query) >= 0
+
+
+class JumpEngine(SearchEngine):
+    """Jump search in steps of sqrt(n) over the sorted lines"""
+
+    name = "jump"
+    preprocessing = ("dedup", "sort")
+
+    def __contains__(self, query: object) -> bool:
+        return jump_search(self.lines, query) >= 0
+
+
+class BinaryEngine(SearchEngine):
+    """Binary search over the sorted lines"""
+
+    name = "binary"
+    preprocessing = ("dedup", "sort")
+
+    def __contains__(self, query: object) -> bool:
+        return binary_search(self.lines, query) >= 0
+
+
+class ExponentialEngine(SearchEngine):
+    """Exponential search over the sorted lines"""
+
+    name = "exponential"
+    preprocessing = ("dedup", "sort")
+
+    def __contains__(self, query: object) -> bool:
+        return exponential_search(self.lines, query) >= 0
+
+
+class CompactEngine(SearchEngine):
+    """CompactCorpus hash table over one buffer of line bytes"""
+
+    name = "compact"
+    preprocessing = ("offsets",)
+    keeps_order = True
+
+    def __contains__(self, query: object) -> bool:
+        return query in self.lines
+
+
+class PerfectHashEngine(SearchEngine):
+    """Minimal perfect hash index file, loaded with mmap
+
+    Deduplication and the offsets of the stored lines are part of the
+    index file, so they are only redone when the file is rebuilt.
+    """
+
+    name = "mph"
+    preprocessing = ("dedup", "offsets")
+
+    @classmethod
+    def load(cls, path: str, index_path: Optional[str] = None,
+             max_lines: Optional[int] = None,
+             **options) -> "PerfectHashEngine":
+        """Load the index file next to the corpus unless one is given
+
+        The index file covers the whole corpus, so with max_lines the
+        index is built in memory instead.
+        """
+        if max_lines is not None:
+            return cls(MinimalPerfectHashIndex.build(
+                read_lines(path, max_lines)))
+        return cls(MinimalPerfectHashIndex.load_or_build(
+            index_path or f"{path}.mph", path))
+
+    def __contains__(self, query: object) -> bool:
+        return query in self.lines
+
+
+# Engines selectable with SEARCH_ENGINE, keyed by name
+ENGINES: Dict[str, Type[SearchEngine]] = {
+    engine.name: engine
+    for engine in (HashEngine, ScanEngine, JumpEngine, BinaryEngine,
+                   ExponentialEngine, CompactEngine, PerfectHashEngine)
+}
+
+
+def create_engine(name: str, path: str, **options) -> SearchEngine:
+    """Load the corpus at path into the engine called name"""
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown search engine: {name}") from None
+    return engine_class.load(path, **options)
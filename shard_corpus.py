@@ -0,0 +1,81 @@
+"""Split a corpus into partitions for router.py.
+
+Usage: python shard_corpus.py SOURCE PARTITIONS [hash|range]
+
+Writes SOURCE.shard0 ... SOURCE.shard<N-1>, one plain text file per
+partition, keeping the order the lines had in SOURCE. Next to each
+shard, SOURCE.shard<n>.lines holds the line number in SOURCE of every
+line of the shard, one per line, for ROUTER_LINE_MAPS. Hash
+partitioning assigns a line by its CRC32, the same function the
+router uses. Range partitioning picks split points so the partitions
+hold about as many distinct lines each, and writes them to
+SOURCE.splits for ROUTER_SPLITS_FILE.
+
+All copies of a line go to the same partition, so COUNT and LOCATE
+are answered by one shard. The router turns the shard's LOCATE line
+numbers back into numbers in SOURCE with the .lines files.
+"""
+
+import sys
+from typing import List, Optional
+from corpus import iter_corpus_lines
+from router import hash_partition, range_partition
+
+
+def range_splits(path: str, partitions: int) -> List[str]:
+    """Split points giving each partition about the same distinct lines"""
+    lines = sorted(set(iter_corpus_lines(path)))
+    return [lines[len(lines) * number // partitions]
+            for number in range(1, partitions)]
+
+
+def shard_file(path: str, partitions: int,
+               splits: Optional[List[str]] = None) -> List[int]:
+    """Write the partitions of path and their line number maps,
+    returning their line counts"""
+    counts = [0] * partitions
+    files = [open(f"{path}.shard{number}", "w", encoding="utf8")
+             for number in range(partitions)]
+    line_maps = [open(f"{path}.shard{number}.lines", "w", encoding="utf8")
+                 for number in range(partitions)]
+    try:
+        for line_number, line in enumerate(iter_corpus_lines(path), 1):
+            if splits is not None:
+                number = range_partition(line, splits)
+            else:
+                number = hash_partition(line, partitions)
+            files[number].write(line + "\n")
+            line_maps[number].write(f"{line_number}\n")
+            counts[number] += 1
+    finally:
+        for file in files + line_maps:
+            file.close()
+    return counts
+
+
+def main():
+    """Main function of the program"""
+    if len(sys.argv) not in (3, 4) or not sys.argv[2].isdigit():
+        print("Usage: python shard_corpus.py SOURCE PARTITIONS [hash|range]")
+        sys.exit(1)
+
+    path, partitions = sys.argv[1], int(sys.argv[2])
+    partitioning = sys.argv[3] if len(sys.argv) == 4 else "hash"
+    if partitioning not in ("hash", "range") or partitions < 1:
+        print("Partitioning must be hash or range, with at least one "
+              "partition")
+        sys.exit(1)
+
+    splits = None
+    if partitioning == "range":
+        splits = range_splits(path, partitions)
+        with open(f"{path}.splits", "w", encoding="utf8") as file:
+            file.writelines(split + "\n" for split in splits)
+
+    counts = shard_file(path, partitions, splits)
+    for number, count in enumerate(counts):
+        print(f"Partition: {path}.shard{number}, Lines: {count}")
+
+
+if __name__ == "__main__":
+    main()
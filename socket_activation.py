@@ -0,0 +1,41 @@
+"""systemd socket activation.
+
+With a .socket unit, systemd binds the listening socket itself and
+hands it to the server as an inherited file descriptor, announced by
+the LISTEN_PID and LISTEN_FDS environment variables (the protocol of
+sd_listen_fds(3)). The socket outlives server restarts, so connections
+made while the server restarts wait in the backlog instead of being
+refused.
+"""
+
+import os
+import socket
+from typing import List
+
+
+# First inherited descriptor, after stdin, stdout and stderr
+SD_LISTEN_FDS_START = 3
+
+
+def listen_fds() -> range:
+    """Descriptors systemd passed to this process, empty if none
+
+    The variables are removed so child processes do not mistake the
+    descriptors for their own.
+    """
+    listen_pid = os.environ.pop("LISTEN_PID", "")
+    listen_count = os.environ.pop("LISTEN_FDS", "")
+    os.environ.pop("LISTEN_FDNAMES", None)
+
+    # The variables may have been inherited from a parent process
+    if not listen_pid.isdigit() or int(listen_pid) != os.getpid():
+        return range(0)
+    if not listen_count.isdigit():
+        return range(0)
+    return range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + int(listen_count))
+
+
+def listen_sockets() -> List[socket.socket]:
+    """Listening sockets passed in by systemd, empty if not activated"""
+    # Family and type are read from the descriptor itself
+    return [socket.socket(fileno=fd) for fd in listen_fds()]
@@ -1,10 +1,18 @@
 """Pytest module for the async_server module"""
 
 import io
+import time
 import pytest
 import asyncio
+import threading
 from ssl import SSLContext
+import async_server
 from async_server import search_string_in_file, search_in_cached_file, main
+from async_server import resolve_query, handle_client, fuzzy_search
+from async_server import regex_search, build_index, reload_server
+from async_server import select_ssl_context, drain_queries
+from async_server import request_shutdown, close_connections
+from async_server import get_command_index, run_query
 
 
 @pytest.fixture
@@ -129,5 +137,574 @@ async def test_server_start(mocker):
     asyncio.start_server.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_server_start_socket_activated(mocker):
+    """Test case to check a socket from systemd is used instead of binding"""
+    activated = mocker.MagicMock()
+    mocker.patch("async_server.listen_sockets", return_value=[activated])
+    mock_start = mocker.patch("asyncio.start_server",
+                              return_value=mocker.AsyncMock())
+
+    await main()
+
+    assert mock_start.call_args.kwargs["sock"] is activated
+    assert "port" not in mock_start.call_args.kwargs
+
+
+@pytest.mark.asyncio
+async def test_resolve_query_busy(mocker, query):
+    """Test case to check queries are shed when too many are in flight"""
+    mocker.patch("async_server.max_inflight_queries", 0)
+    mock_search = mocker.patch("async_server.search_in_cached_file")
+
+    result = await resolve_query(query)
+    assert result == "BUSY\n"
+    mock_search.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_busy_only_for_client_over_its_share(mocker):
+    """Test case to check a quiet client is served while a noisy one is
+    rejected for holding the whole query cap"""
+    mocker.patch("async_server.max_inflight_queries", 4)
+    mocker.patch("async_server.reread_on_query", False)
+    release = asyncio.Event()
+
+    async def submit(client, function, *args):
+        await release.wait()
+        return "STRING EXISTS\n"
+
+    mocker.patch.object(async_server.scheduler, "submit", side_effect=submit)
+    noisy = [asyncio.create_task(run_query(f"noisy {number}", "noisy"))
+             for number in range(6)]
+    await asyncio.sleep(0)
+    quiet = asyncio.create_task(run_query("quiet", "quiet"))
+    await asyncio.sleep(0)
+    release.set()
+
+    replies = await asyncio.gather(*noisy)
+    assert replies.count("BUSY\n") == 2
+    assert await quiet == "STRING EXISTS\n"
+    assert async_server.client_queries == {}
+
+
+@pytest.mark.asyncio
+async def test_resolve_query_stats(mocker):
+    """Test case to check the STATS command bypasses admission control"""
+    mocker.patch("async_server.max_inflight_queries", 0)
+
+    result = await resolve_query("STATS")
+    assert result.startswith("STATS ")
+    assert "inflight_queries=0" in result
+
+
+@pytest.mark.asyncio
+async def test_handle_client_rejects_when_full(mocker):
+    """Test case to check connections over the cap get a BUSY reply"""
+    mocker.patch("async_server.max_connections", 0)
+    mock_reader = mocker.AsyncMock()
+    mock_writer = mocker.MagicMock()
+    mock_writer.drain = mocker.AsyncMock()
+    mock_writer.wait_closed = mocker.AsyncMock()
+
+    await handle_client(mock_reader, mock_writer)
+
+    mock_writer.write.assert_called_once_with(b"BUSY\n")
+    mock_writer.close.assert_called_once()
+    mock_reader.read.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_handle_client_read_timeout(mocker):
+    """Test case to check a silent connection is closed after the timeout"""
+    mocker.patch("async_server.read_timeout", 0.01)
+    mock_reader = mocker.MagicMock()
+    mock_reader.read = mocker.AsyncMock(side_effect=asyncio.TimeoutError)
+    mock_writer = mocker.MagicMock()
+    mock_writer.wait_closed = mocker.AsyncMock()
+
+    await handle_client(mock_reader, mock_writer)
+
+    mock_writer.write.assert_not_called()
+    mock_writer.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_handle_client_split_magic_timeout(mocker):
+    """Test case to check a client stalling inside the magic is timed out"""
+    mocker.patch("async_server.read_timeout", 0.01)
+    mock_reader = mocker.MagicMock()
+    mock_reader.read = mocker.AsyncMock(
+        side_effect=[b"\x00", asyncio.TimeoutError])
+    mock_writer = mocker.MagicMock()
+    mock_writer.wait_closed = mocker.AsyncMock()
+    mock_error = mocker.patch.object(async_server.logger, "error")
+    read_timeouts = async_server.metrics.get("read_timeouts")
+
+    await handle_client(mock_reader, mock_writer)
+
+    assert async_server.metrics.get("read_timeouts") == read_timeouts + 1
+    mock_error.assert_not_called()
+    mock_writer.write.assert_not_called()
+    mock_writer.close.assert_called_once()
+
+
+def test_search_in_cached_file_uses_index(mocker, query):
+    """Test case to check the built index replaces the file scan"""
+    mocker.patch("async_server.corpus_index", frozenset([query]))
+    mock_scan = mocker.patch("async_server.scan_corpus")
+
+    assert search_in_cached_file(query) == "STRING EXISTS\n"
+    assert search_in_cached_file("fake_string") == "STRING NOT FOUND\n"
+    mock_scan.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_resolve_query_readiness(mocker):
+    """Test case to check the READY command reflects the index state"""
+    mocker.patch("async_server.index_state", "building")
+    assert await resolve_query("READY") == "NOT READY\n"
+
+    mocker.patch("async_server.index_state", "ready")
+    assert await resolve_query("READY") == "READY\n"
+
+
+@pytest.mark.parametrize("argument", ["x 6;0;1;", "9 6;0;1;", "1", "1 "])
+def test_fuzzy_search_rejects_bad_arguments(argument):
+    """Test case to check malformed FUZZY commands get an ERROR reply"""
+    assert fuzzy_search(argument) == "ERROR\n"
+
+
+@pytest.mark.asyncio
+async def test_resolve_query_fuzzy(mocker, query):
+    """Test case to check FUZZY queries return the matching lines"""
+    mock_index = mocker.MagicMock()
+    mock_index.search.return_value = [(query, 0)]
+    mocker.patch("async_server.get_fuzzy_index", return_value=mock_index)
+
+    result = await resolve_query(f"FUZZY 1 {query}")
+    assert result == f"MATCHES 1\n0 {query}\n"
+    mock_index.search.assert_called_once_with(query, 1, mocker.ANY)
+
+
+def test_regex_search_invalid_pattern():
+    """Test case to check an invalid REGEX pattern gets an ERROR reply"""
+    assert regex_search("(") == "ERROR\n"
+    assert regex_search("") == "ERROR\n"
+
+
+def test_regex_search_partial(mocker):
+    """Test case to check budget limited searches are marked PARTIAL"""
+    mock_index = mocker.MagicMock()
+    mock_index.search.return_value = (["6;0;1;26;0;7;3;0;"], False)
+    mocker.patch("async_server.get_regex_index", return_value=mock_index)
+
+    assert regex_search("^6;0;") == "MATCHES 1 PARTIAL\n6;0;1;26;0;7;3;0;\n"
+
+
+@pytest.mark.asyncio
+async def test_build_index_uses_search_engine(mocker, tmp_path, query):
+    """Test case to check SEARCH_ENGINE selects the cached lookup path"""
+    path = tmp_path / "corpus.txt"
+    path.write_text(f"{query}\n25;0;23;16;0;19;3;0;\n", encoding="utf8")
+    mocker.patch("async_server.search_file_path", str(path))
+    mocker.patch("async_server.search_engine", "binary")
+    mocker.patch("async_server.corpus_index", None)
+    mocker.patch("async_server.index_state", "building")
+
+    await build_index()
+
+    assert async_server.index_state == "ready"
+    assert async_server.corpus_index.name == "binary"
+    assert search_in_cached_file(query) == "STRING EXISTS\n"
+    assert search_in_cached_file("fake_string") == "STRING NOT FOUND\n"
+
+
+@pytest.fixture
+def reload_config(mocker, tmp_path):
+    """Config file for reloads, with the server state restored after"""
+    saved = {key: getattr(async_server, key)
+             for key in async_server.load_config()}
+    mocker.patch.multiple("async_server", **saved)
+    mocker.patch.multiple("async_server", corpus_index=None,
+                          corpus_tail=None, index_state="ready",
+                          corpus_version=0, command_indexes={},
+                          active_ssl_context=None)
+    mocker.patch("async_server.load_dotenv")
+    mocker.patch.dict("os.environ", {"REREAD_ON_QUERY": "False",
+                                     "SEARCH_ENGINE": "hash"})
+
+    config_path = tmp_path / "config.cfg"
+    mocker.patch("async_server.config_file_path", str(config_path))
+    yield config_path
+    async_server.scheduler.set_limits(saved["client_inflight"],
+                                      saved["noisy_client_queue"])
+    async_server.scan_batcher.set_limits(saved["scan_batch_window"],
+                                         saved["scan_batch_size"])
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_corpus(reload_config, tmp_path):
+    """Test case to check a reload serves the new corpus"""
+    corpus_path = tmp_path / "corpus.txt"
+    corpus_path.write_text("reloaded;line;\n", encoding="utf8")
+    reload_config.write_text(f"linuxpath={corpus_path}\n", encoding="utf8")
+    async_server.command_indexes["line store"] = ["6;0;1;26;0;7;3;0;"]
+
+    assert await reload_server() is True
+
+    assert async_server.corpus_version == 1
+    assert async_server.command_indexes == {}
+    assert search_in_cached_file("reloaded;line;") == "STRING EXISTS\n"
+    assert search_in_cached_file("6;0;1;26;0;7;3;0;") == \
+        "STRING NOT FOUND\n"
+
+
+@pytest.mark.asyncio
+async def test_reload_applies_query_settings(mocker, reload_config):
+    """Test case to check a reload applies the query path settings"""
+    reload_config.write_text(f"linuxpath={async_server.search_file_path}\n",
+                             encoding="utf8")
+    mocker.patch.dict("os.environ", {"CLIENT_MAX_INFLIGHT": "5",
+                                     "NOISY_CLIENT_QUEUE": "7",
+                                     "COALESCE_QUERIES": "False",
+                                     "SCAN_BATCH_WINDOW_MS": "5",
+                                     "SCAN_BATCH_SIZE": "1"})
+    set_limits = mocker.spy(async_server.scheduler, "set_limits")
+    set_batch_limits = mocker.spy(async_server.scan_batcher, "set_limits")
+
+    assert await reload_server() is True
+    assert async_server.client_inflight == 5
+    assert async_server.coalesce_queries is False
+    assert async_server.scan_batch_size == 1
+    set_limits.assert_called_once_with(5, 7)
+    set_batch_limits.assert_called_once_with(0.005, 1)
+
+
+@pytest.mark.asyncio
+async def test_reload_failure_keeps_config(reload_config, tmp_path):
+    """Test case to check a bad config leaves the running one in place"""
+    reload_config.write_text(f"linuxpath={tmp_path / 'missing.txt'}\n",
+                             encoding="utf8")
+    search_file_path = async_server.search_file_path
+
+    assert await reload_server() is False
+    assert async_server.search_file_path == search_file_path
+    assert async_server.corpus_version == 0
+
+
+@pytest.mark.asyncio
+async def test_reload_refused_while_building(mocker, reload_config):
+    """Test case to check a reload never overlaps another index build"""
+    async_server.index_state = "building"
+    mock_load = mocker.patch("async_server.load_config")
+
+    assert await reload_server() is False
+    mock_load.assert_not_called()
+
+
+def test_select_ssl_context(mocker):
+    """Test case to check handshakes move onto the reloaded context"""
+    listening, reloaded = mocker.MagicMock(), mocker.MagicMock()
+    ssl_object = mocker.MagicMock()
+    ssl_object.context = listening
+
+    mocker.patch("async_server.active_ssl_context", listening)
+    select_ssl_context(ssl_object, None, listening)
+    assert ssl_object.context is listening
+
+    mocker.patch("async_server.active_ssl_context", reloaded)
+    select_ssl_context(ssl_object, None, listening)
+    assert ssl_object.context is reloaded
+
+
+@pytest.mark.asyncio
+async def test_resolve_query_coalesces_identical_queries(mocker, query):
+    """Test case to check concurrent identical queries search once"""
+    async def slow_run(query, client=None):
+        await asyncio.sleep(0.05)
+        return "STRING EXISTS\n"
+
+    mock_run = mocker.patch("async_server.run_query", side_effect=slow_run)
+    mocker.patch("async_server.coalesce_queries", True)
+
+    results = await asyncio.gather(
+        *(resolve_query(query, client) for client in range(5)),
+        resolve_query("25;0;23;16;0;19;3;0;"))
+
+    assert results == ["STRING EXISTS\n"] * 6
+    assert mock_run.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_reread_lookups_are_batched(mocker, tmp_path, query):
+    """Test case to check reread lookups share a pass over the file"""
+    path = tmp_path / "corpus.txt"
+    path.write_text(f"{query}\n", encoding="utf8")
+    mocker.patch("async_server.search_file_path", str(path))
+    mocker.patch("async_server.reread_on_query", True)
+    mocker.patch("async_server.coalesce_queries", False)
+    batches = async_server.scan_batcher.batches
+
+    results = await asyncio.gather(resolve_query(query),
+                                   resolve_query("fake_string"))
+
+    assert results == ["STRING EXISTS\n", "STRING NOT FOUND\n"]
+    assert async_server.scan_batcher.batches == batches + 1
+
+
+def test_command_index_builds_do_not_block_others(mocker):
+    """Test case to check a slow index build leaves other indexes usable"""
+    mocker.patch("async_server.command_indexes", {"posting": "posting"})
+    mocker.patch("async_server.command_index_locks", {})
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return "fuzzy"
+
+    builder = threading.Thread(target=get_command_index,
+                               args=("fuzzy", slow_build))
+    builder.start()
+    try:
+        assert started.wait(5)
+        # A built index is read without waiting, another one can build
+        start_time = time.perf_counter()
+        assert get_command_index("posting", slow_build) == "posting"
+        assert get_command_index("trigram", lambda: "trigram") == "trigram"
+        assert time.perf_counter() - start_time < 1
+    finally:
+        release.set()
+        builder.join()
+
+    build = mocker.Mock()
+    assert get_command_index("fuzzy", build) == "fuzzy"
+    build.assert_not_called()
+
+
+@pytest.mark.parametrize("reread", [False, True])
+def test_locate_and_count(mocker, tmp_path, query, reread):
+    """Test case to check LOCATE and COUNT with and without an index"""
+    path = tmp_path / "corpus.txt"
+    path.write_text(f"{query}\n1;0;0;0;\n{query}\n{query}\n",
+                    encoding="utf8")
+    mocker.patch("async_server.search_file_path", str(path))
+    mocker.patch("async_server.reread_on_query", reread)
+    mocker.patch("async_server.corpus_index", None)
+    mocker.patch("async_server.command_indexes", {})
+    mocker.patch("async_server.locate_max_results", 2)
+
+    assert async_server.locate_search(query) == "MATCHES 2 PARTIAL\n1\n3\n"
+    assert async_server.locate_search("1;0;0;0;") == "MATCHES 1\n2\n"
+    assert async_server.locate_search("fake_string") == \
+        "STRING NOT FOUND\n"
+    assert async_server.count_search(query) == "COUNT 3\n"
+    assert async_server.count_search("fake_string") == "COUNT 0\n"
+    assert async_server.count_search(" ") == "ERROR\n"
+
+
+@pytest.mark.asyncio
+async def test_request_shutdown_stops_accepting(mocker):
+    """Test case to check SIGTERM closes the listener once and drains"""
+    mocker.patch("async_server.draining", False)
+    mocker.patch("async_server.shutdown_task", None)
+    mock_shut_down = mocker.patch("async_server.shut_down")
+    mock_server = mocker.MagicMock()
+
+    request_shutdown(mock_server)
+    request_shutdown(mock_server)
+
+    assert async_server.draining is True
+    mock_server.close.assert_called_once()
+    await async_server.shutdown_task
+    mock_shut_down.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_close_connections_after_drain(mocker):
+    """Test case to check idle connections are closed, then aborted"""
+    mocker.patch("async_server.CLOSE_TIMEOUT", 0.1)
+    closing = mocker.MagicMock()
+    stuck = mocker.MagicMock()
+    # One connection goes away when closed, the other never does
+    closing.close.side_effect = lambda: \
+        async_server.open_transports.discard(closing)
+    mocker.patch("async_server.open_transports", {closing, stuck})
+
+    await asyncio.wait_for(close_connections(), 1)
+
+    closing.close.assert_called_once()
+    closing.abort.assert_not_called()
+    stuck.close.assert_called_once()
+    stuck.abort.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_inflight_queries(mocker):
+    """Test case to check the drain returns once queries have finished"""
+    mocker.patch("async_server.inflight_queries", 1)
+    mocker.patch("async_server.drain_timeout", 5)
+
+    async def finish_query():
+        await asyncio.sleep(0.1)
+        async_server.inflight_queries = 0
+
+    finisher = asyncio.create_task(finish_query())
+    await asyncio.wait_for(drain_queries(), 1)
+    assert finisher.done()
+
+
+@pytest.mark.asyncio
+async def test_drain_timeout(mocker):
+    """Test case to check a stuck query does not block the exit"""
+    mocker.patch("async_server.inflight_queries", 1)
+    mocker.patch("async_server.drain_timeout", 0.1)
+
+    await asyncio.wait_for(drain_queries(), 1)
+
+
+@pytest.mark.asyncio
+async def test_handle_client_closes_after_reply_when_draining(mocker, query):
+    """Test case to check a draining server answers then hangs up"""
+    mocker.patch("async_server.draining", True)
+    mocker.patch("async_server.answer_query",
+                 return_value="STRING EXISTS\n")
+    mock_reader = mocker.AsyncMock()
+    mock_reader.read.return_value = query.encode()
+    mock_writer = mocker.MagicMock()
+    mock_writer.drain = mocker.AsyncMock()
+    mock_writer.wait_closed = mocker.AsyncMock()
+
+    await handle_client(mock_reader, mock_writer)
+
+    mock_reader.read.assert_called_once()
+    mock_writer.write.assert_called_once_with(b"STRING EXISTS\n")
+    mock_writer.close.assert_called_once()
+
+
+async def wait_until(condition, timeout=2.0):
+    """Poll condition until it holds or the timeout expires"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_tail_mode_follows_appends(mocker, tmp_path, query):
+    """Test case to check appended lines are indexed and truncation
+    rebuilds the index"""
+    path = tmp_path / "corpus.txt"
+    path.write_text(f"{query}\n1;0;0;0;\n", encoding="utf8")
+    mocker.patch.multiple("async_server", search_file_path=str(path),
+                          search_engine="compact", mph_index_file=None,
+                          tail_corpus=True, tail_poll_interval=0.01,
+                          corpus_index=None, corpus_tail=None,
+                          index_state="building", corpus_version=0,
+                          command_indexes={}, reload_in_progress=False,
+                          locate_max_results=10)
+    await build_index()
+    assert async_server.corpus_tail.base_lines == 2
+    # Build the command indexes before the append
+    assert async_server.count_search(query) == "COUNT 1\n"
+
+    follower = asyncio.create_task(async_server.follow_corpus())
+    try:
+        with open(path, "a", encoding="utf8") as file:
+            file.write(f"new;line;\n{query}\n")
+        await wait_until(lambda: async_server.corpus_version == 2)
+
+        assert search_in_cached_file("new;line;") == "STRING EXISTS\n"
+        assert async_server.count_search(query) == "COUNT 2\n"
+        assert async_server.locate_search(query) == "MATCHES 2\n1\n4\n"
+        assert fuzzy_search("1 new;line") == "MATCHES 1\n1 new;line;\n"
+        assert regex_search("^new") == "MATCHES 1\nnew;line;\n"
+
+        # Truncation falls back to a full rebuild
+        path.write_text("other;line;\n", encoding="utf8")
+        await wait_until(lambda: async_server.corpus_version == 3)
+
+        assert search_in_cached_file("other;line;") == "STRING EXISTS\n"
+        assert search_in_cached_file("new;line;") == "STRING NOT FOUND\n"
+        assert async_server.count_search(query) == "COUNT 0\n"
+    finally:
+        follower.cancel()
+
+
+@pytest.mark.parametrize("engine", ["hash", "compact", "mph"])
+@pytest.mark.asyncio
+async def test_tail_mode_leaves_partial_line_to_tail(mocker, tmp_path, query,
+                                                     engine):
+    """Test case to check a line without its newline is never indexed"""
+    path = tmp_path / "corpus.txt"
+    path.write_text(f"{query}\n7;8", encoding="utf8")
+    mocker.patch.multiple("async_server", search_file_path=str(path),
+                          search_engine=engine, mph_index_file=None,
+                          tail_corpus=True, tail_poll_interval=0.01,
+                          corpus_index=None, corpus_tail=None,
+                          index_state="building", corpus_version=0,
+                          command_indexes={}, reload_in_progress=False)
+    await build_index()
+    assert search_in_cached_file(query) == "STRING EXISTS\n"
+    assert search_in_cached_file("7;8") == "STRING NOT FOUND\n"
+
+    follower = asyncio.create_task(async_server.follow_corpus())
+    try:
+        with open(path, "a", encoding="utf8") as file:
+            file.write(";9;\n")
+        await wait_until(lambda: async_server.corpus_version == 2)
+
+        assert search_in_cached_file("7;8;9;") == "STRING EXISTS\n"
+        assert search_in_cached_file("7;8") == "STRING NOT FOUND\n"
+    finally:
+        follower.cancel()
+
+
+@pytest.mark.asyncio
+async def test_commands_during_build_are_rebuilt(mocker, tmp_path, query):
+    """Test case to check command indexes built before the index is ready
+    do not keep a partial last line once the tail takes over"""
+    path = tmp_path / "corpus.txt"
+    path.write_text(f"{query}\n7;8", encoding="utf8")
+    mocker.patch.multiple("async_server", search_file_path=str(path),
+                          search_engine="compact", mph_index_file=None,
+                          tail_corpus=True, tail_poll_interval=0.01,
+                          corpus_index=None, corpus_tail=None,
+                          index_state="building", corpus_version=0,
+                          command_indexes={}, reload_in_progress=False)
+    # Answered from the whole file, partial line included
+    assert async_server.count_search("7;8") == "COUNT 1\n"
+
+    await build_index()
+    assert async_server.corpus_version == 1
+    assert async_server.command_indexes == {}
+
+    follower = asyncio.create_task(async_server.follow_corpus())
+    try:
+        with open(path, "a", encoding="utf8") as file:
+            file.write(";9;\n")
+        await wait_until(lambda: async_server.corpus_version == 2)
+
+        assert async_server.count_search("7;8") == "COUNT 0\n"
+        assert async_server.count_search("7;8;9;") == "COUNT 1\n"
+    finally:
+        follower.cancel()
+
+
+@pytest.mark.asyncio
+async def test_tail_mode_needs_cached_plain_corpus(reload_config, tmp_path,
+                                                   mocker):
+    """Test case to check TAIL_CORPUS is ignored in reread mode"""
+    corpus_path = tmp_path / "corpus.txt"
+    corpus_path.write_text("6;0;1;26;0;7;3;0;\n", encoding="utf8")
+    reload_config.write_text(f"linuxpath={corpus_path}\n", encoding="utf8")
+    mocker.patch.dict("os.environ", {"TAIL_CORPUS": "True"})
+
+    assert async_server.load_config()["tail_corpus"] is True
+    mocker.patch.dict("os.environ", {"REREAD_ON_QUERY": "True"})
+    assert async_server.load_config()["tail_corpus"] is False
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,208 @@
+"""Pytest module for the binary protocol module"""
+
+import pytest
+import asyncio
+import binary_protocol
+from binary_protocol import (MAGIC, encode_request, encode_batch_request,
+                             decode_batch_request, encode_response,
+                             encode_batch_response,
+                             decode_response, decode_batch_response,
+                             read_frame, handle_binary_connection)
+
+
+@pytest.fixture
+def corpus():
+    """Sample corpus served by the fake resolver"""
+    return {"6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;"}
+
+
+def test_batch_request_round_trip():
+    """Test case to check batch queries survive encoding"""
+    queries = ["6;0;1;26;0;7;3;0;", "", "25;0;23;16;0;19;3;0;"]
+    frame = encode_batch_request(7, queries)
+
+    body = frame[binary_protocol.HEADER.size:]
+    assert decode_batch_request(body) == queries
+
+
+def test_response_status_codes():
+    """Test case to check known responses use compact status codes"""
+    frame = encode_response(3, "STRING EXISTS\n")
+    length, request_id, status = binary_protocol.HEADER.unpack(frame)
+
+    assert (length, request_id, status) == (0, 3, binary_protocol.EXISTS)
+    assert decode_response(status, b"") == "STRING EXISTS\n"
+
+    # Anything else is carried verbatim in the body
+    frame = encode_response(4, "STATS queries=1\n")
+    length, _, status = binary_protocol.HEADER.unpack_from(frame)
+    assert status == binary_protocol.DATA
+    assert decode_response(status, frame[-length:]) == "STATS queries=1\n"
+
+
+def test_oversized_batch_item_is_an_error():
+    """Test case to check a reply too long for its item becomes ERROR"""
+    long_reply = "MATCHES 1\n" + "x" * 70000 + "\n"
+    frame = encode_batch_response(5, ["STRING EXISTS\n", long_reply])
+    length, _, _ = binary_protocol.HEADER.unpack_from(frame)
+
+    assert decode_batch_response(frame[-length:]) == ["STRING EXISTS\n",
+                                                      "ERROR\n"]
+
+
+@pytest.mark.asyncio
+async def test_out_of_order_replies(corpus):
+    """Test case to check a slow query does not block later ones"""
+
+    async def resolve(query):
+        if query == "slow":
+            await asyncio.sleep(0.2)
+        return "STRING EXISTS\n" if query in corpus else "STRING NOT FOUND\n"
+
+    async def handler(reader, writer):
+        negotiated = await reader.readexactly(len(MAGIC))
+        assert negotiated == MAGIC
+        await handle_binary_connection(reader, writer, resolve)
+        writer.close()
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(MAGIC + encode_request(1, "slow")
+                     + encode_request(2, "6;0;1;26;0;7;3;0;")
+                     + encode_batch_request(3, ["nope",
+                                                "25;0;23;16;0;19;3;0;"]))
+        await writer.drain()
+        assert await reader.readexactly(len(MAGIC)) == MAGIC
+
+        replies = [await read_frame(reader) for _ in range(3)]
+        writer.close()
+        await writer.wait_closed()
+
+    # The slow request finishes last even though it was sent first
+    assert [request_id for request_id, _, _ in replies] == [2, 3, 1]
+    assert replies[0][1] == binary_protocol.EXISTS
+    assert replies[1][1] == binary_protocol.BATCH_RESULT
+    assert decode_batch_response(replies[1][2]) == ["STRING NOT FOUND\n",
+                                                    "STRING EXISTS\n"]
+    assert replies[2][1] == binary_protocol.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_batch_and_frame_limits():
+    """Test case to check batches and frames are served within limits"""
+    running = 0
+    peak = 0
+
+    async def resolve(query):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return "STRING NOT FOUND\n"
+
+    async def handler(reader, writer):
+        await reader.readexactly(len(MAGIC))
+        await handle_binary_connection(reader, writer, resolve,
+                                       max_inflight_frames=2,
+                                       max_batch_items=100)
+        writer.close()
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(MAGIC + encode_batch_request(1, [""] * 101)
+                     + b"".join(encode_batch_request(number, [""] * 100)
+                                for number in range(2, 6)))
+        await writer.drain()
+        await reader.readexactly(len(MAGIC))
+
+        replies = {request_id: (status, body) for request_id, status, body
+                   in [await read_frame(reader) for _ in range(5)]}
+        writer.close()
+        await writer.wait_closed()
+
+    # A batch over the cap is refused as a whole
+    assert replies[1] == (binary_protocol.ERROR, b"")
+    for number in range(2, 6):
+        assert decode_batch_response(replies[number][1]) == \
+            ["STRING NOT FOUND\n"] * 100
+    # Two frames of BATCH_CONCURRENCY queries each at most
+    assert peak <= 2 * binary_protocol.BATCH_CONCURRENCY
+
+
+@pytest.mark.asyncio
+async def test_oversized_replies_are_answered():
+    """Test case to check replies too long to frame still get an answer"""
+
+    async def resolve(query):
+        return "MATCHES 1\n" + "x" * int(query) + "\n"
+
+    async def handler(reader, writer):
+        await reader.readexactly(len(MAGIC))
+        await handle_binary_connection(reader, writer, resolve)
+        writer.close()
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(MAGIC + encode_batch_request(1, ["10", "70000"])
+                     + encode_request(2, str(2 * 1024 * 1024)))
+        await writer.drain()
+        await reader.readexactly(len(MAGIC))
+
+        replies = {request_id: (status, body) for request_id, status, body
+                   in [await read_frame(reader) for _ in range(2)]}
+        writer.close()
+        await writer.wait_closed()
+
+    assert decode_batch_response(replies[1][1]) == \
+        ["MATCHES 1\n" + "x" * 10 + "\n", "ERROR\n"]
+    assert replies[2] == (binary_protocol.ERROR, b"")
+
+
+@pytest.mark.asyncio
+async def test_close_when_idle(corpus):
+    """Test case to check the connection closes once its frames finish"""
+    closing = False
+
+    async def resolve(query):
+        await asyncio.sleep(0.05)
+        return "STRING EXISTS\n" if query in corpus else "STRING NOT FOUND\n"
+
+    async def handler(reader, writer):
+        await reader.readexactly(len(MAGIC))
+        await handle_binary_connection(reader, writer, resolve,
+                                       close_when_idle=lambda: closing)
+        writer.close()
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(MAGIC + encode_request(1, "6;0;1;26;0;7;3;0;")
+                     + encode_request(2, "nope"))
+        await writer.drain()
+        await reader.readexactly(len(MAGIC))
+        closing = True
+
+        # Both frames in flight are still answered before the close
+        replies = sorted([await read_frame(reader) for _ in range(2)])
+        assert await reader.read(1024) == b""
+        writer.close()
+        await writer.wait_closed()
+
+    assert replies == [(1, binary_protocol.EXISTS, b""),
+                       (2, binary_protocol.NOT_FOUND, b"")]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,8 +1,63 @@
 """Pytest module for the client server module"""
 
+import ssl
+import time
 import pytest
 import asyncio
-from client import tcp_client
+import threading
+from binary_protocol import MAGIC, handle_binary_connection
+from client import (tcp_client, ResumableSSLContext, SearchClient,
+                    SyncSearchClient)
+
+
+class FakeBackend:
+    """Binary protocol server on its own event loop thread
+
+    Lines in corpus exist. delay slows every answer down and
+    drop_requests connections are closed on their first request
+    without a reply.
+    """
+
+    def __init__(self, corpus):
+        self.corpus = set(corpus)
+        self.delay = 0
+        self.drop_requests = 0
+        self.connections = 0
+        self.active = 0
+        self.peak = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, "127.0.0.1", 0),
+            self.loop).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def resolve(self, query):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        if query in self.corpus:
+            return "STRING EXISTS\n"
+        return "STRING NOT FOUND\n"
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        await reader.readexactly(len(MAGIC))
+        if self.drop_requests:
+            self.drop_requests -= 1
+            writer.write(MAGIC)
+            await reader.read(1)
+            writer.close()
+            return
+        await handle_binary_connection(reader, writer, self.resolve)
+        writer.close()
+
+    def stop(self):
+        self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
 
 
 @pytest.fixture
@@ -25,6 +80,15 @@ def env_vars():
     return config
 
 
+@pytest.fixture
+def backend(mocker):
+    """Fake plain text server holding one sample line"""
+    mocker.patch("client.use_ssl", False)
+    server = FakeBackend(["6;0;1;26;0;7;3;0;"])
+    yield server
+    server.stop()
+
+
 @pytest.mark.asyncio
 async def test_ssl_config_loading(query, config_data, env_vars, mocker):
     """Test cases for SSL configuration (independent)"""
@@ -73,5 +137,132 @@ async def test_tcp_client_without_ssl(query, mocker):
     await mock_writer.wait_closed()
 
 
+def test_resumable_context_offers_session(mocker):
+    """Test case to check the stored TLS session is offered on handshake"""
+    mock_wrap_bio = mocker.patch.object(ssl.SSLContext, "wrap_bio")
+    ssl_context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    session = mocker.MagicMock()
+    ssl_context.session = session
+
+    ssl_context.wrap_bio(ssl.MemoryBIO(), ssl.MemoryBIO(),
+                         server_hostname="localhost")
+
+    assert mock_wrap_bio.call_args.kwargs["session"] is session
+
+
+@pytest.mark.asyncio
+async def test_search_client_pipelines_on_one_connection(backend, query):
+    """Test case to check concurrent requests share a keep-alive connection"""
+    backend.delay = 0.2
+    async with SearchClient("127.0.0.1", backend.port,
+                            pool_size=1) as search_client:
+        start_time = time.perf_counter()
+        replies = await asyncio.gather(
+            *(search_client.search(query) for _ in range(10)))
+        elapsed = time.perf_counter() - start_time
+
+        assert replies == ["STRING EXISTS\n"] * 10
+        # Pipelined, so ten answers take about one delay
+        assert elapsed < 1.0
+        assert await search_client.search("fake_string") == \
+            "STRING NOT FOUND\n"
+
+    assert backend.connections == 1
+    stats = search_client.stats.snapshot()
+    assert stats["requests"] == 11 and stats["connections_opened"] == 1
+    assert stats["latency_p99_ms"] >= stats["latency_p50_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_search_client_pool_is_bounded(backend, query):
+    """Test case to check the pool grows to pool_size and no further"""
+    backend.delay = 0.1
+    async with SearchClient("127.0.0.1", backend.port,
+                            pool_size=3) as search_client:
+        await asyncio.gather(*(search_client.search(query)
+                               for _ in range(20)))
+
+    assert backend.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_search_client_inflight_cap(backend, query):
+    """Test case to check queries in flight, batches included, are capped"""
+    backend.delay = 0.05
+    async with SearchClient("127.0.0.1", backend.port, max_inflight=4,
+                            batch_size=3) as search_client:
+        await asyncio.gather(
+            search_client.search_many([query] * 9),
+            *(search_client.search(query) for _ in range(8)))
+
+    assert backend.peak <= 4
+
+
+@pytest.mark.asyncio
+async def test_search_many_batches(backend, query):
+    """Test case to check batch replies come back in request order"""
+    queries = [query if i % 3 == 0 else f"missing {i}" for i in range(25)]
+    async with SearchClient("127.0.0.1", backend.port,
+                            batch_size=10) as search_client:
+        replies = await search_client.search_many(queries)
+
+    assert replies == ["STRING EXISTS\n" if i % 3 == 0
+                       else "STRING NOT FOUND\n" for i in range(25)]
+    # Three frames instead of 25 requests
+    assert search_client.stats.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_search_client_timeout(backend, query):
+    """Test case to check a slow reply times out and is then dropped"""
+    backend.delay = 0.5
+    async with SearchClient("127.0.0.1", backend.port, pool_size=1,
+                            timeout=0.05) as search_client:
+        with pytest.raises(asyncio.TimeoutError):
+            await search_client.search(query)
+        assert search_client.stats.timeouts == 1
+
+        # The late reply must not be taken for the next request
+        backend.delay = 0
+        await asyncio.sleep(0.6)
+        assert await search_client.search("fake_string") == \
+            "STRING NOT FOUND\n"
+
+
+@pytest.mark.asyncio
+async def test_search_client_reconnects(backend, query):
+    """Test case to check a dropped connection is retried on a new one"""
+    backend.drop_requests = 1
+    async with SearchClient("127.0.0.1", backend.port) as search_client:
+        assert await search_client.search(query) == "STRING EXISTS\n"
+
+    assert search_client.stats.reconnects == 1
+    assert backend.connections == 2
+
+
+@pytest.mark.asyncio
+async def test_search_client_gives_up(backend, query):
+    """Test case to check retries are bounded"""
+    backend.drop_requests = 2
+    async with SearchClient("127.0.0.1", backend.port,
+                            retries=1) as search_client:
+        with pytest.raises(ConnectionError):
+            await search_client.search(query)
+
+    assert search_client.stats.errors == 1
+
+
+def test_sync_search_client(backend, query):
+    """Test case to check the blocking facade"""
+    with SyncSearchClient(host="127.0.0.1",
+                          port=backend.port) as search_client:
+        assert search_client.search(query) == "STRING EXISTS\n"
+        assert search_client.search_many([query, "fake_string"]) == \
+            ["STRING EXISTS\n", "STRING NOT FOUND\n"]
+        assert search_client.stats.requests == 2
+
+    assert backend.connections == 1
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,56 @@
+"""Pytest module for the compact corpus module"""
+
+import pytest
+from compact_corpus import CompactCorpus
+
+
+@pytest.fixture
+def lines():
+    """Sample stripped corpus lines, including a duplicate"""
+    return ["6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;",
+            "6;0;1;26;0;7;3;0;", "", "héllo;1;"]
+
+
+@pytest.fixture
+def corpus(lines):
+    """Compact corpus built from the sample lines"""
+    return CompactCorpus.from_lines(lines)
+
+
+def test_exact_lookup(corpus):
+    """Test case to check existing and missing lines"""
+    assert "25;0;23;16;0;19;3;0;" in corpus
+    assert "héllo;1;" in corpus
+    assert "6;0;1;26;0;7;3" not in corpus
+    assert "fake_string" not in corpus
+
+
+def test_find_returns_first_occurrence(corpus):
+    """Test case to check duplicates resolve to the first line number"""
+    assert corpus.find("6;0;1;26;0;7;3;0;") == 0
+    assert corpus.find("fake_string") == -1
+
+
+def test_iteration_and_retrieval(corpus, lines):
+    """Test case to check lines come back unchanged and in order"""
+    assert len(corpus) == len(lines)
+    assert list(corpus) == lines
+    assert corpus[1] == "25;0;23;16;0;19;3;0;"
+    assert corpus[-1] == "héllo;1;"
+    with pytest.raises(IndexError):
+        corpus[len(lines)]
+
+
+def test_from_file(tmp_path, lines):
+    """Test case to check building from a file strips each line"""
+    path = tmp_path / "corpus.txt"
+    path.write_text("\n".join(f"{line}  " for line in lines) + "\n",
+                    encoding="utf8")
+
+    corpus = CompactCorpus.from_file(str(path))
+    assert list(corpus) == lines
+    assert corpus.memory_usage() > 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,96 @@
+"""Pytest module for the corpus module"""
+
+import os
+import gzip
+import lzma
+import pytest
+import corpus
+from corpus import (iter_corpus_lines, read_block_index, scan_corpus,
+                    write_block_compressed)
+
+
+@pytest.fixture
+def lines():
+    """Sample corpus lines, enough for several small blocks"""
+    return [f"{number};0;1;26;0;7;3;0;" for number in range(500)]
+
+
+@pytest.mark.parametrize("extension", [".gz", ".bz2", ".xz"])
+def test_block_compressed_round_trip(tmp_path, lines, extension):
+    """Test case to check every codec reads back the lines in order"""
+    path = str(tmp_path / f"corpus.txt{extension}")
+    blocks = write_block_compressed(lines, path, block_size=1024)
+
+    assert blocks > 1
+    assert len(read_block_index(path)) == blocks
+    assert list(iter_corpus_lines(path)) == lines
+    assert scan_corpus(path, "499;0;1;26;0;7;3;0;")
+    assert not scan_corpus(path, "fake_string")
+
+
+def test_blocks_are_multi_member_files(tmp_path, lines):
+    """Test case to check block files stay readable by standard tools"""
+    gz_path = str(tmp_path / "corpus.txt.gz")
+    xz_path = str(tmp_path / "corpus.txt.xz")
+    write_block_compressed(lines, gz_path, block_size=1024)
+    write_block_compressed(lines, xz_path, block_size=1024)
+
+    expected = "".join(line + "\n" for line in lines)
+    with gzip.open(gz_path, "rt", encoding="utf8") as file:
+        assert file.read() == expected
+    with lzma.open(xz_path, "rt", encoding="utf8") as file:
+        assert file.read() == expected
+
+
+def test_stream_without_sidecar(tmp_path, lines):
+    """Test case to check a plain compressed file is streamed"""
+    path = str(tmp_path / "corpus.txt.gz")
+    with gzip.open(path, "wt", encoding="utf8") as file:
+        file.writelines(f" {line} \n" for line in lines)
+
+    assert read_block_index(path) is None
+    assert list(iter_corpus_lines(path)) == lines
+
+
+def test_stale_sidecar_ignored(tmp_path, lines):
+    """Test case to check a sidecar of an older file is not trusted"""
+    path = str(tmp_path / "corpus.txt.gz")
+    write_block_compressed(lines, path, block_size=1024)
+    with gzip.open(path, "wt", encoding="utf8") as file:
+        file.writelines(line + "\n" for line in lines[:10])
+    # Make sure the sidecar is older even on coarse mtime filesystems
+    stat = os.stat(path + corpus.BLOCK_INDEX_SUFFIX)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    assert read_block_index(path) is None
+    assert list(iter_corpus_lines(path)) == lines[:10]
+
+
+def test_early_stop_leaves_no_work(tmp_path, lines, mocker):
+    """Test case to check a reader that stops early does not hang"""
+    mocker.patch.object(corpus, "DECOMPRESS_WORKERS", 2)
+    path = str(tmp_path / "corpus.txt.bz2")
+    write_block_compressed(lines, path, block_size=256)
+
+    assert scan_corpus(path, "0;0;1;26;0;7;3;0;")
+    reader = iter_corpus_lines(path)
+    assert next(reader) == lines[0]
+    reader.close()
+
+
+def test_write_requires_codec(tmp_path, lines):
+    """Test case to check writing a plain text path is refused"""
+    with pytest.raises(ValueError):
+        write_block_compressed(lines, str(tmp_path / "corpus.txt"))
+
+
+def test_plain_text_lines(tmp_path):
+    """Test case to check plain text lines are stripped"""
+    path = tmp_path / "corpus.txt"
+    path.write_text("a;b;\n  c;d;  \n", encoding="utf8")
+
+    assert list(iter_corpus_lines(str(path))) == ["a;b;", "c;d;"]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,88 @@
+"""Pytest module for the corpus tail module"""
+
+import os
+import pytest
+from corpus_tail import CorpusTail
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Corpus file ending with a line still being written"""
+    path = tmp_path / "corpus.txt"
+    path.write_bytes(b"6;0;1;26;0;7;3;0;\n1;0;0;0;\n2;0")
+    return path
+
+
+def append(path, data):
+    """Append raw bytes to a file"""
+    with open(path, "ab") as file:
+        file.write(data)
+
+
+def test_starts_after_last_complete_line(corpus):
+    """Test case to check the partial last line is left for the tail"""
+    tail = CorpusTail.at_end(str(corpus))
+
+    assert tail.offset == len(b"6;0;1;26;0;7;3;0;\n1;0;0;0;\n")
+    assert tail.base_lines == 2
+    assert tail.poll() == 0
+    assert len(tail) == 0
+
+
+def test_poll_indexes_complete_appended_lines(corpus):
+    """Test case to check only complete lines are indexed"""
+    tail = CorpusTail.at_end(str(corpus))
+
+    append(corpus, b";0;\n3;0;\n4;")
+    assert tail.poll() == 2
+    assert "2;0;0;" in tail and "3;0;" in tail
+    assert "4;" not in tail
+
+    append(corpus, b"0;\n3;0;\n")
+    assert tail.poll() == 2
+    assert tail.appended == ["2;0;0;", "3;0;", "4;0;", "3;0;"]
+
+
+def test_count_and_locate(corpus):
+    """Test case to check counts and corpus wide line numbers"""
+    tail = CorpusTail.at_end(str(corpus))
+    append(corpus, b";0;\n3;0;\n3;0;\n")
+    tail.poll()
+
+    assert tail.count("3;0;") == 2
+    assert tail.locate("3;0;", 10) == ([4, 5], 2)
+    assert tail.locate("3;0;", 1) == ([4], 2)
+    assert tail.locate("fake_string", 10) == ([], 0)
+
+
+def test_truncation_needs_rebuild(corpus):
+    """Test case to check a shrunk file is reported"""
+    tail = CorpusTail.at_end(str(corpus))
+    corpus.write_bytes(b"1;0;0;0;\n")
+
+    assert tail.poll() is None
+
+
+def test_replacement_needs_rebuild(corpus, tmp_path):
+    """Test case to check a file moved over the corpus is reported"""
+    tail = CorpusTail.at_end(str(corpus))
+    replacement = tmp_path / "new.txt"
+    replacement.write_bytes(corpus.read_bytes() + b"9;\n")
+    os.replace(replacement, corpus)
+
+    assert tail.poll() is None
+
+
+def test_rewrite_in_place_needs_rebuild(corpus):
+    """Test case to check changed indexed bytes are reported"""
+    tail = CorpusTail.at_end(str(corpus))
+    with open(corpus, "r+b") as file:
+        file.seek(20)
+        file.write(b"9")
+    append(corpus, b"\n")
+
+    assert tail.poll() is None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,135 @@
+"""Pytest module for the fair scheduler module"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fair_scheduler import FairScheduler
+
+
+@pytest.fixture
+def executor():
+    """Thread pool shared by the scheduler under test"""
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_result_and_raises(executor):
+    """Test case to check results and exceptions reach the caller"""
+    scheduler = FairScheduler(executor, 4)
+
+    assert await scheduler.submit("a", lambda value: value * 2, 21) == 42
+    with pytest.raises(ZeroDivisionError):
+        await scheduler.submit("a", lambda: 1 / 0)
+    assert scheduler.client_stats("a").jobs == 2
+
+
+@pytest.mark.asyncio
+async def test_clients_take_turns(executor):
+    """Test case to check a backlog from one client does not starve another"""
+    scheduler = FairScheduler(executor, 1)
+    order = []
+    release = threading.Event()
+
+    def job(name):
+        release.wait(5)
+        order.append(name)
+
+    # The heavy client queues five jobs before the light one arrives
+    tasks = [asyncio.create_task(scheduler.submit("heavy", job, f"h{i}"))
+             for i in range(5)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(scheduler.submit("light", job, "l0")))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    # Running h0, then the turn heavy already held, then light
+    assert order[:3] == ["h0", "h1", "l0"]
+
+
+@pytest.mark.asyncio
+async def test_client_inflight_cap(executor):
+    """Test case to check a client never runs more than its cap"""
+    scheduler = FairScheduler(executor, 4, client_inflight=1)
+    release = threading.Event()
+
+    tasks = [asyncio.create_task(scheduler.submit("a", release.wait, 5))
+             for _ in range(3)]
+    other = asyncio.create_task(scheduler.submit("b", release.wait, 5))
+    await asyncio.sleep(0.05)
+
+    assert scheduler.running() == 2
+    assert scheduler.queued() == 2
+    assert scheduler.max_client_queue() == 2
+
+    release.set()
+    await asyncio.gather(*tasks, other)
+    assert scheduler.running() == 0
+
+
+@pytest.mark.asyncio
+async def test_set_limits_starts_queued_jobs(executor):
+    """Test case to check a raised cap lets queued jobs start"""
+    scheduler = FairScheduler(executor, 4, client_inflight=1)
+    release = threading.Event()
+
+    tasks = [asyncio.create_task(scheduler.submit("a", release.wait, 5))
+             for _ in range(3)]
+    await asyncio.sleep(0.05)
+    assert scheduler.running() == 1
+
+    scheduler.set_limits(3, 0)
+    assert scheduler.running() == 3
+    assert scheduler.queued() == 0
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_withdraws_job(executor):
+    """Test case to check a closed connection leaves no queued work"""
+    scheduler = FairScheduler(executor, 1)
+    release = threading.Event()
+    ran = []
+
+    running = asyncio.create_task(scheduler.submit("a", release.wait, 5))
+    waiting = asyncio.create_task(scheduler.submit("b", ran.append, "b"))
+    await asyncio.sleep(0.05)
+    waiting.cancel()
+    await asyncio.sleep(0)
+
+    assert scheduler.queued() == 0
+    assert scheduler.client_stats("b").queued == 0
+    release.set()
+    await running
+    assert ran == []
+
+
+@pytest.mark.asyncio
+async def test_backlog_callback_and_forget(executor):
+    """Test case to check noisy clients are reported and stats dropped"""
+    reported = []
+    scheduler = FairScheduler(executor, 1, backlog=3,
+                              on_backlog=lambda client, stats:
+                              reported.append((client, stats.queued)))
+    release = threading.Event()
+
+    tasks = [asyncio.create_task(scheduler.submit("noisy", release.wait, 5))
+             for _ in range(4)]
+    await asyncio.sleep(0.05)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert reported == [("noisy", 3)]
+    stats = scheduler.forget("noisy")
+    assert stats.jobs == 4 and stats.max_queued == 3
+    assert stats.mean_wait() >= 0
+    assert scheduler.client_stats("noisy") is None
+
+
+if __name__ == "__main__":
+    pytest.main()
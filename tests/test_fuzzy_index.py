@@ -0,0 +1,48 @@
+"""Pytest module for the fuzzy index module"""
+
+import pytest
+from fuzzy_index import FuzzyIndex, bounded_levenshtein, fuzzy_scan
+
+
+@pytest.fixture
+def lines():
+    """Sample corpus lines"""
+    return ["6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;", "6;0;1;26;0;7;3;1;",
+            "6;0;1;2;0;7;3;0;", "1;2;", "6;0;1;26;0;7;3;0;"]
+
+
+def test_bounded_levenshtein():
+    """Test case to check distances and the early cut off"""
+    assert bounded_levenshtein("kitten", "sitting", 3) == 3
+    assert bounded_levenshtein("kitten", "sitting", 2) == 3
+    assert bounded_levenshtein("abc", "abc", 0) == 0
+    assert bounded_levenshtein("abc", "abcdef", 2) == 3
+
+
+@pytest.mark.parametrize("query, distance", [
+    ("6;0;1;26;0;7;3;0;", 0),
+    ("6;0;1;26;0;7;3;0;", 1),
+    ("6;0;1;26;0;7;3;0", 2),
+    ("6;0;1;2;0;7;3;", 2),
+    ("1;2", 1),
+])
+def test_index_matches_brute_force(lines, query, distance):
+    """Test case to check the index finds exactly what a scan finds"""
+    index = FuzzyIndex(lines)
+    assert sorted(index.search(query, distance, 100)) == \
+        sorted(fuzzy_scan(lines, query, distance, 100))
+
+
+def test_search_orders_and_limits(lines):
+    """Test case to check closest lines come first, then corpus order"""
+    index = FuzzyIndex(lines)
+
+    matches = index.search("6;0;1;26;0;7;3;0;", 1, 100)
+    assert matches == [("6;0;1;26;0;7;3;0;", 0), ("6;0;1;26;0;7;3;1;", 1),
+                       ("6;0;1;2;0;7;3;0;", 1)]
+    assert index.search("6;0;1;26;0;7;3;0;", 1, 1) == [
+        ("6;0;1;26;0;7;3;0;", 0)]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,45 @@
+"""Pytest module for the logging configuration"""
+
+import queue
+import logging
+import pytest
+from config.logging_config import DroppingQueueHandler, QueryLogSampler
+
+
+@pytest.fixture
+def log_record():
+    """Sample log record"""
+    return logging.LogRecord("test", logging.DEBUG, __file__, 1,
+                             "Query: %s", ("6;0;1;26;0;7;3;0;",), None)
+
+
+def test_queue_handler_drops_when_full(log_record):
+    """Test case to check records are dropped instead of blocking"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+
+    for _ in range(5):
+        handler.handle(log_record)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_sampler_rate_limit(mocker):
+    """Test case to check the per second rate limit"""
+    mocker.patch("time.monotonic", return_value=100.0)
+    sampler = QueryLogSampler(sample_rate=1.0, rate_limit=3)
+
+    decisions = [sampler.should_log() for _ in range(5)]
+
+    assert decisions == [True, True, True, False, False]
+    assert sampler.suppressed == 2
+
+
+def test_sampler_disabled():
+    """Test case to check a zero sample rate suppresses every record"""
+    sampler = QueryLogSampler(sample_rate=0.0, rate_limit=0)
+    assert not any(sampler.should_log() for _ in range(10))
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,76 @@
+"""Pytest module for the minimal perfect hash index"""
+
+import os
+import pytest
+from mph_index import MinimalPerfectHashIndex
+
+
+@pytest.fixture
+def lines():
+    """Sample corpus lines with a duplicate"""
+    content = [f"{i};0;{i % 7};26;0;7;3;0;" for i in range(500)]
+    return content + ["6;0;1;26;0;7;3;0;", "6;0;1;26;0;7;3;0;"]
+
+
+def test_build_and_lookup(lines):
+    """Test case to check every key is found and others are rejected"""
+    index = MinimalPerfectHashIndex.build(lines)
+
+    assert len(index) == len(set(lines))
+    assert all(line in index for line in lines)
+    assert "fake_string" not in index
+    assert "6;0;1;26;0;7;3;" not in index
+
+
+def test_slots_are_minimal(lines):
+    """Test case to check keys map one to one onto 0..n-1"""
+    index = MinimalPerfectHashIndex.build(lines)
+
+    found = sorted(index.find(line) for line in set(lines))
+    assert found == list(range(len(index)))
+    assert {index[slot] for slot in found} == set(lines)
+
+
+def test_save_and_load(tmp_path, lines):
+    """Test case to check the mmap loaded index answers the same"""
+    index_path = str(tmp_path / "corpus.mph")
+    MinimalPerfectHashIndex.build(lines).save(index_path)
+
+    loaded = MinimalPerfectHashIndex.load(index_path)
+    assert all(line in loaded for line in lines)
+    assert "fake_string" not in loaded
+    assert loaded.bits_per_key() < 16
+
+
+def test_load_or_build_rebuilds_stale_index(tmp_path, lines):
+    """Test case to check a corpus newer than the index is rebuilt"""
+    corpus_path = tmp_path / "corpus.txt"
+    index_path = str(tmp_path / "corpus.mph")
+    corpus_path.write_text("\n".join(lines) + "\n", encoding="utf8")
+
+    assert "6;0;1;26;0;7;3;0;" in MinimalPerfectHashIndex.load_or_build(
+        index_path, str(corpus_path))
+
+    corpus_path.write_text("new;line;\n", encoding="utf8")
+    stat = os.stat(index_path)
+    os.utime(corpus_path, (stat.st_atime + 10, stat.st_mtime + 10))
+
+    rebuilt = MinimalPerfectHashIndex.load_or_build(index_path,
+                                                    str(corpus_path))
+    assert "new;line;" in rebuilt
+    assert "6;0;1;26;0;7;3;0;" not in rebuilt
+
+
+if __name__ == "__main__":
+    pytest.main()
+
+
+def test_empty_index(tmp_path):
+    """Test case to check an empty key set builds an index finding nothing"""
+    index_path = str(tmp_path / "empty.mph")
+    MinimalPerfectHashIndex.build([]).save(index_path)
+
+    loaded = MinimalPerfectHashIndex.load(index_path)
+    assert len(loaded) == 0
+    assert loaded.find("fake_string") == -1
+    assert "fake_string" not in loaded
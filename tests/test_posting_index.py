@@ -0,0 +1,50 @@
+"""Pytest module for the posting index module"""
+
+import pytest
+from compact_corpus import CompactCorpus
+from posting_index import PostingIndex, locate_scan
+
+
+@pytest.fixture
+def lines():
+    """Sample corpus lines, one of them repeated three times"""
+    return ["6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;",
+            "6;0;1;26;0;7;3;0;", "1;0;0;0;", "6;0;1;26;0;7;3;0;"]
+
+
+@pytest.fixture(params=["list", "compact"])
+def index(request, lines):
+    """Posting index over a plain list and over a compact corpus"""
+    if request.param == "compact":
+        return PostingIndex(CompactCorpus.from_lines(lines))
+    return PostingIndex(lines)
+
+
+def test_locate_every_occurrence(index):
+    """Test case to check 1-based numbers of all occurrences"""
+    assert index.locate("6;0;1;26;0;7;3;0;", 10) == ([1, 3, 5], 3)
+    assert index.locate("1;0;0;0;", 10) == ([4], 1)
+    assert index.locate("fake_string", 10) == ([], 0)
+
+
+def test_locate_limit_keeps_count(index):
+    """Test case to check the limit cuts the numbers but not the count"""
+    assert index.locate("6;0;1;26;0;7;3;0;", 2) == ([1, 3], 3)
+    assert index.locate("6;0;1;26;0;7;3;0;", 1) == ([1], 3)
+
+
+def test_count(index):
+    """Test case to check occurrence counts"""
+    assert index.count("6;0;1;26;0;7;3;0;") == 3
+    assert index.count("25;0;23;16;0;19;3;0;") == 1
+    assert index.count("fake_string") == 0
+
+
+def test_locate_scan_matches_index(lines, index):
+    """Test case to check the streaming fallback gives the same answer"""
+    for query in set(lines) | {"fake_string"}:
+        assert locate_scan(iter(lines), query, 2) == index.locate(query, 2)
+
+
+if __name__ == "__main__":
+    pytest.main()
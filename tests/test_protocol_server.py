@@ -0,0 +1,83 @@
+"""Pytest module for the asyncio.Protocol server implementation"""
+
+import pytest
+import asyncio
+from protocol_server import SearchProtocol
+
+
+@pytest.fixture
+def corpus():
+    """Sample corpus served by the fake answer function"""
+    return {"6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;"}
+
+
+@pytest.mark.asyncio
+async def test_protocol_answers_queries(corpus):
+    """Test case to check queries are answered on one connection"""
+
+    async def answer(query):
+        return "STRING EXISTS\n" if query in corpus else "STRING NOT FOUND\n"
+
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: SearchProtocol(answer),
+                                      "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"6;0;1;26;0;7;3;0;\x00\x00")
+        assert await reader.read(1024) == b"STRING EXISTS\n"
+
+        writer.write(b"fake_string\n")
+        assert await reader.read(1024) == b"STRING NOT FOUND\n"
+
+        writer.close()
+        await writer.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_protocol_rejects_when_not_admitted(mocker):
+    """Test case to check a refused connection gets BUSY and is closed"""
+    answer = mocker.AsyncMock()
+    release = mocker.MagicMock()
+
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(
+        lambda: SearchProtocol(answer, admit=lambda: False, release=release),
+        "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        assert await reader.read(1024) == b"BUSY\n"
+        assert await reader.read(1024) == b""
+        writer.close()
+
+    answer.assert_not_called()
+    release.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_protocol_closes_after_reply_when_asked(corpus):
+    """Test case to check close_after_reply hangs up after the answer"""
+
+    async def answer(query):
+        return "STRING EXISTS\n" if query in corpus else "STRING NOT FOUND\n"
+
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(
+        lambda: SearchProtocol(answer, close_after_reply=lambda: True),
+        "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"6;0;1;26;0;7;3;0;")
+        assert await reader.read(1024) == b"STRING EXISTS\n"
+        assert await reader.read(1024) == b""
+        writer.close()
+        await writer.wait_closed()
+
+
+if __name__ == "__main__":
+    pytest.main()
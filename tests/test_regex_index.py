@@ -0,0 +1,53 @@
+"""Pytest module for the regex index module"""
+
+import re
+import pytest
+from regex_index import RegexIndex, compile_pattern, regex_scan
+
+
+@pytest.fixture
+def lines():
+    """Sample corpus lines"""
+    return ["6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;", "6;0;4;3;0;",
+            "6;0;1;26;0;7;3;1;", "12;13;12;13;"]
+
+
+@pytest.mark.parametrize("pattern, grams", [
+    (r"^6;0;.*;3;0;$", ("3;0", "6;0", ";0;", ";3;")),
+    (r"(?:12;13)+", ("12;", "2;1", ";13")),
+    (r"a|bcd", ()),
+    (r"(?i)abcd", ()),
+    (r"ab", ()),
+])
+def test_required_trigrams(pattern, grams):
+    """Test case to check the literal trigrams every match must contain"""
+    assert compile_pattern(pattern)[1] == grams
+
+
+@pytest.mark.parametrize("pattern", [
+    r"^6;0;.*;3;0;$", r"(?:12;13)+", r"^6;0;\d;", r"3;[01];$", r"nothing",
+])
+def test_index_matches_scan(lines, pattern):
+    """Test case to check the prefilter never drops a matching line"""
+    index = RegexIndex(lines)
+    assert index.search(pattern, 100, 1000, 1.0) == \
+        regex_scan(lines, pattern, 100, 1000, 1.0)
+
+
+def test_candidate_budget(lines):
+    """Test case to check a search stops once the budget is spent"""
+    index = RegexIndex(lines)
+
+    matches, complete = index.search(r"\d", 100, 2, 1.0)
+    assert matches == lines[:2]
+    assert not complete
+
+
+def test_invalid_pattern(lines):
+    """Test case to check invalid patterns raise re.error"""
+    with pytest.raises(re.error):
+        RegexIndex(lines).search("(", 10, 10, 1.0)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,155 @@
+"""Pytest module for the request coalescing module"""
+
+import asyncio
+import pytest
+from request_coalescing import ScanBatcher, SingleFlight
+
+
+@pytest.fixture
+def slow_search():
+    """Async search that records every call and takes a moment"""
+    calls = []
+
+    async def search(query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return f"{query} EXISTS\n"
+
+    search.calls = calls
+    return search
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_flight(slow_search):
+    """Test case to check concurrent identical keys run the call once"""
+    single_flight = SingleFlight()
+
+    results = await asyncio.gather(
+        *(single_flight.run("q", slow_search, "q") for _ in range(5)))
+
+    assert results == ["q EXISTS\n"] * 5
+    assert slow_search.calls == ["q"]
+    assert (single_flight.leaders, single_flight.followers) == (1, 4)
+    assert single_flight.ratio() == 0.8
+    assert single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_distinct_and_later_calls_run_again(slow_search):
+    """Test case to check only overlapping calls with one key coalesce"""
+    single_flight = SingleFlight()
+
+    await asyncio.gather(single_flight.run((1, "a"), slow_search, "a"),
+                         single_flight.run((2, "a"), slow_search, "a"),
+                         single_flight.run((1, "b"), slow_search, "b"))
+    await single_flight.run((1, "a"), slow_search, "a")
+
+    assert slow_search.calls == ["a", "a", "b", "a"]
+    assert single_flight.followers == 0
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_caller():
+    """Test case to check an exception is raised to all waiters"""
+    single_flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise OSError("disk gone")
+
+    results = await asyncio.gather(
+        *(single_flight.run("q", failing) for _ in range(3)),
+        return_exceptions=True)
+
+    assert all(isinstance(result, OSError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_keeps_flight(slow_search):
+    """Test case to check followers still get an answer"""
+    single_flight = SingleFlight()
+
+    leader = asyncio.create_task(single_flight.run("q", slow_search, "q"))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(single_flight.run("q", slow_search, "q"))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "q EXISTS\n"
+    assert slow_search.calls == ["q"]
+
+
+@pytest.fixture
+def corpus_lines():
+    """Corpus lines with a counter of the passes made over them"""
+    lines = ["6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;", "1;0;0;0;"]
+    passes = []
+
+    def open_pass():
+        passes.append(1)
+        return iter(lines)
+
+    open_pass.passes = passes
+    return open_pass
+
+
+async def run_in_thread(function, *args):
+    """Runner handing the scan to the default executor"""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, function, *args)
+
+
+@pytest.mark.asyncio
+async def test_batch_answers_lookups_in_one_pass(corpus_lines):
+    """Test case to check lookups within the window share one scan"""
+    batcher = ScanBatcher(corpus_lines, run_in_thread, 0.01, 100)
+
+    results = await asyncio.gather(
+        batcher.contains("1;0;0;0;"), batcher.contains("fake_string"),
+        batcher.contains("6;0;1;26;0;7;3;0;"), batcher.contains("1;0;0;0;"))
+
+    assert results == [True, False, True, True]
+    assert corpus_lines.passes == [1]
+    assert (batcher.batches, batcher.lookups) == (1, 3)
+
+
+@pytest.mark.asyncio
+async def test_full_batch_does_not_wait_for_window(corpus_lines):
+    """Test case to check a full batch is scanned straight away"""
+    batcher = ScanBatcher(corpus_lines, run_in_thread, 60, 2)
+
+    results = await asyncio.wait_for(asyncio.gather(
+        batcher.contains("1;0;0;0;"), batcher.contains("fake_string")), 1)
+
+    assert results == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_set_limits_flushes_full_batch(corpus_lines):
+    """Test case to check a smaller batch size scans waiting lookups"""
+    batcher = ScanBatcher(corpus_lines, run_in_thread, 60, 100)
+    lookups = [asyncio.ensure_future(batcher.contains(query))
+               for query in ("1;0;0;0;", "fake_string")]
+    await asyncio.sleep(0)
+
+    batcher.set_limits(60, 2)
+    assert await asyncio.wait_for(asyncio.gather(*lookups), 1) == \
+        [True, False]
+
+
+@pytest.mark.asyncio
+async def test_failed_scan_reaches_every_lookup():
+    """Test case to check a read error is raised to all waiters"""
+    def broken_lines():
+        raise OSError("disk gone")
+
+    batcher = ScanBatcher(broken_lines, run_in_thread, 0.01, 100)
+    results = await asyncio.gather(batcher.contains("a"),
+                                   batcher.contains("b"),
+                                   return_exceptions=True)
+
+    assert all(isinstance(result, OSError) for result in results)
+
+
+if __name__ == "__main__":
+    pytest.main()
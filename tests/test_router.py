@@ -0,0 +1,314 @@
+"""Pytest module for the router module"""
+
+import time
+import asyncio
+import contextlib
+import pytest
+import metrics
+from binary_protocol import MAGIC, handle_binary_connection
+from client import SearchClient
+from router import (Backend, Router, hash_partition, map_locate,
+                    merge_matches, parse_backends, range_partition,
+                    read_line_map)
+from shard_corpus import range_splits, shard_file
+
+
+class FakeBackend:
+    """Binary protocol server answering for one partition
+
+    Lookups, COUNT and LOCATE are answered from lines, FUZZY returns
+    every line starting with the query at distance 0. queries records
+    what it was asked, delay slows every answer down.
+    """
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.queries = []
+        self.delay = 0
+        self.server = None
+        self.port = None
+
+    async def resolve(self, query):
+        await asyncio.sleep(self.delay)
+        if query == "READY":
+            return "READY\n"
+        self.queries.append(query)
+        command, _, argument = query.partition(" ")
+        if command == "COUNT":
+            return f"COUNT {self.lines.count(argument)}\n"
+        if command == "LOCATE":
+            numbers = [number for number, line in enumerate(self.lines, 1)
+                       if line == argument]
+            if not numbers:
+                return "STRING NOT FOUND\n"
+            return (f"MATCHES {len(numbers)}\n"
+                    + "".join(f"{number}\n" for number in numbers))
+        if command == "FUZZY":
+            prefix = argument.partition(" ")[2]
+            matches = [line for line in self.lines if line.startswith(prefix)]
+            if not matches:
+                return "STRING NOT FOUND\n"
+            return (f"MATCHES {len(matches)}\n"
+                    + "".join(f"0 {line}\n" for line in matches))
+        if query in self.lines:
+            return "STRING EXISTS\n"
+        return "STRING NOT FOUND\n"
+
+    async def handle(self, reader, writer):
+        await reader.readexactly(len(MAGIC))
+        await handle_binary_connection(reader, writer, self.resolve)
+        writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+@contextlib.asynccontextmanager
+async def running_router(shards, splits=None, replicas=1, **options):
+    """Router over fake backends, replicas of each shard's lines"""
+    fakes = [[FakeBackend(lines) for _ in range(replicas)]
+             for lines in shards]
+    for fake in (fake for group in fakes for fake in group):
+        await fake.start()
+    router = Router([[Backend("127.0.0.1", fake.port, timeout=1.0)
+                      for fake in group] for group in fakes],
+                    splits, health_interval=60, **options)
+    await router.start()
+    try:
+        yield router, fakes
+    finally:
+        await router.close()
+        for fake in (fake for group in fakes for fake in group):
+            await fake.stop()
+
+
+@pytest.fixture(autouse=True)
+def no_ssl(mocker):
+    """Fake backends speak plain text"""
+    mocker.patch("client.use_ssl", False)
+
+
+@pytest.fixture
+def lines():
+    """Sample corpus lines, one of them repeated"""
+    return [f"{number};0;1;26;0;7;3;0;" for number in range(30)] + \
+        ["7;0;1;26;0;7;3;0;"]
+
+
+def hash_shards(lines, partitions):
+    """Lines of each partition under hash partitioning"""
+    shards = [[] for _ in range(partitions)]
+    for line in lines:
+        shards[hash_partition(line, partitions)].append(line)
+    return shards
+
+
+def test_partition_functions():
+    """Test case to check both partitioning functions"""
+    assert hash_partition("6;0;1;26;0;7;3;0;", 3) == \
+        hash_partition("6;0;1;26;0;7;3;0;", 3)
+    assert {hash_partition(str(i), 3) for i in range(100)} == {0, 1, 2}
+
+    splits = ["c", "m"]
+    assert range_partition("a", splits) == 0
+    assert range_partition("c", splits) == 1
+    assert range_partition("z", splits) == 2
+
+
+def test_parse_backends():
+    """Test case to check partitions and replicas are parsed"""
+    assert parse_backends("127.0.0.1:1|127.0.0.1:2,localhost:3") == \
+        [[("127.0.0.1", 1), ("127.0.0.1", 2)], [("localhost", 3)]]
+    with pytest.raises(ValueError):
+        parse_backends("127.0.0.1")
+
+
+def test_merge_matches():
+    """Test case to check MATCHES replies are merged and capped"""
+    merged = merge_matches("FUZZY", ["MATCHES 1\n2 b\n",
+                                     "MATCHES 2\n0 a\n1 c\n",
+                                     "STRING NOT FOUND\n"], 10)
+    assert merged == "MATCHES 3\n0 a\n1 c\n2 b\n"
+
+    assert merge_matches("REGEX", ["MATCHES 2\na\nb\n", "MATCHES 1\nc\n"],
+                         2) == "MATCHES 2 PARTIAL\na\nb\n"
+    assert merge_matches("REGEX", ["STRING NOT FOUND\n"] * 2, 5) == \
+        "STRING NOT FOUND\n"
+    assert merge_matches("REGEX", ["MATCHES 1\na\n", "ERROR\n"], 5) == \
+        "ERROR\n"
+    assert merge_matches("REGEX", ["BUSY\n", "MATCHES 1\na\n"], 5) == \
+        "BUSY\n"
+
+
+@pytest.mark.asyncio
+async def test_hash_routing(lines):
+    """Test case to check lookups reach only the partition of their line"""
+    shards = hash_shards(lines, 3)
+    async with running_router(shards) as (router, fakes):
+        for line in lines:
+            assert await router.resolve(line) == "STRING EXISTS\n"
+        assert await router.resolve("fake_string") == "STRING NOT FOUND\n"
+        assert await router.resolve("COUNT 7;0;1;26;0;7;3;0;") == \
+            "COUNT 2\n"
+
+        for number, group in enumerate(fakes):
+            assert all(hash_partition(query.replace("COUNT ", ""), 3)
+                       == number for query in group[0].queries)
+
+
+@pytest.mark.asyncio
+async def test_range_routing(tmp_path, lines):
+    """Test case to check range partitions from the shard tool"""
+    path = tmp_path / "corpus.txt"
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf8")
+    splits = range_splits(str(path), 3)
+    counts = shard_file(str(path), 3, splits)
+    assert sum(counts) == len(lines)
+
+    shards = [(tmp_path / f"corpus.txt.shard{number}")
+              .read_text(encoding="utf8").splitlines()
+              for number in range(3)]
+    # Each shard holds one contiguous key range
+    assert max(shards[0]) < min(shards[1]) <= max(shards[1]) < min(shards[2])
+
+    async with running_router(shards, splits) as (router, _):
+        for line in lines:
+            assert await router.resolve(line) == "STRING EXISTS\n"
+        assert await router.resolve("fake_string") == "STRING NOT FOUND\n"
+
+
+def test_map_locate():
+    """Test case to check shard line numbers become corpus ones"""
+    line_map = [2, 5, 9]
+    assert map_locate("MATCHES 2\n1\n3\n", line_map) == "MATCHES 2\n2\n9\n"
+    assert map_locate("MATCHES 1 PARTIAL\n2\n", line_map) == \
+        "MATCHES 1 PARTIAL\n5\n"
+    assert map_locate("STRING NOT FOUND\n", line_map) == \
+        "STRING NOT FOUND\n"
+    assert map_locate("BUSY\n", line_map) == "BUSY\n"
+    # A line appended to the shard after it was split
+    assert map_locate("MATCHES 1\n4\n", line_map) == "ERROR\n"
+
+
+@pytest.mark.asyncio
+async def test_locate_gives_corpus_line_numbers(tmp_path, lines):
+    """Test case to check LOCATE through the router matches one server"""
+    path = tmp_path / "corpus.txt"
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf8")
+    shard_file(str(path), 3)
+    shards = [(tmp_path / f"corpus.txt.shard{number}")
+              .read_text(encoding="utf8").splitlines()
+              for number in range(3)]
+    line_maps = [read_line_map(str(tmp_path / f"corpus.txt.shard{number}"
+                                   ".lines"))
+                 for number in range(3)]
+
+    async with running_router(shards, line_maps=line_maps) as (router, _):
+        for line in (lines[7], lines[20]):
+            expected = [number for number, corpus_line
+                        in enumerate(lines, 1) if corpus_line == line]
+            assert await router.resolve(f"LOCATE {line}") == \
+                f"MATCHES {len(expected)}\n" + \
+                "".join(f"{number}\n" for number in expected)
+        assert await router.resolve("LOCATE fake_string") == \
+            "STRING NOT FOUND\n"
+
+    # Shard line numbers are never passed off as corpus ones
+    async with running_router(shards) as (router, _):
+        assert await router.resolve(f"LOCATE {lines[7]}") == "ERROR\n"
+
+
+@pytest.mark.asyncio
+async def test_fan_out_merges(lines):
+    """Test case to check FUZZY replies of every partition are merged"""
+    async with running_router(hash_shards(lines, 3),
+                              max_matches=100) as (router, fakes):
+        response = await router.resolve("FUZZY 0 1")
+        expected = sorted(line for line in lines if line.startswith("1"))
+        assert response.startswith(f"MATCHES {len(expected)}\n")
+        assert sorted(response.splitlines()[1:]) == \
+            [f"0 {line}" for line in expected]
+        assert all(group[0].queries == ["FUZZY 0 1"] for group in fakes)
+
+
+@pytest.mark.asyncio
+async def test_hedged_request(lines):
+    """Test case to check a slow replica is hedged by another one"""
+    metrics.reset()
+    async with running_router([lines], replicas=2,
+                              hedge_delay=0.05) as (router, fakes):
+        start_time = time.perf_counter()
+        # Replicas take turns going first, make the first one slow
+        fakes[0][0].delay, fakes[0][1].delay = 0.5, 0
+        first = await router.resolve(lines[0])
+        fakes[0][0].delay, fakes[0][1].delay = 0, 0.5
+        second = await router.resolve(lines[1])
+        elapsed = time.perf_counter() - start_time
+
+        assert first == second == "STRING EXISTS\n"
+        assert elapsed < 0.5
+        assert metrics.get("hedged_requests") == 2
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_backend_is_avoided(lines):
+    """Test case to check failed replicas are marked and routed around"""
+    async with running_router([lines], replicas=2) as (router, fakes):
+        assert await router.resolve("READY") == "READY\n"
+
+        await fakes[0][0].stop()
+        await router.backends()[0].client.close()
+        await router.check_health()
+        assert [backend.healthy for backend in router.backends()] == \
+            [False, True]
+        # Still ready, the other replica serves the partition
+        assert await router.resolve("READY") == "READY\n"
+
+        for line in lines[:5]:
+            assert await router.resolve(line) == "STRING EXISTS\n"
+        assert len(fakes[0][1].queries) == 5
+
+
+@pytest.mark.asyncio
+async def test_partition_down_is_an_error(lines):
+    """Test case to check a partition without replicas answers ERROR"""
+    async with running_router(hash_shards(lines, 2)) as (router, fakes):
+        for group in fakes:
+            await group[0].stop()
+        for backend in router.backends():
+            await backend.client.close()
+
+        assert await router.resolve(lines[0]) == "ERROR\n"
+        assert await router.resolve("FUZZY 0 1") == "ERROR\n"
+        assert await router.resolve("READY") == "NOT READY\n"
+
+
+@pytest.mark.asyncio
+async def test_router_serves_both_protocols(lines):
+    """Test case to check clients reach the router like a server"""
+    async with running_router(hash_shards(lines, 3)) as (router, _):
+        server = await asyncio.start_server(router.handle_client,
+                                            "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(lines[3].encode())
+            assert await reader.read(1024) == b"STRING EXISTS\n"
+            writer.close()
+
+            async with SearchClient("127.0.0.1", port) as search_client:
+                assert await search_client.search_many(
+                    [lines[4], "fake_string"]) == \
+                    ["STRING EXISTS\n", "STRING NOT FOUND\n"]
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+if __name__ == "__main__":
+    pytest.main()
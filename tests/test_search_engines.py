@@ -0,0 +1,77 @@
+"""Pytest module for the search engines module"""
+
+import pytest
+from search_engines import ENGINES, create_engine, prepare_lines
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    """Sample corpus file with a duplicate and unsorted lines"""
+    path = tmp_path / "corpus.txt"
+    path.write_text("6;0;1;26;0;7;3;0;\n25;0;23;16;0;19;3;0;\n"
+                    "1;0;0;0;\n6;0;1;26;0;7;3;0;\n", encoding="utf8")
+    return str(path)
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_engine_lookup(name, corpus_path):
+    """Test case to check every engine finds lines and rejects others"""
+    engine = create_engine(name, corpus_path)
+
+    assert "6;0;1;26;0;7;3;0;" in engine
+    assert "25;0;23;16;0;19;3;0;" in engine
+    assert "1;0;0;0;" in engine
+    assert "0;0;0;0;" not in engine
+    assert "fake_string" not in engine
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_engine_max_lines(name, corpus_path):
+    """Test case to check engines can hold only the first lines"""
+    engine = create_engine(name, corpus_path, max_lines=2)
+
+    assert "6;0;1;26;0;7;3;0;" in engine
+    assert "25;0;23;16;0;19;3;0;" in engine
+    assert "1;0;0;0;" not in engine
+
+
+@pytest.mark.parametrize("name", sorted(ENGINES))
+def test_engine_empty_corpus(name, tmp_path):
+    """Test case to check engines load and answer an empty corpus"""
+    path = tmp_path / "empty.txt"
+    path.write_text("", encoding="utf8")
+
+    assert "fake_string" not in create_engine(name, str(path))
+
+
+def test_sorting_engines_are_prepared_at_load(corpus_path):
+    """Test case to check bisecting engines get sorted unique lines"""
+    engine = create_engine("binary", corpus_path)
+    assert engine.lines == sorted(set(engine.lines))
+    assert engine.ordered_lines is None
+
+
+def test_ordered_lines_keep_file_order(corpus_path):
+    """Test case to check order keeping engines expose the file lines"""
+    engine = create_engine("compact", corpus_path)
+    assert list(engine.ordered_lines) == [
+        "6;0;1;26;0;7;3;0;", "25;0;23;16;0;19;3;0;", "1;0;0;0;",
+        "6;0;1;26;0;7;3;0;"]
+
+
+def test_prepare_lines_applies_steps_in_order():
+    """Test case to check dedup keeps first occurrences before sorting"""
+    assert prepare_lines(iter(["b", "a", "b"]), ("dedup",)) == ["b", "a"]
+    assert prepare_lines(iter(["b", "a", "b"]),
+                         ("dedup", "sort")) == ["a", "b"]
+    assert prepare_lines(iter(["b", "a"]), ()) == ["b", "a"]
+
+
+def test_unknown_engine(corpus_path):
+    """Test case to check an unknown engine name is rejected"""
+    with pytest.raises(ValueError):
+        create_engine("quantum", corpus_path)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,52 @@
+"""Pytest module for the socket activation module"""
+
+import os
+import socket
+import pytest
+import socket_activation
+from socket_activation import listen_fds, listen_sockets
+
+
+def test_listen_fds_for_this_process(monkeypatch):
+    """Test case to check descriptors announced for this process"""
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid()))
+    monkeypatch.setenv("LISTEN_FDS", "2")
+
+    assert list(listen_fds()) == [3, 4]
+    # The variables are consumed so children do not inherit them
+    assert "LISTEN_PID" not in os.environ
+    assert "LISTEN_FDS" not in os.environ
+
+
+@pytest.mark.parametrize("listen_pid, listen_fds_count",
+                         [("1", "1"), ("", "1"), ("self", "x"), ("", "")])
+def test_listen_fds_ignored(monkeypatch, listen_pid, listen_fds_count):
+    """Test case to check foreign or malformed variables are ignored"""
+    if listen_pid == "self":
+        listen_pid = str(os.getpid())
+    monkeypatch.setenv("LISTEN_PID", listen_pid)
+    monkeypatch.setenv("LISTEN_FDS", listen_fds_count)
+
+    assert list(listen_fds()) == []
+
+
+def test_listen_sockets_adopts_descriptor(monkeypatch):
+    """Test case to check an inherited descriptor becomes a socket"""
+    listener = socket.create_server(("127.0.0.1", 0))
+    address = listener.getsockname()
+    monkeypatch.setattr(socket_activation, "SD_LISTEN_FDS_START",
+                        listener.detach())
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid()))
+    monkeypatch.setenv("LISTEN_FDS", "1")
+
+    sockets = listen_sockets()
+    try:
+        assert len(sockets) == 1
+        assert sockets[0].getsockname() == address
+        assert sockets[0].type == socket.SOCK_STREAM
+    finally:
+        sockets[0].close()
+
+
+if __name__ == "__main__":
+    pytest.main()
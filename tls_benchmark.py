@@ -0,0 +1,83 @@
+"""TLS handshake benchmark: full handshakes versus session resumption.
+
+Starts an in-process TLS server with the same context the async server
+uses and opens short-lived connections to it, first without and then
+with session reuse. Both ends run in this process, so the CPU time per
+connection covers the client and the server side of each handshake.
+"""
+
+import ssl
+import time
+import asyncio
+from async_server import create_ssl_context, certfile
+from client import ResumableSSLContext
+
+
+NUM_CONNECTIONS = 500
+QUERY = b"6;0;1;26;0;7;3;0;"
+
+
+async def handle_connection(reader, writer) -> None:
+    """Reply to a single query and close the connection"""
+    await reader.read(1024)
+    writer.write(b"STRING EXISTS\n")
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_connections(port: int, resume: bool) -> dict:
+    """Open NUM_CONNECTIONS sequential connections and time them"""
+    ssl_context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context.load_verify_locations(cafile=certfile)
+    resumed = 0
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(NUM_CONNECTIONS):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port,
+                                                       ssl=ssl_context)
+        writer.write(QUERY)
+        await writer.drain()
+        await reader.read(1024)
+
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object.session_reused:
+            resumed += 1
+        # Only keep the ticket when measuring resumption
+        if resume:
+            ssl_context.session = ssl_object.session
+
+        writer.close()
+        await writer.wait_closed()
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.perf_counter() - wall_start
+
+    return {"rate": NUM_CONNECTIONS / wall_time,
+            "cpu_per_connection": cpu_time / NUM_CONNECTIONS,
+            "resumed": resumed}
+
+
+async def main():
+    """Main function of the program"""
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", 0,
+                                        ssl=create_ssl_context())
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        for name, resume in (("Full handshake", False),
+                             ("Resumed handshake", True)):
+            result = await run_connections(port, resume)
+            print(f"{name}: "
+                  + f"{result['rate']:.0f} connections/s, "
+                  + "CPU per connection: "
+                  + f"{result['cpu_per_connection'] * 1000:.3f} ms, "
+                  + f"Resumed: {result['resumed']}/{NUM_CONNECTIONS}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Handle graceful shutdown with keyboard interrupt
+        print("Benchmark stopped by user")
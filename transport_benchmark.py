@@ -0,0 +1,105 @@
+"""Benchmark of the stream and asyncio.Protocol server implementations.
+
+For each implementation an in-process server is started and measured
+for:
+  - Python memory held per idle connection (tracemalloc)
+  - query throughput over concurrent persistent connections
+The search itself is replaced with a constant answer so the numbers
+reflect transport and parsing overhead rather than lookup cost.
+"""
+
+import time
+import socket
+import asyncio
+import tracemalloc
+import async_server
+
+
+IDLE_CONNECTIONS = 2000
+NUM_CLIENTS = 50
+QUERIES_PER_CLIENT = 500
+QUERY = b"6;0;1;26;0;7;3;0;"
+
+
+async def constant_resolve(query: str, client=None) -> str:
+    """Stand-in for the search path so only the transport is measured"""
+    return "STRING EXISTS\n"
+
+
+async def start(impl: str):
+    """Start a server of the given implementation on a free port"""
+    if impl == "protocol":
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(async_server.create_protocol,
+                                          "127.0.0.1", 0, backlog=4096)
+    else:
+        server = await asyncio.start_server(async_server.handle_client,
+                                            "127.0.0.1", 0, backlog=4096)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def measure_idle_memory(port: int) -> float:
+    """Bytes of Python memory the server holds per idle connection"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    # Plain sockets keep the client side allocations negligible
+    sockets = []
+    for _ in range(IDLE_CONNECTIONS):
+        sockets.append(socket.create_connection(("127.0.0.1", port)))
+        if len(sockets) % 100 == 0:
+            await asyncio.sleep(0)
+
+    # Give the server time to accept everything
+    while async_server.active_connections < IDLE_CONNECTIONS:
+        await asyncio.sleep(0.01)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    for sock in sockets:
+        sock.close()
+    while async_server.active_connections:
+        await asyncio.sleep(0.01)
+    return (after - before) / IDLE_CONNECTIONS
+
+
+async def run_client(port: int) -> None:
+    """Send QUERIES_PER_CLIENT queries back to back on one connection"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(QUERIES_PER_CLIENT):
+        writer.write(QUERY)
+        await reader.read(1024)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def measure_throughput(port: int) -> float:
+    """Queries per second over NUM_CLIENTS persistent connections"""
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(port) for _ in range(NUM_CLIENTS)))
+    elapsed = time.perf_counter() - start_time
+    return NUM_CLIENTS * QUERIES_PER_CLIENT / elapsed
+
+
+async def main():
+    """Main function of the program"""
+    async_server.resolve_query = constant_resolve
+    async_server.max_connections = IDLE_CONNECTIONS * 2
+    async_server.max_inflight_queries = NUM_CLIENTS * 2
+
+    for impl in ("stream", "protocol"):
+        server, port = await start(impl)
+        async with server:
+            memory = await measure_idle_memory(port)
+            throughput = await measure_throughput(port)
+        print(f"Implementation: {impl}, "
+              + f"Memory per idle connection: {memory / 1024:.2f} KiB, "
+              + f"Throughput: {throughput:.0f} queries/s")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Handle graceful shutdown with keyboard interrupt
+        print("Benchmark stopped by user")